@@ -1,16 +1,43 @@
-from .common import AATException  # noqa: F401
+from typing import TYPE_CHECKING
+
+from . import config
+from .common import AATException, _lazy  # noqa: F401
 from .config import *  # noqa: F401, F403
-from .core import (  # noqa: F401
-    EventHandler,
-    Instrument,
-    ExchangeType,
-    Data,
-    Event,
-    Order,
-    Account,
-    Position,
-    Trade,
-    OrderBook,
+
+_CORE = (
+    "EventHandler",
+    "Instrument",
+    "ExchangeType",
+    "Data",
+    "Event",
+    "Order",
+    "Account",
+    "Position",
+    "Trade",
+    "OrderBook",
+    "OrderBookLite",
 )
 
+# core types are imported on first use, see `aat.core`
+__getattr__, __dir__ = _lazy(__name__, {name: ".core" for name in _CORE})
+
+# so star imports still import the lazily loaded names, with what they
+# imported before: the config's public names
+__all__ = ["AATException", *(n for n in dir(config) if not n.startswith("_")), *_CORE]
+
+if TYPE_CHECKING:
+    from .core import (  # noqa: F401
+        EventHandler,
+        Instrument,
+        ExchangeType,
+        Data,
+        Event,
+        Order,
+        Account,
+        Position,
+        Trade,
+        OrderBook,
+        OrderBookLite,
+    )
+
 __version__ = "0.1.0"
@@ -1,41 +1,75 @@
-from typing import Callable, List
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Any, Callable, Deque, Dict, Iterator, List, Tuple
 
+import builtins
+import importlib
 import os
 import itertools
 import functools
-import pandas as pd  # type: ignore
+import sys
+import time
+
+if TYPE_CHECKING:
+    import numpy as np  # type: ignore
 
 
 class AATException(Exception):
     pass
 
 
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def _lazy(
+    package: str, attributes: Dict[str, str]
+) -> Tuple[Callable[[str], Any], Callable[[], List[str]]]:
+    """module `__getattr__` and `__dir__` (PEP 562) for `package`, importing
+    each of `attributes` from its submodule (name -> relative module) only
+    when first accessed, e.g. `from aat.core import OrderBook`"""
+
+    def __getattr__(name: str) -> Any:
+        module = attributes.get(name)
+        if module is None:
+            raise AttributeError(
+                "module {!r} has no attribute {!r}".format(package, name)
+            )
+        value = getattr(importlib.import_module(module, package), name)
+        setattr(sys.modules[package], name, value)
+        return value
+
+    def __dir__() -> List[str]:
+        return sorted(set(vars(sys.modules[package])) | set(attributes))
+
+    return __getattr__, __dir__
+
+
 @functools.lru_cache()
 def _in_cpp() -> bool:
     _cpp = os.environ.get("AAT_USE_CPP", "").lower() in ("1", "on")
-
-    try:
-        from aat.binding import (  # type: ignore # noqa: F401
-            SideCpp,
-            EventTypeCpp,
-            DataTypeCpp,
-            InstrumentTypeCpp,
-            OrderTypeCpp,
-            OrderFlagCpp,
-            OrderBookCpp,
-            ExchangeTypeCpp,
-            InstrumentCpp,
-            DataCpp,
-            EventCpp,
-            OrderCpp,
-            TradeCpp,
-        )
-    except ImportError:
-        if _cpp:
-            # raise if being told to use c++
-            raise
+    if not _cpp:
+        # python unless asked for, no need to load the extension
         return False
 
+    # raises if the extension isn't built, as we are told to use it
+    from aat.binding import (  # type: ignore # noqa: F401
+        SideCpp,
+        EventTypeCpp,
+        DataTypeCpp,
+        InstrumentTypeCpp,
+        OrderTypeCpp,
+        OrderFlagCpp,
+        OrderBookCpp,
+        ExchangeTypeCpp,
+        InstrumentCpp,
+        DataCpp,
+        EventCpp,
+        OrderCpp,
+        TradeCpp,
+    )
+
     return _cpp
 
 
@@ -48,27 +82,144 @@ def id_generator() -> Callable[[], int]:
     return _gen_id
 
 
-def _merge(lst1: List, lst2: List, sum: bool = True) -> List:
-    """merge two lists of (val, datetime) and accumulate"""
-    df1 = pd.DataFrame(lst1, columns=("val1", "date1"))
-    df1.set_index("date1", inplace=True)
-    # df1.drop_duplicates(inplace=True)
-
-    df2 = pd.DataFrame(lst2, columns=("val2", "date2"))
-    df2.set_index("date2", inplace=True)
-    # df2.drop_duplicates(inplace=True)
-
-    df = df1.join(df2, how="outer")
-
-    # df = pd.concat([df1, df2], axis=1)
-    df.fillna(method="ffill", inplace=True)
-    df.fillna(0.0, inplace=True)
+class LatencyMetrics(object):
+    """running latency statistics, keyed by e.g. endpoint or handler name.
+
+    Keeps count/total/max per key plus a bounded window of recent samples
+    for percentiles, so recording is O(1) and memory is bounded."""
+
+    def __init__(self, window: int = 1024) -> None:
+        self._window = window
+        self._count: Dict[str, int] = {}
+        self._total: Dict[str, float] = {}
+        self._max: Dict[str, float] = {}
+        self._samples: Dict[str, Deque[float]] = {}
+
+    def record(self, key: str, seconds: float) -> None:
+        if key not in self._count:
+            self._count[key] = 0
+            self._total[key] = 0.0
+            self._max[key] = 0.0
+            self._samples[key] = deque(maxlen=self._window)
+        self._count[key] += 1
+        self._total[key] += seconds
+        if seconds > self._max[key]:
+            self._max[key] = seconds
+        self._samples[key].append(seconds)
+
+    @contextmanager
+    def time(self, key: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(key, time.perf_counter() - start)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """{key: {count, mean, max, p50, p99}}, times in seconds"""
+        ret = {}
+        for key, count in self._count.items():
+            samples = sorted(self._samples[key])
+            ret[key] = {
+                "count": count,
+                "mean": self._total[key] / count,
+                "max": self._max[key],
+                "p50": samples[len(samples) // 2],
+                "p99": samples[min(len(samples) - 1, int(len(samples) * 0.99))],
+            }
+        return ret
+
+
+class SeriesMerge(object):
+    """Running merge of `count` series of (value, datetime) points, each in
+    time order, into one series of their sum (or mean).
+
+    Every merged point carries the last value of each series at its time, 0
+    before a series' first point. Appending a point is O(1) (amortized), so a
+    merge of growing histories never recomputes what it already merged.
+    Points at the same time as the last merged point update it in place.
+    Values and times are kept in numpy arrays for bulk use.
+
+    Args:
+        count (int): number of series merged
+        sum (bool): merge into the sum of the series, or else their mean
+    """
+
+    def __init__(self, count: int = 2, sum: bool = True) -> None:
+        import numpy as np  # type: ignore
+
+        self._last = [0.0] * count
+        self._sum = sum
+        self._size = 0
+        self._values = np.empty(1024, dtype="f8")
+        # microseconds since epoch, naive (as `datetime64`)
+        self._times = np.empty(1024, dtype="i8")
+        self._time = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, series: int, value: float, timestamp: datetime) -> float:
+        """add a point of `series`, returning the merged value at `timestamp`"""
+        if timestamp.tzinfo is not None:
+            timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+        us = (timestamp - _EPOCH) // _MICROSECOND
+
+        self._last[series] = value
+        merged = builtins.sum(self._last)
+        if not self._sum:
+            merged /= len(self._last)
+
+        size = self._size
+        if size and us <= self._time:
+            if us < self._time:
+                raise AATException("Points must be appended in time order")
+            self._values[size - 1] = merged
+            return merged
+
+        if size == len(self._values):
+            import numpy as np  # type: ignore
+
+            self._values = np.resize(self._values, 2 * size)
+            self._times = np.resize(self._times, 2 * size)
+        self._values[size] = merged
+        self._times[size] = us
+        self._time = us
+        self._size = size + 1
+        return merged
+
+    @property
+    def values(self) -> "np.ndarray":
+        """merged values, a view valid until the next append"""
+        return self._values[: self._size]
+
+    @property
+    def timestamps(self) -> "np.ndarray":
+        """times of the merged values as `datetime64[us]`, a view valid until
+        the next append"""
+        return self._times[: self._size].view("datetime64[us]")
 
-    if sum:
-        df = df.sum(axis=1)
-    else:
-        df = df.mean(axis=1)
 
-    df = df.reset_index().values.tolist()
-
-    return [(b, a.to_pydatetime()) for a, b in df]
+def _merge(lst1: List, lst2: List, sum: bool = True) -> List:
+    """merge two lists of (val, datetime), each in time order, and accumulate
+    (see `SeriesMerge`)"""
+    merged = SeriesMerge(2, sum)
+    ret: List[Tuple[float, datetime]] = []
+    i, j = 0, 0
+
+    while i < len(lst1) or j < len(lst2):
+        if j == len(lst2) or (i < len(lst1) and lst1[i][1] <= lst2[j][1]):
+            value, timestamp = lst1[i]
+            i += 1
+            value = merged.append(0, value, timestamp)
+        else:
+            value, timestamp = lst2[j]
+            j += 1
+            value = merged.append(1, value, timestamp)
+
+        if ret and ret[-1][1] == timestamp:
+            ret[-1] = (value, timestamp)
+        else:
+            ret.append((value, timestamp))
+
+    return ret
@@ -3,9 +3,8 @@ import importlib
 import itertools
 import os
 import os.path
-import pytz
 from configparser import ConfigParser
-from typing import Optional, Any, Dict, List, Union, TYPE_CHECKING
+from typing import Optional, Any, Dict, List, Tuple, Union, TYPE_CHECKING
 
 if TYPE_CHECKING:
     from aat.config import TradingType
@@ -88,19 +87,24 @@ def getExchanges(
         raise Exception("Must provide exchanges")
 
     for exchange in exchanges:
-        if isinstance(exchange, list):
-            mod, clazz = exchange[0].split(":")
-            args = exchange[1:]
-        else:
-            mod, clazz = exchange.split(":")
-            args = []
-        mod = importlib.import_module(mod)
-        clazz = getattr(mod, clazz)
+        clazz, args = _exchangeClass(exchange)
         exchange_instances.append(clazz(trading_type, verbose, *args))
     return exchange_instances
 
 
+def _exchangeClass(exchange: Union[str, List[str]]) -> Tuple[Any, List[str]]:
+    """exchange class and constructor args, of `module:Class` and any args"""
+    if isinstance(exchange, list):
+        mod, clazz = exchange[0].split(":")
+        args = exchange[1:]
+    else:
+        mod, clazz = exchange.split(":")
+        args = []
+    return getattr(importlib.import_module(mod), clazz), args
+
+
 def parseConfig(argv: Optional[list] = None) -> dict:
+    import pytz  # type: ignore
     from aat import TradingType
 
     parser = argparse.ArgumentParser()
@@ -1,26 +1,62 @@
-from .data import Data, Error, Event, Order, Trade
-from .exchange import ExchangeType
+from importlib.util import find_spec
+from typing import TYPE_CHECKING
 
-# from .execution import OrderManager
-from .handler import EventHandler, PrintHandler
-from .instrument import Instrument, TradingDay
-from .order_book import OrderBook
-from .position import Account, CashPosition, Position
+from ..common import _lazy
 
-# from .portfolio import Portfolio, PortfolioManager
-# from .risk import RiskManager
-from .table import TableHandler
+# Submodules are imported on first use of their names, so that e.g. order
+# books or tables (and their dependencies) are only loaded by what uses them
+_LAZY = {
+    "Data": ".data",
+    "Error": ".data",
+    "Event": ".data",
+    "Order": ".data",
+    "Trade": ".data",
+    "ExchangeType": ".exchange",
+    # "OrderManager": ".execution",
+    "EventHandler": ".handler",
+    "PrintHandler": ".handler",
+    "Instrument": ".instrument",
+    "TradingDay": ".instrument",
+    "OrderBook": ".order_book",
+    "OrderBookLite": ".order_book",
+    "PositionManager": ".pnl",
+    "Account": ".position",
+    "CashPosition": ".position",
+    "Position": ".position",
+    # "Portfolio": ".portfolio",
+    # "PortfolioManager": ".portfolio",
+    # "RiskManager": ".risk",
+    "TableHandler": ".table",
+}
 
-try:
-    from ..binding import (
-        AccountCpp,
-        DataCpp,
-        EventCpp,
-        InstrumentCpp,
-        OrderBookCpp,
-        OrderCpp,
-        PositionCpp,
-        TradeCpp,
+# bindings of the C++ extension, wherever it is built (whether or not it is
+# used, see `_in_cpp`), likewise imported on first use
+if find_spec("aat.binding") is not None:
+    _LAZY.update(
+        (name, "..binding")
+        for name in (
+            "AccountCpp",
+            "DataCpp",
+            "EventCpp",
+            "InstrumentCpp",
+            "OrderBookCpp",
+            "OrderCpp",
+            "PositionCpp",
+            "TradeCpp",
+        )
     )
-except ImportError:
-    pass
\ No newline at end of file
+__getattr__, __dir__ = _lazy(__name__, _LAZY)
+
+# so star imports still import the lazily loaded names
+__all__ = list(_LAZY)
+
+if TYPE_CHECKING:
+    from .data import Data, Error, Event, Order, Trade  # noqa: F401
+    from .exchange import ExchangeType  # noqa: F401
+    from .handler import EventHandler, PrintHandler  # noqa: F401
+    from .instrument import Instrument, TradingDay  # noqa: F401
+    from .order_book import OrderBook, OrderBookLite  # noqa: F401
+    from .pnl import PositionManager  # noqa: F401
+    from .position import Account, CashPosition, Position  # noqa: F401
+    from .table import TableHandler  # noqa: F401
+
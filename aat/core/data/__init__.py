@@ -1,5 +1,16 @@
+from typing import TYPE_CHECKING
+
+from ...common import _lazy
 from .data import Data  # noqa: F401
 from .error import Error  # noqa: F401
 from .event import Event  # noqa: F401
 from .order import Order  # noqa: F401
 from .trade import Trade  # noqa: F401
+
+# the codec needs numpy, which the data types themselves don't
+__getattr__, __dir__ = _lazy(__name__, {"BinaryCodec": ".codec"})
+
+__all__ = ["Data", "Error", "Event", "Order", "Trade", "BinaryCodec"]
+
+if TYPE_CHECKING:
+    from .codec import BinaryCodec  # noqa: F401
@@ -0,0 +1,397 @@
+import struct
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np  # type: ignore
+
+from ...config import DataType, EventType, OrderFlag, OrderType, Side
+from ..exchange import ExchangeType
+from ..instrument import Instrument
+from .data import Data
+from .event import Event
+from .order import Order
+from .trade import Trade
+
+# Enum codes, a byte each. Event and flag codes follow the enums' order
+_EVENT_CODES: Dict[EventType, int] = {t: i for i, t in enumerate(EventType)}
+_EVENT_TYPES: List[EventType] = list(EventType)
+_SIDE_CODES: Dict[Side, int] = {Side.BUY: 1, Side.SELL: 2}
+_SIDES: List[Optional[Side]] = [None, Side.BUY, Side.SELL]
+_ORDER_TYPE_CODES: Dict[OrderType, int] = {
+    OrderType.LIMIT: 0,
+    OrderType.MARKET: 1,
+    OrderType.STOP: 2,
+}
+_ORDER_TYPES: List[OrderType] = [OrderType.LIMIT, OrderType.MARKET, OrderType.STOP]
+_FLAG_CODES: Dict[OrderFlag, int] = {f: i for i, f in enumerate(OrderFlag)}
+_FLAGS: List[OrderFlag] = list(OrderFlag)
+
+# record kinds
+KIND_NONE = 0
+KIND_DATA = 1
+KIND_ORDER = 2
+KIND_TRADE = 3
+
+# `event` code of records which belong to the preceding record
+# (stop targets, taker, maker and our orders of a trade)
+_CHILD = 0xFF
+
+# `flag` of a trade record, where its `my_order` is: none, its taker order,
+# its (`_MY_MAKER` + i)th maker order, or a record of its own after them
+_MY_NONE = 0
+_MY_TAKER = 1
+_MY_MAKER = 2
+_MY_OWN = 0xFF
+
+# bytes of an id, longer ones can't be encoded
+_ID_WIDTH = 40
+
+# Fixed layout of a single record, 93 bytes, little endian, unaligned
+RECORD_DTYPE = np.dtype(
+    [
+        ("event", "u1"),
+        ("kind", "u1"),
+        ("side", "u1"),
+        ("order_type", "u1"),
+        ("flag", "u1"),
+        ("children", "<u2"),
+        ("exchange", "<u2"),
+        ("instrument", "<u4"),
+        ("timestamp", "<i8"),
+        ("volume", "<f8"),
+        ("price", "<f8"),
+        ("notional", "<f8"),
+        ("filled", "<f8"),
+        ("id", "S{}".format(_ID_WIDTH)),
+    ]
+)
+
+_RECORD = struct.Struct("<5BHHIq4d{}s".format(_ID_WIDTH))
+
+assert _RECORD.size == RECORD_DTYPE.itemsize
+
+_Row = Tuple[int, int, int, int, int, int, int, int, int, float, float, float, float, bytes]
+
+
+def timestampNs(timestamp: datetime) -> int:
+    """exact nanoseconds since epoch (naive datetimes are local, as in `json`)"""
+    seconds = int(timestamp.replace(microsecond=0).timestamp())
+    return seconds * 1_000_000_000 + timestamp.microsecond * 1000
+
+
+def timestampsNs(timestamps: Iterable[datetime]) -> List[int]:
+    """`timestampNs` of many timestamps, converting each distinct one once"""
+    seen: Dict[datetime, int] = {}
+    out = []
+    for timestamp in timestamps:
+        ns = seen.get(timestamp)
+        if ns is None:
+            ns = seen[timestamp] = timestampNs(timestamp)
+        out.append(ns)
+    return out
+
+
+def _id(id: Any) -> bytes:
+    """an id as encoded, raising rather than truncating one too long"""
+    encoded = str(id).encode()
+    if len(encoded) > _ID_WIDTH:
+        raise ValueError(
+            "Cannot encode id {!r} longer than {} bytes".format(id, _ID_WIDTH)
+        )
+    return encoded
+
+
+def _myOrder(trade: Trade) -> int:
+    """`flag` of a trade record, see `_MY_NONE`"""
+    mine = trade.my_order
+    if mine is None:
+        return _MY_NONE
+    if mine is trade.taker_order:
+        return _MY_TAKER
+    for i, maker_order in enumerate(trade.maker_orders[: _MY_OWN - _MY_MAKER]):
+        if mine is maker_order:
+            return _MY_MAKER + i
+    return _MY_OWN
+
+
+def _from_ns(ns: int) -> datetime:
+    return datetime.fromtimestamp(ns // 1_000_000_000).replace(
+        microsecond=(ns // 1000) % 1_000_000
+    )
+
+
+class BinaryCodec(object):
+    """Schema driven binary encoding of `Event`s and their targets.
+
+    Every `Data`, `Order` and `Trade` maps to one or more fixed-layout records
+    (see `RECORD_DTYPE`). Instruments and exchanges are interned to integer
+    ids, so the codec on the decoding side must share the symbol table
+    (see `symbols` and `loadSymbols`) and decoded objects share one
+    `Instrument`/`ExchangeType` instance per id. Ids decode as strings.
+    """
+
+    __slots__ = [
+        "_instrument_ids",
+        "_instruments",
+        "_exchange_ids",
+        "_exchanges",
+    ]
+
+    def __init__(self) -> None:
+        # id 0 is reserved for no instrument / no exchange
+        self._instrument_ids: Dict[Instrument, int] = {}
+        self._instruments: List[Optional[Instrument]] = [None]
+        self._exchange_ids: Dict[ExchangeType, int] = {ExchangeType(""): 0}
+        self._exchanges: List[ExchangeType] = [ExchangeType("")]
+
+    # *************** #
+    # Symbol handling #
+    # *************** #
+    def instrumentId(self, instrument: Optional[Instrument]) -> int:
+        if instrument is None:
+            return 0
+        id = self._instrument_ids.get(instrument)
+        if id is None:
+            id = self._instrument_ids[instrument] = len(self._instruments)
+            self._instruments.append(instrument)
+        return id
+
+    def exchangeId(self, exchange: ExchangeType) -> int:
+        id = self._exchange_ids.get(exchange)
+        if id is None:
+            id = self._exchange_ids[exchange] = len(self._exchanges)
+            self._exchanges.append(exchange)
+        return id
+
+    def symbols(self) -> Dict[str, List[Any]]:
+        """symbol table to ship alongside encoded records"""
+        return {
+            "instruments": [i.json() for i in self._instruments[1:]],  # type: ignore
+            "exchanges": [e.name for e in self._exchanges[1:]],
+        }
+
+    def loadSymbols(self, jsn: Dict[str, List[Any]]) -> None:
+        """replace the symbol table with one produced by `symbols`"""
+        self.__init__()  # type: ignore
+        for name in jsn["exchanges"]:
+            self.exchangeId(ExchangeType(name))
+        for inst in jsn["instruments"]:
+            self.instrumentId(Instrument.fromJson(inst))
+
+    # ******** #
+    # Encoding #
+    # ******** #
+    def _rows(self, event: int, target: Any, rows: List[_Row]) -> None:
+        if target is None:
+            rows.append((event, KIND_NONE, 0, 0, 0, 0, 0, 0, 0, 0.0, 0.0, 0.0, 0.0, b""))
+
+        elif target.type == DataType.ORDER:
+            rows.append(
+                (
+                    event,
+                    KIND_ORDER,
+                    _SIDE_CODES[target.side],
+                    _ORDER_TYPE_CODES[target.order_type],
+                    _FLAG_CODES[target.flag],
+                    1 if target.stop_target else 0,
+                    self.exchangeId(target.exchange),
+                    self.instrumentId(target.instrument),
+                    timestampNs(target.timestamp),
+                    target.volume,
+                    target.price,
+                    target.notional,
+                    target.filled,
+                    _id(target.id) if target.id else b"",
+                )
+            )
+            if target.stop_target:
+                self._rows(_CHILD, target.stop_target, rows)
+
+        elif target.type == DataType.TRADE:
+            mine = _myOrder(target)
+            rows.append(
+                (
+                    event,
+                    KIND_TRADE,
+                    0,
+                    0,
+                    mine,
+                    1 + len(target.maker_orders) + (mine == _MY_OWN),
+                    0,
+                    0,
+                    timestampNs(target.timestamp),
+                    target.volume,
+                    target.price,
+                    target.notional,
+                    0.0,
+                    _id(target.id),
+                )
+            )
+            self._rows(_CHILD, target.taker_order, rows)
+            for maker_order in target.maker_orders:
+                self._rows(_CHILD, maker_order, rows)
+            if mine == _MY_OWN:
+                self._rows(_CHILD, target.my_order, rows)
+
+        elif target.type == DataType.DATA:
+            # like `json`, the free-form `data` payload is not serialized
+            rows.append(
+                (
+                    event,
+                    KIND_DATA,
+                    0,
+                    0,
+                    0,
+                    0,
+                    self.exchangeId(target.exchange),
+                    self.instrumentId(target.instrument),
+                    timestampNs(target.timestamp),
+                    0.0,
+                    0.0,
+                    0.0,
+                    0.0,
+                    _id(target.id),
+                )
+            )
+
+        else:
+            raise NotImplementedError(
+                "Cannot encode target of type {}".format(target.type)
+            )
+
+    def encode(self, event: Event) -> bytes:
+        """encode a single event"""
+        rows: List[_Row] = []
+        self._rows(_EVENT_CODES[event.type], event.target, rows)
+        return b"".join(_RECORD.pack(*row) for row in rows)
+
+    def encodeTarget(self, target: Union[Data, Order, Trade]) -> bytes:
+        """encode a single event target without its event wrapper"""
+        rows: List[_Row] = []
+        self._rows(_CHILD, target, rows)
+        return b"".join(_RECORD.pack(*row) for row in rows)
+
+    def encodeBatch(self, events: Iterable[Event]) -> bytes:
+        """encode a batch of events into one contiguous buffer"""
+        return self.records(events).tobytes()
+
+    def records(self, events: Iterable[Event]) -> np.ndarray:
+        """encode a batch of events into a structured array of `RECORD_DTYPE`"""
+        rows: List[_Row] = []
+        for event in events:
+            self._rows(_EVENT_CODES[event.type], event.target, rows)
+        return np.array(rows, dtype=RECORD_DTYPE)
+
+    # ******** #
+    # Decoding #
+    # ******** #
+    def decode(self, buffer: bytes) -> Event:
+        """decode a single event"""
+        events = self.decodeBatch(buffer)
+        if len(events) != 1:
+            raise ValueError("Buffer contains {} events".format(len(events)))
+        return events[0]
+
+    def decodeTarget(self, buffer: bytes) -> Union[Data, Order, Trade]:
+        """decode a single target encoded by `encodeTarget`"""
+        target, _ = self._decode(
+            _Columns(np.frombuffer(buffer, dtype=RECORD_DTYPE)), 0
+        )
+        return target  # type: ignore
+
+    def decodeBatch(self, buffer: Union[bytes, np.ndarray]) -> List[Event]:
+        """decode a buffer of records produced by `encodeBatch`"""
+        records = (
+            buffer
+            if isinstance(buffer, np.ndarray)
+            else np.frombuffer(buffer, dtype=RECORD_DTYPE)
+        )
+
+        # convert each column to python objects in bulk
+        columns = _Columns(records)
+
+        ret: List[Event] = []
+        index = 0
+        while index < len(records):
+            event = _EVENT_TYPES[columns.event[index]]
+            target, index = self._decode(columns, index)
+            ret.append(Event(type=event, target=target))
+        return ret
+
+    def _decode(self, columns: "_Columns", index: int) -> Tuple[Any, int]:
+        kind = columns.kind[index]
+
+        if kind == KIND_NONE:
+            return None, index + 1
+
+        elif kind == KIND_ORDER:
+            stop_target = None
+            next = index + 1
+            if columns.children[index]:
+                stop_target, next = self._decode(columns, next)
+
+            kwargs: Dict[str, Any] = {"timestamp": _from_ns(columns.timestamp[index])}
+            if columns.id[index]:
+                kwargs["id"] = columns.id[index].decode()
+            if columns.filled[index]:
+                kwargs["filled"] = columns.filled[index]
+
+            order = Order(
+                columns.volume[index],
+                columns.price[index],
+                _SIDES[columns.side[index]],
+                self._instruments[columns.instrument[index]],
+                self._exchanges[columns.exchange[index]],
+                notional=columns.notional[index],
+                order_type=_ORDER_TYPES[columns.order_type[index]],
+                flag=_FLAGS[columns.flag[index]],
+                stop_target=stop_target,
+                **kwargs,
+            )
+            return order, next
+
+        elif kind == KIND_TRADE:
+            mine = columns.flag[index]
+            next = index + 1
+            taker_order, next = self._decode(columns, next)
+            maker_orders = []
+            for _ in range(columns.children[index] - 1 - (mine == _MY_OWN)):
+                maker_order, next = self._decode(columns, next)
+                maker_orders.append(maker_order)
+
+            my_order = None
+            if mine == _MY_OWN:
+                my_order, next = self._decode(columns, next)
+            elif mine == _MY_TAKER:
+                my_order = taker_order
+            elif mine != _MY_NONE:
+                my_order = maker_orders[mine - _MY_MAKER]
+
+            trade = Trade(
+                columns.volume[index],
+                columns.price[index],
+                taker_order,
+                maker_orders,
+                id=columns.id[index].decode(),
+                my_order=my_order,
+            )
+            return trade, next
+
+        elif kind == KIND_DATA:
+            data = Data(
+                self._instruments[columns.instrument[index]],
+                self._exchanges[columns.exchange[index]],
+                id=columns.id[index].decode(),
+                timestamp=_from_ns(columns.timestamp[index]),
+            )
+            return data, index + 1
+
+        raise ValueError("Unknown record kind {}".format(kind))
+
+
+class _Columns(object):
+    """python lists of every column of a record array, converted in bulk"""
+
+    def __init__(self, records: np.ndarray) -> None:
+        for name in RECORD_DTYPE.names:
+            setattr(self, name, records[name].tolist())
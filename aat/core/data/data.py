@@ -55,6 +55,11 @@ class Data(object):
     def timestamp(self) -> datetime:
         return self.__timestamp
 
+    @timestamp.setter
+    def timestamp(self, timestamp: datetime) -> None:
+        assert isinstance(timestamp, datetime)
+        self.__timestamp = timestamp
+
     @property
     def type(self) -> DataType:
         return self.__type
@@ -80,10 +85,7 @@ class Data(object):
         return self.id == other.id
 
     def json(self, flat: bool = False) -> Mapping[str, Union[str, int, float]]:
-        if flat:
-            # TODO
-            raise NotImplementedError()
-
+        # already flat
         return {
             "id": self.id,
             "timestamp": self.timestamp.timestamp(),
@@ -40,9 +40,6 @@ class Event(object):
         return f"Event(type={self.type}, target={self.target})"
 
     def json(self, flat: bool = False) -> Mapping[str, Union[str, int, float, dict]]:
-        if flat:
-            # TODO
-            raise NotImplementedError()
         target = (
             {
                 "target." + k: v
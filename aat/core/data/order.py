@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Any, Mapping, Optional, Type, Union, cast
+from typing import Any, Dict, Mapping, Optional, Type, Union, cast
 
 from ...config import DataType, OrderFlag, OrderType, Side
 from ..exchange import ExchangeType
@@ -218,8 +218,27 @@ class Order(object):
 
     def json(self, flat: bool = False) -> Mapping[str, Union[str, int, float, dict]]:
         if flat:
-            # TODO
-            raise NotImplementedError()
+            ret: Dict[str, Union[str, int, float, dict]] = {
+                "id": self.id,
+                "timestamp": self.timestamp.timestamp(),
+                "volume": self.volume,
+                "price": self.price,
+                "side": self.side.value,
+                "instrument": self.instrument.name,
+                "exchange": self.exchange.name,
+                "notional": self.notional,
+                "filled": self.filled,
+                "order_type": self.order_type.value,
+                "flag": self.flag.value,
+            }
+            if self.stop_target:
+                ret.update(
+                    {
+                        "stop_target." + k: v
+                        for k, v in self.stop_target.json(flat=True).items()
+                    }
+                )
+            return ret
 
         return {
             "id": self.id,
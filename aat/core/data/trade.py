@@ -155,7 +155,7 @@ class Trade(object):
             }
 
             maker_orders: List[Dict[str, Union[str, int, float, dict]]] = [
-                {"maker_order{}." + k: v for k, v in order.json(flat=flat).items()}
+                {"maker_order{}.".format(i) + k: v for k, v in order.json(flat=flat).items()}
                 for i, order in enumerate(self.maker_orders)
             ]
 
@@ -1,4 +1,4 @@
-from typing import Optional, Dict, TYPE_CHECKING
+from typing import Optional, Dict, List, Tuple, TYPE_CHECKING
 from ...config import InstrumentType
 
 if TYPE_CHECKING:
@@ -6,30 +6,130 @@ if TYPE_CHECKING:
     from .exchange import ExchangeType
     from ..instrument import Instrument
 
+_Key = Tuple[str, InstrumentType]
+
 
 class ExchangeDB(object):
-    """exchange registration"""
+    """exchange registration, and interned instrument registry
+
+    Instruments are interned by (name, type): registering an instrument that is
+    already known returns the existing instance, so adapters can hand out one
+    shared `Instrument` per product. Lookups by name, broker id, type and
+    exchange are plain dict hits on maintained indexes.
+    """
 
     def __init__(self) -> None:
         self._name_map: Dict[str, "ExchangeType"] = {}
         self._map: Dict["Instrument", "ExchangeType"] = {}
 
+        # interned instruments, in registration order
+        self._instruments: Dict[_Key, "Instrument"] = {}
+
+        # indexes, each an insertion-ordered {(name, type): instrument}
+        self._by_name: Dict[str, Dict[_Key, "Instrument"]] = {}
+        self._by_type: Dict[InstrumentType, Dict[_Key, "Instrument"]] = {}
+        self._by_exchange: Dict[str, Dict[_Key, "Instrument"]] = {}
+        self._by_broker_id: Dict[str, Dict[str, "Instrument"]] = {}
+
     def add(self, exchange: "ExchangeType") -> None:
         if exchange.name in self._name_map:
             return
         self._name_map[exchange.name] = exchange
 
+    def register(
+        self,
+        instrument: "Instrument",
+        exchange: Optional["ExchangeType"] = None,
+        broker_id: str = "",
+    ) -> "Instrument":
+        """register an instrument, returning the interned instance
+
+        Args:
+            instrument (Instrument): instrument to register
+            exchange (ExchangeType): exchange the instrument trades on, if any
+            broker_id (str): the exchange's id for the instrument, defaults to `instrument.brokerId`
+        """
+        key = (instrument.name, instrument.type)
+        interned = self._instruments.get(key)
+
+        if interned is None:
+            interned = self._instruments[key] = instrument
+            self._by_name.setdefault(instrument.name, {})[key] = instrument
+            self._by_type.setdefault(instrument.type, {})[key] = instrument
+
+        if exchange:
+            self.add(exchange)
+            self._map.setdefault(interned, exchange)
+            self._by_exchange.setdefault(exchange.name, {})[key] = interned
+
+            broker_id = broker_id or getattr(instrument, "brokerId", None) or ""
+            if broker_id:
+                self.brokerIds(exchange)[broker_id] = interned
+
+        return interned
+
+    def brokerIds(self, exchange: "ExchangeType") -> Dict[str, "Instrument"]:
+        """live mapping of broker id to interned instrument for `exchange`.
+
+        Adapters should hold on to this dict and index it directly, e.g.
+        `products[msg["product_id"]]`, rather than constructing instruments."""
+        return self._by_broker_id.setdefault(exchange.name, {})
+
     def instruments(
         self,
         name: str = "",
-        type: InstrumentType = InstrumentType.EQUITY,
-        exchange: ExchangeType = ExchangeType(""),
-    ) -> None:
-        raise NotImplementedError()
+        type: Optional[InstrumentType] = None,
+        exchange: Optional["ExchangeType"] = None,
+    ) -> List["Instrument"]:
+        """list registered instruments, optionally filtered by name, type and exchange"""
+        candidates: List[Dict[_Key, "Instrument"]] = []
+
+        if name:
+            candidates.append(self._by_name.get(name, {}))
+        if type is not None:
+            candidates.append(self._by_type.get(type, {}))
+        if exchange:
+            candidates.append(self._by_exchange.get(exchange.name, {}))
+
+        if not candidates:
+            return list(self._instruments.values())
+
+        # walk the smallest index, filter against the rest
+        candidates.sort(key=len)
+        smallest, rest = candidates[0], candidates[1:]
+        return [i for k, i in smallest.items() if all(k in other for other in rest)]
+
+    def instrument(
+        self,
+        name: str = "",
+        type: Optional[InstrumentType] = None,
+        exchange: Optional["ExchangeType"] = None,
+        broker_id: str = "",
+    ) -> Optional["Instrument"]:
+        """lookup a single instrument by broker id, or by name (and type)"""
+        if broker_id:
+            if exchange:
+                return self._by_broker_id.get(exchange.name, {}).get(broker_id)
+            for products in self._by_broker_id.values():
+                if broker_id in products:
+                    return products[broker_id]
+            return None
+
+        if type is not None:
+            return self._instruments.get((name, type))
+
+        matches = self.instruments(name=name, exchange=exchange)
+        return matches[0] if matches else None
 
     def get(
         self, name: str = "", instrument: Optional["Instrument"] = None
     ) -> "ExchangeType":
         if name:
             return self._name_map[name]
-        raise NotImplementedError()
+        if instrument is not None:
+            return self._map[instrument]
+        raise ValueError("Must provide exchange name or instrument")
+
+
+# process-wide registry shared by exchange adapters
+_exchangedb = ExchangeDB()
@@ -1 +1 @@
-from .order_book import OrderBook
+from .order_book import OrderBook, OrderBookLite
@@ -3,7 +3,7 @@ from typing import Dict, Optional, Iterator, Tuple, Union, List
 
 from .price_level import PriceLevelRO
 from ..data import Order
-from ..config import Side
+from ...config import Side
 
 class OrderBookBase(ABC):
     @abstractmethod
@@ -43,17 +43,17 @@ class OrderBookBase(ABC):
         pass
 
     @abstractmethod
-    def bid(self, levels: int = 0
+    def bids(self, levels: int = 0
             ) -> Union[PriceLevelRO, List[Optional[PriceLevelRO]]]:
         pass
 
     @abstractmethod
-    def ask(self, levels: int = 0
+    def asks(self, levels: int = 0
             ) -> Union[PriceLevelRO, List[Optional[PriceLevelRO]]]:
         pass
 
     @abstractmethod
-    def __init__(self) -> Iterator[Order]:
+    def __iter__(self) -> Iterator[Order]:
         pass
     
 
@@ -0,0 +1,227 @@
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from aat.core import ExchangeType, Instrument
+from aat.config import Side
+from aat.core.data import Order
+
+from ..base import OrderBookBase
+from ..price_level import PriceLevelRO
+
+# a change to one aggregated level, volume 0 removes the level
+LevelDelta = Tuple[Side, float, float]
+
+
+class OrderBookLite(OrderBookBase):
+    """Aggregated (level 2) order book, volume by price level without orders.
+
+    Levels are set in place from exchange level data, either in bulk (`load`)
+    or as deltas (`update`, `apply`). Orders can be added and cancelled,
+    adjusting the volume of their level, but are not matched or kept.
+
+    Args:
+        instrument: The instrument of the book
+        exchange_name: The name of the exchange
+    """
+
+    def __init__(
+        self,
+        instrument: Instrument,
+        exchange_name: Union[ExchangeType, str] = "",
+    ) -> None:
+        self._instrument = instrument
+        self._exchange_name = (
+            exchange_name
+            if isinstance(exchange_name, ExchangeType)
+            else ExchangeType(exchange_name or "")
+        )
+        self.reset()
+
+    @property
+    def instrument(self) -> Instrument:
+        return self._instrument
+
+    @property
+    def exchange(self) -> ExchangeType:
+        return self._exchange_name
+
+    def reset(self) -> None:
+        """
+        Reset the orderbook to its base state
+        """
+        # levels look like [10, 10.5, 11, 11.5]
+        self._buy_levels: List[float] = []
+        self._sell_levels: List[float] = []
+
+        # look like {price level: volume}
+        self._buys: Dict[float, float] = {}
+        self._sells: Dict[float, float] = {}
+
+    def load(
+        self,
+        bids: Iterable[Tuple[float, float]],
+        asks: Iterable[Tuple[float, float]],
+    ) -> None:
+        """replace the book with the given (price, volume) levels"""
+        self._buys = {price: volume for price, volume in bids if volume > 0}
+        self._sells = {price: volume for price, volume in asks if volume > 0}
+        self._buy_levels = sorted(self._buys)
+        self._sell_levels = sorted(self._sells)
+
+    def update(self, side: Side, price: float, volume: float) -> None:
+        """set the volume of a level, removing it if `volume` is 0"""
+        levels = self._buy_levels if side == Side.BUY else self._sell_levels
+        prices = self._buys if side == Side.BUY else self._sells
+
+        if volume <= 0:
+            if prices.pop(price, None) is not None:
+                del levels[bisect_left(levels, price)]
+            return
+
+        if price not in prices:
+            insort(levels, price)
+        prices[price] = volume
+
+    def apply(self, deltas: Iterable[LevelDelta]) -> None:
+        """apply a batch of level deltas"""
+        for side, price, volume in deltas:
+            self.update(side, price, volume)
+
+    def add(self, order: Order) -> None:
+        """add an order's remaining volume to its level"""
+        prices = self._buys if order.side == Side.BUY else self._sells
+        self.update(
+            order.side,
+            order.price,
+            prices.get(order.price, 0.0) + order.volume - order.filled,
+        )
+
+    def cancel(self, order: Order) -> None:
+        """remove an order's remaining volume from its level"""
+        prices = self._buys if order.side == Side.BUY else self._sells
+        if order.price in prices:
+            self.update(
+                order.side,
+                order.price,
+                prices[order.price] - (order.volume - order.filled),
+            )
+
+    def change(self, order: Order) -> None:
+        raise NotImplementedError("Aggregated book does not track order volumes")
+
+    def find(self, order: Order) -> Optional[Order]:
+        # orders are not kept
+        return None
+
+    def topOfBook(self) -> Dict[Side, PriceLevelRO]:
+        """return top of both sides
+
+        Returns:
+            value (dict): returns {BUY: PriceLevelRO, SELL: PriceLevelRO}
+        """
+        return {
+            Side.BUY: self._bid(0) or PriceLevelRO(0, 0, 0),
+            Side.SELL: self._ask(0) or PriceLevelRO(float("inf"), 0, 0),
+        }
+
+    def spread(self) -> float:
+        """return the spread between best ask and best bid"""
+        tob = self.topOfBook()
+        return tob[Side.SELL].price - tob[Side.BUY].price
+
+    def _bid(self, i: int) -> Optional[PriceLevelRO]:
+        if len(self._buy_levels) > i:
+            price = self._buy_levels[-i - 1]
+            return PriceLevelRO(price, self._buys[price])
+        return None
+
+    def _ask(self, i: int) -> Optional[PriceLevelRO]:
+        if len(self._sell_levels) > i:
+            price = self._sell_levels[i]
+            return PriceLevelRO(price, self._sells[price])
+        return None
+
+    def level(self, level: int = 0, price: Optional[float] = None) -> Tuple:
+        """return book level
+
+        Args:
+            level (int): depth of book to return
+            price (float): price level to look for
+        Returns:
+            value (tuple): returns ask, bid
+        """
+        if price:
+            return (
+                PriceLevelRO(price, self._sells[price])
+                if price in self._sells
+                else None,
+                PriceLevelRO(price, self._buys[price])
+                if price in self._buys
+                else None,
+            )
+
+        return (
+            self._ask(level) or PriceLevelRO(0.0, 0.0, 0),
+            self._bid(level) or PriceLevelRO(0.0, 0.0, 0),
+        )
+
+    def bids(
+        self, levels: int = 0
+    ) -> Union[PriceLevelRO, List[Optional[PriceLevelRO]]]:
+        """return bid levels starting at top
+
+        Args:
+            levels (int): number of levels to return
+        Returns:
+            value (list): top level if `levels` is 0, else [levels in order]
+        """
+        if levels <= 0:
+            return self._bid(0) or PriceLevelRO(0, 0, 0)
+        return [self._bid(i) for i in range(levels)]
+
+    def asks(
+        self, levels: int = 0
+    ) -> Union[PriceLevelRO, List[Optional[PriceLevelRO]]]:
+        """return ask levels starting at top
+
+        Args:
+            levels (int): number of levels to return
+        Returns:
+            value (list): top level if `levels` is 0, else [levels in order]
+        """
+        if levels <= 0:
+            return self._ask(0) or PriceLevelRO(float("inf"), 0, 0)
+        return [self._ask(i) for i in range(levels)]
+
+    def levels(self, levels: int = 0) -> Dict[Side, List[PriceLevelRO]]:
+        """return book levels starting at top
+
+        Args:
+            levels (int): number of levels to return
+        Returns:
+            value (dict of list): returns {BUY: [levels in order], SELL: [levels in order]}
+        """
+        if levels <= 0:
+            return self.topOfBook()  # type: ignore
+
+        return {
+            Side.BUY: [
+                PriceLevelRO(p, self._buys[p]) for p in self._buy_levels[-levels:][::-1]
+            ],
+            Side.SELL: [
+                PriceLevelRO(p, self._sells[p]) for p in self._sell_levels[:levels]
+            ],
+        }
+
+    def __iter__(self) -> Iterator[Order]:
+        """no orders are kept"""
+        return iter(())
+
+    def __repr__(self) -> str:
+        ret = ""
+        for price in reversed(self._sell_levels[:5]):
+            ret += f"\t\t{price:.2f}\t\t{self._sells[price]:.2f}\n"
+        ret += "-----------------------------------------------------\n"
+        for price in reversed(self._buy_levels[-5:]):
+            ret += f"{self._buys[price]:.2f}\t\t{price:.2f}\n"
+        return ret
@@ -1,8 +1,10 @@
+from bisect import bisect_left
 from queue import Queue
 from typing import (
     Any,
     Callable,
     cast,
+    Iterable,
     Iterator,
     List,
     Dict,
@@ -45,13 +47,12 @@ class OrderBook(OrderBookBase):
             exchange_name if isinstance(exchange_name, ExchangeType)
             else ExchangeType(exchange_name or "")
         )
-        self._callback = callback
+        # default callback is to enqueue
+        self._queue: Queue[Event] = Queue()
+        self._callback = callback or self._push
 
         # reset levels and collectors
         self.reset()
-        
-        # default callback is to enqueue
-        self._queue: Queue[Event] = Queue()
 
     @property
     def instrument(self) -> Instrument:
@@ -87,6 +88,21 @@ class OrderBook(OrderBookBase):
         # setup collector for conditional orders
         self._collector = _Collector(self._callback)
 
+    def load(self, orders: Iterable[Order]) -> None:
+        """replace the book with resting orders, e.g. of a snapshot, without
+        matching them against each other or triggering events"""
+        self.reset()
+
+        for order in orders:
+            prices = self._buys if order.side == Side.BUY else self._sells
+            level = prices.get(order.price)
+            if level is None:
+                level = prices[order.price] = _PriceLevel(order.price, self._collector)
+            level._orders.append(order)
+
+        self._buy_levels = sorted(self._buys)
+        self._sell_levels = sorted(self._sells)
+
     def setCallback(self, callback: Callable) -> None:
         self._callback = callback
         self._collector.setCallback(callback)
@@ -102,7 +118,7 @@ class OrderBook(OrderBookBase):
         levels = self._buy_levels if side == Side.BUY else self._sell_levels
         prices = self._buys if side == Side.BUY else self._sells
 
-        if price not in levels:
+        if price not in prices:
             return None
         
         # find order from pricelevel
@@ -150,14 +166,14 @@ class OrderBook(OrderBookBase):
                     self._sells[price].volume,
                     len(self._sells[price])
                 )
-                if price in self._sell_levels
+                if price in self._sells
                 else None,
                 PriceLevelRO(
                     self._buys[price].price,
                     self._buys[price].volume,
                     len(self._buys[price])
                 )
-                if price in self._buy_levels
+                if price in self._buys
                 else None
             )
         
@@ -283,11 +299,12 @@ class OrderBook(OrderBookBase):
         levels = self._buy_levels if side == Side.BUY else self._sell_levels
         prices = self._buys if side == Side.BUY else self._sells
 
-        if price not in levels:
+        if price not in prices:
             raise Exception("Orderbook out of sync")
         
         # modify order in price level
         prices[price].modify(order)
+        self._collector.commit()
 
     def cancel(self, order: Order) -> None:
         """remove an order from the order book, potentially triggering events:
@@ -300,24 +317,31 @@ class OrderBook(OrderBookBase):
         levels = self._buy_levels if side == Side.BUY else self._sell_levels
         prices = self._buys if side == Side.BUY else self._sells
 
-        if price not in levels:
+        if price not in prices:
             return
         
         # remove order from price level
         prices[price].remove(order)
+        self._collector.commit()
 
         # delete level if no more volume
         if not prices[price]:
-            levels.remove(price)
+            del prices[price]
+            del levels[bisect_left(levels, price)]
 
     def _clearOrders(self, order: Order, amount: int) -> None:
         """Internal"""
+        if not amount:
+            return
+
         if order.side == Side.BUY:
+            for price in self._sell_levels[:amount]:
+                del self._sells[price]
             self._sell_levels = self._sell_levels[amount:]
         else:
-            self._buy_levels = (
-                self._buy_levels[:-amount] if amount else self._buy_levels
-            )
+            for price in self._buy_levels[-amount:]:
+                del self._buys[price]
+            self._buy_levels = self._buy_levels[:-amount]
 
     def _getTop(self, side: Side, cleared: int) -> Optional[float]:
         """
@@ -344,7 +368,7 @@ class OrderBook(OrderBookBase):
         secondaries: List[Order] = []
 
         # get the top price on the opposite side of book
-        top = self._getTop(order.Side, self._collector.clearedLevels())
+        top = self._getTop(order.side, self._collector.clearedLevels())
 
         # set levels to the right side
         levels = self._buy_levels if order.side == Side.BUY else self._sell_levels
@@ -359,6 +383,8 @@ class OrderBook(OrderBookBase):
             else:
                 # with a flag, the price dicdates the "max allowed price" to AON or FOK under
                 order_price = order.price
+        else:
+            order_price = order.price
 
         # check if crosses
         while top and (
@@ -0,0 +1,194 @@
+from typing import TYPE_CHECKING, Dict, Iterable, List, Mapping, Optional, Tuple, Union
+
+import numpy as np  # type: ignore
+
+from aat.config import Side
+
+if TYPE_CHECKING:
+    from .data import Event, Trade
+    from .exchange import ExchangeType
+    from .instrument import Instrument
+    from .order_book import OrderBook, OrderBookLite
+
+    _Books = Iterable[Union[OrderBook, OrderBookLite]]
+
+# relative size below which a position is flat, e.g. after fills of 0.1 + 0.2
+# closing one of 0.3
+_FLAT = 1e-9
+
+
+class PositionManager(object):
+    """Positions, average prices and PnL per instrument and exchange.
+
+    Each fill updates its position's size, average price and realized PnL in
+    place, in O(1), rather than recomputing them from the history of trades.
+    Positions are kept in parallel numpy arrays, so unrealized PnL of all of
+    them is marked to market in one vectorized pass (see `mark`).
+
+    As an event handler, our fills (TRADE events of one of our orders, see
+    `Trade.my_order`) update positions.
+
+    Args:
+        capacity (int): positions preallocated, grown as needed
+    """
+
+    def __init__(self, capacity: int = 1024) -> None:
+        # (instrument, exchange) -> index into the arrays
+        self._index: Dict[Tuple["Instrument", "ExchangeType"], int] = {}
+        self._keys: List[Tuple["Instrument", "ExchangeType"]] = []
+
+        # instrument -> indices of its positions, on each exchange
+        self._by_instrument: Dict["Instrument", List[int]] = {}
+
+        self._size = np.zeros(capacity)
+        self._price = np.zeros(capacity)
+        self._realized = np.zeros(capacity)
+        self._mark = np.full(capacity, np.nan)
+
+    def _slot(self, instrument: "Instrument", exchange: "ExchangeType") -> int:
+        key = (instrument, exchange)
+        slot = self._index.get(key)
+        if slot is None:
+            slot = self._index[key] = len(self._keys)
+            self._keys.append(key)
+            self._by_instrument.setdefault(instrument, []).append(slot)
+            if slot == len(self._size):
+                self._grow()
+        return slot
+
+    def _grow(self) -> None:
+        n = len(self._size)
+        self._size = np.concatenate((self._size, np.zeros(n)))
+        self._price = np.concatenate((self._price, np.zeros(n)))
+        self._realized = np.concatenate((self._realized, np.zeros(n)))
+        self._mark = np.concatenate((self._mark, np.full(n, np.nan)))
+
+    def fill(
+        self,
+        instrument: "Instrument",
+        exchange: "ExchangeType",
+        side: Side,
+        volume: float,
+        price: float,
+    ) -> float:
+        """apply a fill of `volume` at `price`, returning the PnL it realized"""
+        slot = self._slot(instrument, exchange)
+        size = self._size[slot].item()
+        average = self._price[slot].item()
+        signed = volume if side == Side.BUY else -volume
+        if not signed:
+            return 0.0
+
+        realized = 0.0
+        after = size + signed
+        if size == 0 or (size > 0) == (signed > 0):
+            # opening, or adding to the position
+            average = (size * average + signed * price) / after
+        elif abs(after) <= _FLAT * abs(size):
+            # closing it, up to rounding
+            realized = abs(size) * (price - average) * (1 if size > 0 else -1)
+            after = average = 0.0
+        else:
+            # reducing the position, and opening the other way past flat
+            closed = min(abs(signed), abs(size))
+            realized = closed * (price - average) * (1 if size > 0 else -1)
+            if abs(signed) > abs(size):
+                average = price
+
+        self._size[slot] = after
+        self._price[slot] = average
+        self._realized[slot] += realized
+        return realized
+
+    def applyTrade(self, trade: "Trade") -> float:
+        """apply a fill of ours, see `fill`"""
+        return self.fill(
+            trade.instrument,
+            trade.exchange,
+            trade.my_order.side,
+            trade.volume,
+            trade.price,
+        )
+
+    def onTrade(self, event: "Event") -> None:
+        trade: "Trade" = event.target  # type: ignore
+        if trade.my_order is not None:
+            self.applyTrade(trade)
+
+    def mark(self, prices: Union["_Books", Mapping["Instrument", float]]) -> float:
+        """mark positions to market, at the mids of order books (of their
+        instrument and exchange), or at prices by instrument (on every
+        exchange), returning the total unrealized PnL. Positions without a
+        mark yet, e.g. of one sided books, are left out"""
+        slots: List[int] = []
+        marks: List[float] = []
+        if isinstance(prices, Mapping):
+            for instrument, price in prices.items():
+                for slot in self._by_instrument.get(instrument, ()):
+                    slots.append(slot)
+                    marks.append(price)
+        else:
+            index = self._index
+            for book in prices:
+                slot = index.get((book.instrument, book.exchange))  # type: ignore
+                if slot is None:
+                    continue
+                mid = _mid(book)
+                if mid is not None:
+                    slots.append(slot)
+                    marks.append(mid)
+
+        if slots:
+            self._mark[slots] = marks
+        return float(np.nansum(self.unrealized()))
+
+    def unrealized(self) -> np.ndarray:
+        """unrealized PnL of each position (see `keys`), at their last marks"""
+        n = len(self._keys)
+        return self._size[:n] * (self._mark[:n] - self._price[:n])
+
+    def realized(self) -> float:
+        """total realized PnL"""
+        return float(self._realized[: len(self._keys)].sum())
+
+    def keys(self) -> List[Tuple["Instrument", "ExchangeType"]]:
+        """(instrument, exchange) of each position, in the order of arrays"""
+        return list(self._keys)
+
+    def positions(self) -> Dict[str, np.ndarray]:
+        """columns of size, average price, realized and unrealized PnL and last
+        mark of each position (see `keys`)"""
+        n = len(self._keys)
+        return {
+            "size": self._size[:n].copy(),
+            "price": self._price[:n].copy(),
+            "realized": self._realized[:n].copy(),
+            "unrealized": self.unrealized(),
+            "mark": self._mark[:n].copy(),
+        }
+
+    def position(
+        self, instrument: "Instrument", exchange: "ExchangeType"
+    ) -> Optional[Dict[str, float]]:
+        """size, average price, realized and unrealized PnL and last mark of a
+        position, if any"""
+        slot = self._index.get((instrument, exchange))
+        if slot is None:
+            return None
+        return {
+            "size": self._size[slot].item(),
+            "price": self._price[slot].item(),
+            "realized": self._realized[slot].item(),
+            "unrealized": (
+                self._size[slot] * (self._mark[slot] - self._price[slot])
+            ).item(),
+            "mark": self._mark[slot].item(),
+        }
+
+
+def _mid(book: Union["OrderBook", "OrderBookLite"]) -> Optional[float]:
+    tob = book.topOfBook()
+    bid, ask = tob[Side.BUY], tob[Side.SELL]
+    if not bid.volume or not ask.volume:
+        return None
+    return (bid.price + ask.price) / 2
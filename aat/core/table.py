@@ -0,0 +1,261 @@
+import json
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
+
+import numpy as np  # type: ignore
+
+from .data import Data, Event, Order, Trade
+from .data.codec import timestampNs
+from .handler import EventHandler
+
+# column dtypes by schema type. Strings are fixed width, as in the binary
+# codec, and times are ns since epoch
+_DTYPES: Dict[Type, str] = {int: "<i8", float: "<f8", str: "S40", bool: "u1"}
+
+# ids are strings for some venues and ints for others
+_COLUMN_DTYPES: Dict[str, str] = {"id": "S40", "timestamp": "<i8"}
+
+# trades' schema lacks what they trade
+_EXTRA: Dict[Type, Dict[str, Type]] = {
+    Trade: {"side": str, "instrument": str, "exchange": str}
+}
+
+# table of each event target type
+TABLES: Dict[Type, str] = {Order: "orders", Trade: "trades", Data: "data"}
+
+
+def _getter(column: str) -> Callable[[Any], Any]:
+    """the value of `column` of a target, as stored"""
+    if column == "timestamp":
+        return lambda t: timestampNs(t.timestamp)
+    if column in ("instrument", "exchange"):
+        return lambda t: getattr(t, column).name
+    if column in ("side", "type"):
+        return lambda t: getattr(t, column).value
+    if column == "id":
+        return lambda t: str(t.id)
+    return lambda t: getattr(t, column)
+
+
+class _Table(object):
+    """A ring buffer of the last `capacity` rows, a numpy array per column.
+
+    Rows are staged in lists and copied into the ring `_STAGE` at a time (or
+    a ring's worth, if smaller), so appending a row allocates nothing but its
+    values.
+    """
+
+    _STAGE = 1024
+
+    def __init__(self, schema: Dict[str, Type], capacity: int) -> None:
+        self.dtypes = {"event": _DTYPES[str]}
+        for column, type in schema.items():
+            dtype = _COLUMN_DTYPES.get(column) or _DTYPES.get(type)
+            if dtype is None:
+                # columns are stored raw, objects would be stored as pointers
+                raise Exception(
+                    "Cannot store column {} of type {}".format(column, type)
+                )
+            self.dtypes[column] = dtype
+        self.getters = [(c, _getter(c)) for c in schema]
+
+        self.capacity = capacity
+        self.stage = min(self._STAGE, capacity)
+        self.columns = {c: np.empty(capacity, dtype=d) for c, d in self.dtypes.items()}
+
+        # rows ever appended to the ring, and of those, flushed
+        self.count = 0
+        self.flushed = 0
+
+        self._staged: Dict[str, List[Any]] = {c: [] for c in self.dtypes}
+
+    def append(self, event: Event) -> None:
+        staged = self._staged
+        target = event.target
+        staged["event"].append(event.type.value)
+        for column, getter in self.getters:
+            staged[column].append(getter(target))
+        if len(staged["event"]) >= self.stage:
+            self.commit()
+
+    def commit(self) -> None:
+        """copy staged rows into the ring"""
+        staged = self._staged
+        n = len(staged["event"])
+        if not n:
+            return
+
+        # rows beyond a ring's worth would be overwritten anyway
+        start = (self.count + max(0, n - self.capacity)) % self.capacity
+        for column, values in staged.items():
+            array = np.asarray(values, dtype=self.dtypes[column])[-self.capacity :]
+            ring = self.columns[column]
+            # wrapping around the end of the ring if need be
+            first = min(len(array), self.capacity - start)
+            ring[start : start + first] = array[:first]
+            ring[: len(array) - first] = array[first:]
+            values.clear()
+        self.count += n
+
+    def rows(self, first: int, last: int) -> Dict[str, np.ndarray]:
+        """columns of rows [first, last) (counted from the first ever appended),
+        views where they don't wrap around the ring"""
+        first = max(first, self.count - self.capacity, 0)
+        last = max(min(last, self.count), first)
+        start, stop = first % self.capacity, last % self.capacity
+
+        if last - first == self.capacity or (start >= stop and last > first):
+            return {
+                c: np.concatenate((ring[start:], ring[:stop]))
+                for c, ring in self.columns.items()
+            }
+        n = last - first
+        return {c: ring[start : start + n] for c, ring in self.columns.items()}
+
+    def bisect(self, ns: int) -> int:
+        """first row (counted from the first ever appended) at or after `ns`,
+        of those in the ring. Rows are expected in time order"""
+        first = max(self.count - self.capacity, 0)
+        lo, hi = first, self.count
+        timestamps = self.columns["timestamp"]
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if timestamps[mid % self.capacity] < ns:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+
+class TableHandler(EventHandler):
+    """Logs events into columnar ring buffers, one table per event target
+    type (see `TABLES`), with a column per field of the target's `schema`
+    plus the event type.
+
+    Tables keep the last `capacity` rows in memory for cheap windowed
+    queries (see `window`). With a `path`, rows are also flushed to it every
+    `flush_rows` rows or `flush_interval` seconds, whichever comes first,
+    and always before the ring would overwrite them: each column of each
+    table is appended to `<path>/<table>/<column>.bin`, raw, of the dtype
+    recorded in `<path>/<table>/schema.json`, e.g. to be read back with
+    `np.fromfile` or `np.memmap`.
+
+    Args:
+        capacity (int): rows kept in memory per table
+        path (str): directory to flush tables to, or empty to keep them in memory only
+        flush_rows (int): rows to flush at a time
+        flush_interval (float): seconds between flushes of fewer rows
+    """
+
+    def __init__(
+        self,
+        capacity: int = 1 << 20,
+        path: str = "",
+        flush_rows: int = 1 << 16,
+        flush_interval: float = 1.0,
+    ) -> None:
+        self._capacity = capacity
+        self._path = path
+        self._flush_rows = min(flush_rows, capacity)
+        self._flush_interval = flush_interval
+        self._flush_time = time.monotonic()
+
+        self._tables: Dict[str, _Table] = {}
+        for target, name in TABLES.items():
+            schema = dict(target.schema())
+            schema.update(_EXTRA.get(target, {}))
+            self._tables[name] = _Table(schema, capacity)
+
+    def _append(self, event: Event) -> None:
+        name = TABLES.get(type(event.target))
+        if name is None:
+            # no table for it
+            return
+        table = self._tables[name]
+        table.append(event)
+        if not self._path or table._staged["event"]:
+            # flushes are only due as rows are committed
+            return
+
+        unflushed = table.count - table.flushed
+        if (
+            unflushed >= self._flush_rows
+            # the next commit would overwrite rows not flushed yet
+            or unflushed + table.stage > table.capacity
+            or time.monotonic() - self._flush_time > self._flush_interval
+        ):
+            self.flush()
+
+    onTrade = onOpen = onCancel = onChange = onFill = onData = _append  # type: ignore
+    onBought = onSold = onReceived = onRejected = onCanceled = _append  # type: ignore
+
+    def onExit(self, event: Event) -> None:
+        self.flush()
+
+    def table(self, name: str) -> Dict[str, np.ndarray]:
+        """every row of table `name` in memory, oldest first"""
+        return self.window(name)
+
+    def window(
+        self,
+        name: str,
+        last: int = 0,
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+    ) -> Dict[str, np.ndarray]:
+        """columns of rows of table `name` in memory: the `last` rows, or
+        with times (ns since epoch) in [start, end), or all of them. Views of
+        the ring where rows don't wrap around it, valid until it does"""
+        table = self._tables[name]
+        table.commit()
+
+        first, stop = 0, table.count
+        if start is not None:
+            first = table.bisect(start)
+        if end is not None:
+            stop = table.bisect(end)
+        if last:
+            first = max(first, stop - last)
+        return table.rows(first, stop)
+
+    def flush(self) -> None:
+        """append rows not flushed yet to `path`"""
+        self._flush_time = time.monotonic()
+        if not self._path:
+            return
+
+        for name, table in self._tables.items():
+            table.commit()
+            if table.flushed == table.count:
+                continue
+
+            directory = os.path.join(self._path, name)
+            if not table.flushed:
+                os.makedirs(directory, exist_ok=True)
+                with open(os.path.join(directory, "schema.json"), "w") as fp:
+                    json.dump(table.dtypes, fp)
+
+            for column, values in table.rows(table.flushed, table.count).items():
+                with open(os.path.join(directory, column + ".bin"), "ab") as fp:
+                    fp.write(np.ascontiguousarray(values).tobytes())
+            table.flushed = table.count
+
+
+def load(path: str, name: str) -> Dict[str, np.ndarray]:
+    """columns of a table flushed by a `TableHandler` to `path`, memory mapped"""
+    directory = os.path.join(path, name)
+    with open(os.path.join(directory, "schema.json")) as fp:
+        dtypes: Dict[str, str] = json.load(fp)
+
+    ret: Dict[str, np.ndarray] = {}
+    for column, dtype in dtypes.items():
+        file = os.path.join(directory, column + ".bin")
+        if os.path.getsize(file):
+            ret[column] = np.memmap(file, dtype=dtype, mode="r")
+        else:
+            ret[column] = np.empty(0, dtype=dtype)
+    return ret
+
+
+__all__: Tuple[str, ...] = ("TableHandler", "TABLES", "load")
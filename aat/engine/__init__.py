@@ -0,0 +1,2 @@
+from .engine import EventEngine  # noqa: F401
+from .queue import CALLBACKS, POLICIES  # noqa: F401
@@ -0,0 +1,109 @@
+import asyncio
+import logging
+from typing import Any, Dict, List, Sequence
+
+from aat.config import EventType
+from aat.core import Event
+
+from ..exchange.base.market_data import _MarketData
+from .queue import _HandlerQueue
+
+
+class EventEngine(object):
+    """Drives exchanges' market data into event handlers.
+
+    Each exchange's `tick_batches` stream is run by a task of its own, which
+    routes each batch to the handlers with a callback for each event's type
+    (see `CALLBACKS`). Every handler has its own bounded queue, and a task
+    delivering it events a batch at a time, so a slow handler only holds up
+    others (or the streams) as far as its backpressure policy says.
+
+    Handlers get a START event before any market data, and an EXIT event
+    once every stream has ended and everything queued was delivered. The
+    exchanges are closed once the engine stops.
+
+    Args:
+        exchanges (Sequence[_MarketData]): exchanges (or e.g. a `TickMerge`) to run
+        batch (int): most events delivered to a handler at a time
+    """
+
+    def __init__(self, exchanges: Sequence[_MarketData], batch: int = 1024) -> None:
+        self._exchanges = list(exchanges)
+        self._batch = batch
+        self._queues: List[_HandlerQueue] = []
+
+        # event type -> queues of the handlers taking it
+        self._routes: Dict[EventType, List[_HandlerQueue]] = {}
+
+        self._running = False
+
+    def registerHandler(
+        self, handler: Any, policy: str = "block", capacity: int = 65536
+    ) -> None:
+        """add a handler of `on<Type>` callbacks (see `CALLBACKS`), sync or
+        async, with its backpressure `policy` (see `POLICIES`) once `capacity`
+        events are queued for it"""
+        if self._running:
+            raise Exception("Cannot register handlers while running")
+
+        name = "{}{}".format(type(handler).__name__, len(self._queues))
+        queue = _HandlerQueue(name, handler, policy, capacity, self._batch)
+        self._queues.append(queue)
+        for event_type in queue.callbacks:
+            self._routes.setdefault(event_type, []).append(queue)
+
+    async def _route(self, batch: List[Event]) -> None:
+        routes = self._routes
+        if len(self._queues) == 1:
+            # one handler, just drop what it doesn't take
+            queue = self._queues[0]
+            wants = queue.callbacks
+            events = [e for e in batch if e.type in wants]
+            if events:
+                await queue.put(events)
+            return
+
+        per: Dict[_HandlerQueue, List[Event]] = {}
+        for event in batch:
+            for queue in routes.get(event.type, ()):
+                events = per.get(queue)
+                if events is None:
+                    events = per[queue] = []
+                events.append(event)
+
+        for queue, events in per.items():
+            await queue.put(events)
+
+    async def _stream(self, exchange: _MarketData) -> None:
+        async for batch in exchange.tick_batches():  # type: ignore
+            await self._route(batch)
+
+    async def run(self) -> None:
+        """run until every exchange's stream ends, and handlers are done"""
+        self._running = True
+        handlers = [asyncio.ensure_future(q.run()) for q in self._queues]
+        try:
+            await self._route([Event(type=EventType.START, target=None)])
+            await asyncio.gather(*(self._stream(e) for e in self._exchanges))
+            await self._route([Event(type=EventType.EXIT, target=None)])
+
+            for queue in self._queues:
+                queue.close()
+            await asyncio.gather(*handlers)
+        finally:
+            for task in handlers:
+                task.cancel()
+
+            # release the exchanges' connections, e.g. http sessions and websockets
+            closed = await asyncio.gather(
+                *(e.close() for e in self._exchanges), return_exceptions=True
+            )
+            for exchange, result in zip(self._exchanges, closed):
+                if isinstance(result, Exception):
+                    logging.warning("closing %r failed: %s", exchange, result)
+            self._running = False
+
+    def metrics(self) -> Dict[str, Dict[str, float]]:
+        """per handler, queue depth, event counts and batch processing times,
+        see `_HandlerQueue.metrics`"""
+        return {queue.name: queue.metrics() for queue in self._queues}
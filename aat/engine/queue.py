@@ -0,0 +1,216 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Hashable, List, Optional, Tuple
+
+from aat.common import LatencyMetrics
+from aat.config import EventType
+from aat.core import Event
+
+# backpressure policies, when a handler's queue is full:
+#   block:       the exchange streams wait for the handler to catch up, the
+#                queue never holds more than its capacity
+#   drop_oldest: the oldest queued events are dropped
+#   conflate:    once full, queued market data is replaced by newer data of
+#                the same instrument, and the streams wait if that isn't enough
+#                (the queue holding up to a batch more than its capacity
+#                meanwhile). Book updates are never conflated. Below capacity
+#                every event is delivered, in order
+POLICIES = ("block", "drop_oldest", "conflate")
+
+# handler callback per event type
+CALLBACKS: Dict[EventType, str] = {
+    EventType.TRADE: "onTrade",
+    EventType.OPEN: "onOpen",
+    EventType.CANCEL: "onCancel",
+    EventType.CHANGE: "onChange",
+    EventType.FILL: "onFill",
+    EventType.DATA: "onData",
+    EventType.HALT: "onHalt",
+    EventType.CONTINUE: "onContinue",
+    EventType.ERROR: "onError",
+    EventType.START: "onStart",
+    EventType.EXIT: "onExit",
+    EventType.BOUGHT: "onBought",
+    EventType.SOLD: "onSold",
+    EventType.RECEIVED: "onReceived",
+    EventType.REJECTED: "onRejected",
+    EventType.CANCELED: "onCanceled",
+}
+
+# event types only the latest of (per instrument) matters to a conflating handler
+_CONFLATED = frozenset((EventType.DATA,))
+
+
+def _conflationKey(event: Event) -> Optional[Hashable]:
+    if event.type not in _CONFLATED:
+        return None
+    data = getattr(event.target, "data", None)
+    if isinstance(data, dict) and "changes" in data:
+        # book snapshots and deltas, every one of which a book built from
+        # them needs
+        return None
+    return (event.type, getattr(event.target, "instrument", None))
+
+
+class _HandlerQueue(object):
+    """A handler's queue of events, and the task delivering them to it.
+
+    Events are delivered up to `batch` at a time, so the queue and the event
+    loop are visited once per batch rather than per event.
+
+    Args:
+        name (str): name of the handler in metrics
+        handler (Any): object with `on<Type>` callbacks, see `CALLBACKS`
+        policy (str): backpressure policy when full, in `POLICIES`
+        capacity (int): events queued before backpressure applies
+        batch (int): most events delivered at a time
+    """
+
+    def __init__(
+        self, name: str, handler: Any, policy: str, capacity: int, batch: int
+    ) -> None:
+        if policy not in POLICIES:
+            raise NotImplementedError("`policy` must be in {}".format(POLICIES))
+
+        self.name = name
+        self.handler = handler
+        self._policy = policy
+        self._capacity = capacity
+        self._batch = batch
+
+        # event type -> (callback, whether it is a coroutine function)
+        self.callbacks: Dict[EventType, Tuple[Callable, bool]] = {}
+        for type, attr in CALLBACKS.items():
+            callback = getattr(handler, attr, None)
+            if callback is not None:
+                self.callbacks[type] = (
+                    callback,
+                    asyncio.iscoroutinefunction(callback),
+                )
+
+        self._queue: Deque[Event] = deque(
+            maxlen=capacity if policy == "drop_oldest" else None
+        )
+        self._ready = asyncio.Event()
+        self._space = asyncio.Event()
+        self._closed = False
+
+        # counters, see `metrics`
+        self.received = 0
+        self.processed = 0
+        self.dropped = 0
+        self.conflated = 0
+        self.errors = 0
+        self.max_depth = 0
+        self.latency = LatencyMetrics()
+
+    async def put(self, events: List[Event]) -> None:
+        """queue events, applying backpressure if full"""
+        queue = self._queue
+        received = len(events)
+
+        if self._policy == "conflate" and len(queue) + received > self._capacity:
+            # only once full, drop market data superseded by newer data
+            queue.extend(events)
+            events = []
+            queue = self._compact()
+            while len(self._queue) > self._capacity and not self._closed:
+                self._space.clear()
+                await self._space.wait()
+            queue = self._queue
+        elif self._policy == "block":
+            # as much of the batch as there is room for at a time
+            while events and not self._closed:
+                while len(queue) >= self._capacity and not self._closed:
+                    self._space.clear()
+                    await self._space.wait()
+                if self._closed:
+                    # the rest is delivered before stopping
+                    break
+                room = self._capacity - len(queue)
+                queue.extend(events[:room])
+                events = events[room:]
+                self.max_depth = max(self.max_depth, len(queue))
+                self._ready.set()
+        elif self._policy == "drop_oldest":
+            self.dropped += max(0, len(queue) + received - self._capacity)
+
+        queue.extend(events)
+        self.received += received
+        if len(queue) > self.max_depth:
+            self.max_depth = len(queue)
+        self._ready.set()
+
+    def _compact(self) -> Deque[Event]:
+        """drop queued events superseded by newer ones of the same key"""
+        keys = [_conflationKey(e) for e in self._queue]
+        latest = {key: i for i, key in enumerate(keys) if key is not None}
+        queue = deque(
+            e
+            for i, (e, key) in enumerate(zip(self._queue, keys))
+            if key is None or latest[key] == i
+        )
+        self.conflated += len(self._queue) - len(queue)
+        self._queue = queue
+        return queue
+
+    def _take(self) -> List[Event]:
+        queue = self._queue
+        if len(queue) <= self._batch:
+            events = list(queue)
+            queue.clear()
+        else:
+            popleft = queue.popleft
+            events = [popleft() for _ in range(self._batch)]
+        self._space.set()
+        return events
+
+    def close(self) -> None:
+        """deliver what is queued, then stop"""
+        self._closed = True
+        self._ready.set()
+        self._space.set()
+
+    async def run(self) -> None:
+        callbacks = self.callbacks
+
+        while True:
+            if not self._queue:
+                if self._closed:
+                    return
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+
+            events = self._take()
+            start = time.perf_counter()
+            for event in events:
+                callback, is_async = callbacks[event.type]
+                try:
+                    if is_async:
+                        await callback(event)
+                    else:
+                        callback(event)
+                except Exception:
+                    self.errors += 1
+                    logging.exception("handler %s failed on %r", self.name, event)
+
+            self.processed += len(events)
+            self.latency.record("batch", time.perf_counter() - start)
+
+    def metrics(self) -> Dict[str, float]:
+        """queue depth, counts of events, and batch processing times (seconds)"""
+        ret: Dict[str, float] = {
+            "depth": len(self._queue),
+            "max_depth": self.max_depth,
+            "received": self.received,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "conflated": self.conflated,
+            "errors": self.errors,
+        }
+        for stat, value in self.latency.summary().get("batch", {}).items():
+            ret["batch_" + stat] = value
+        return ret
@@ -1,2 +1,20 @@
+from typing import TYPE_CHECKING
+
+from ..common import _lazy
 from .exchange import Exchange  # noqa: F401
-#from .synthetic import SyntheticExchange  # noqa: F401
\ No newline at end of file
+
+# from .synthetic import SyntheticExchange  # noqa: F401
+__getattr__, __dir__ = _lazy(
+    __name__,
+    {
+        "bootstrap": ".startup",
+        "ExchangeStartup": ".startup",
+        "TickMerge": ".merge",
+    },
+)
+
+__all__ = ["Exchange", "bootstrap", "ExchangeStartup", "TickMerge"]
+
+if TYPE_CHECKING:
+    from .startup import ExchangeStartup, bootstrap  # noqa: F401
+    from .merge import TickMerge  # noqa: F401
@@ -1,20 +1,33 @@
 from abc import ABCMeta
-from typing import AsyncIterator, List, Optional
+from typing import TYPE_CHECKING, AsyncIterator, List, Optional
 
-from aat import Instrument, Event, OrderBook
+if TYPE_CHECKING:
+    # only annotations, leave loading them to the exchanges
+    from aat import Instrument, Event, OrderBook
 
 class _MarketData(metaclass=ABCMeta):
     """internal only class to represent the stream-source side of a data source"""
 
-    async def instruments(self) -> List[Instrument]:
+    async def instruments(self) -> List["Instrument"]:
         """get a list of available instruments"""
         return []
     
-    async def subscribe(self, instrument: Instrument) -> None:
+    async def subscribe(self, instrument: "Instrument") -> None:
         """subscribe to market data for a given instrument"""
 
-    async def tick(self) -> AsyncIterator[Event]:
+    async def tick(self) -> AsyncIterator["Event"]:
         """return data from exchange"""
 
-    async def book(self, instrument: Instrument) -> Optional[OrderBook]:
-        """return orderbook"""
\ No newline at end of file
+    async def tick_batches(self) -> AsyncIterator[List["Event"]]:
+        """return data from exchange in batches, e.g. per frame or time slice.
+
+        Exchanges which can receive several events at once should override this,
+        by default each event from `tick` is its own batch"""
+        async for event in self.tick():  # type: ignore
+            yield [event]
+
+    async def book(self, instrument: "Instrument") -> Optional["OrderBook"]:
+        """return orderbook"""
+
+    async def close(self) -> None:
+        """release connections and other resources, once done with the exchange"""
\ No newline at end of file
@@ -1,20 +1,22 @@
 from abc import ABCMeta
-from typing import List
-from aat.core import Order, Position
+from typing import TYPE_CHECKING, List, Optional
+
+if TYPE_CHECKING:
+    from aat.core import Instrument, Order, Position
 
 class _OrderEntry(metaclass=ABCMeta):
     """internal only class to represent the rest-sink
     side of a data source"""
     
-    async def accounts(self) -> List[Position]:
+    async def accounts(self) -> List["Position"]:
         """get accounts from source"""
         return []
     
-    async def balance(self) -> List[Position]:
+    async def balance(self) -> List["Position"]:
         """Get cash balance"""
         return []
     
-    async def newOrder(self, order: Order) -> bool:
+    async def newOrder(self, order: "Order") -> bool:
         """submit a new order to the exchange. should set the given order's `id` field to exchange-assigned id
 
         Returns:
@@ -25,7 +27,7 @@ class _OrderEntry(metaclass=ABCMeta):
         """
         raise NotImplementedError()
     
-    async def cancelOrder(self, order: Order) -> bool:
+    async def cancelOrder(self, order: "Order") -> bool:
         """cancel a previously submitted order to the exchange.
 
         Returns:
@@ -34,4 +36,34 @@ class _OrderEntry(metaclass=ABCMeta):
 
         For MarketData-only, can just return False/None
         """
-        raise NotImplementedError()
\ No newline at end of file
+        raise NotImplementedError()
+
+    async def newOrders(self, orders: List["Order"]) -> List[bool]:
+        """submit several new orders to the exchange, as `newOrder`.
+
+        Returns:
+            per order, True if order received, False if order rejected
+
+        By default orders are submitted one at a time, exchanges which can
+        submit concurrently or in bulk should override this
+        """
+        return [await self.newOrder(order) for order in orders]
+
+    async def cancelOrders(self, orders: List["Order"]) -> List[bool]:
+        """cancel several previously submitted orders, as `cancelOrder`.
+
+        Returns:
+            per order, True if order received, False if order rejected
+
+        By default orders are cancelled one at a time, exchanges which can
+        cancel concurrently or in bulk should override this
+        """
+        return [await self.cancelOrder(order) for order in orders]
+
+    async def cancelAll(self, instrument: Optional["Instrument"] = None) -> List[str]:
+        """cancel all open orders, or all open orders of `instrument`.
+
+        Returns:
+            ids of the orders cancelled, none if request rejected
+        """
+        raise NotImplementedError()
@@ -0,0 +1,105 @@
+# decoding throughput of the full channel, on recorded or synthetic frames
+import json
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from aat.config import InstrumentType, TradingType
+from aat.core import ExchangeType, Instrument, OrderBook
+from aat.exchange.replay import Replay
+
+from .client import CoinbaseExchangeClient
+from .decode import BACKEND, loads
+
+
+def _syntheticFrames(count: int, product_id: str) -> List[bytes]:
+    """a plausible full channel stream: orders received, opened, matched, changed and done"""
+    frames = []
+    sequence = 0
+
+    def frame(**kwargs: Any) -> None:
+        nonlocal sequence
+        sequence += 1
+        msg = {"type": kwargs.pop("type"), "product_id": product_id, "sequence": sequence}
+        msg["time"] = "2020-01-01T00:00:00.000000Z"
+        msg.update(kwargs)
+        frames.append(json.dumps(msg, separators=(",", ":")).encode())
+
+    i = 0
+    while len(frames) < count:
+        side = "buy" if i % 2 else "sell"
+        price = "{:.2f}".format(10000 + (i % 200) * (1 if side == "sell" else -1) * 0.01)
+        maker, taker = "m-{}".format(i), "t-{}".format(i)
+        frame(type="received", order_id=maker, size="1.5", price=price, side=side, order_type="limit")
+        frame(type="open", order_id=maker, price=price, remaining_size="1.5", side=side)
+        frame(type="received", order_id=taker, size="0.5", price=price, side=side, order_type="limit")
+        frame(type="match", trade_id=i, maker_order_id=maker, taker_order_id=taker, size="0.5", price=price, side=side)
+        frame(type="done", order_id=taker, reason="filled", price=price, side=side, remaining_size="0")
+        frame(type="change", order_id=maker, new_size="0.5", old_size="1", price=price, side=side)
+        frame(type="done", order_id=maker, reason="canceled", price=price, side=side, remaining_size="0.5")
+        i += 1
+    return frames[:count]
+
+
+def _recordedFrames(
+    recording: str, product_id: Optional[str] = None
+) -> Tuple[str, List[bytes]]:
+    """(product id, frames) of a product in a recording (see `Recorder`), by
+    default the first recorded"""
+    if product_id is None:
+        for _, frames in Replay(recording).batches():
+            product_id = next(
+                (p for p in (loads(f).get("product_id") for f in frames) if p), None
+            )
+            if product_id is not None:
+                break
+        else:
+            raise Exception("No product in recording {}".format(recording))
+
+    frames = []
+    for _, batch in Replay(recording, product_ids=[product_id]).batches():
+        frames.extend(batch)
+    return product_id, frames
+
+
+def benchmark(frames: List[bytes], product_id: str) -> Dict[str, float]:
+    """messages per second on one core, decoding and applying full channel
+    frames to an l3 book, for each available json backend"""
+    exchange = ExchangeType("coinbasepro")
+    instrument = Instrument(
+        name=product_id, type=InstrumentType.PAIR, exchange=exchange, broker_id=product_id
+    )
+
+    backends = {"json": json.loads}
+    if BACKEND != "json":
+        backends[BACKEND] = loads
+
+    ret = {}
+    for name, backend in backends.items():
+        client = CoinbaseExchangeClient(TradingType.LIVE, exchange, "", "", "")
+        books = {product_id: OrderBook(instrument, exchange, callback=lambda e: None)}
+        handlers = client._l3_handlers
+
+        start = time.perf_counter()
+        for frame in frames:
+            x = backend(frame)
+            handler = handlers.get(x["type"])
+            if handler is not None:
+                handler(x, books[x["product_id"]])
+        ret[name] = len(frames) / (time.perf_counter() - start)
+    return ret
+
+
+if __name__ == "__main__":
+    # python -m aat.exchange.crypto.coinbase.bench [recording [product id]]
+    import sys
+
+    if len(sys.argv) > 1:
+        product, recorded = _recordedFrames(
+            sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None
+        )
+    else:
+        product = "BTC-USD"
+        recorded = _syntheticFrames(200_000, product)
+
+    for backend, rate in benchmark(recorded, product).items():
+        print("{:>8}: {:>12,.0f} msg/s".format(backend, rate))
@@ -1,24 +1,29 @@
+import asyncio
 import base64
 import hashlib
 import hmac
 import json
+import logging
+import os
 import time
+import uuid
 from datetime import datetime
 from functools import lru_cache
-from typing import Any, AsyncGenerator, Dict, List, Optional, Union, cast
+from typing import TYPE_CHECKING, Any, AsyncGenerator, Awaitable, Callable, Collection, Dict, List, Optional, Tuple, Union, cast
 
-import aiohttp
-import requests
-from requests import models
+import numpy as np  # type: ignore
 
 # from aat import Instrument, InstrumentType, Account, Position
 from aat import (
+    Data,
     Event,
     EventType,
     ExchangeType,
     Instrument,
     InstrumentType,
     Order,
+    OrderBook,
+    OrderBookLite,
     OrderFlag,
     OrderType,
     Position,
@@ -26,20 +31,183 @@ from aat import (
     Trade,
     TradingType,
 )
-from requests.auth import AuthBase
+from aat.common import LatencyMetrics
+from aat.core.data.codec import _SIDE_CODES, _from_ns
+from aat.core.exchange.db import _exchangedb
+from aat.exchange.replay import Keyframes, Pacer, Recorder, Replay
+
+from .decode import OPPOSITE_SIDES, SIDES, frameType, loads
+from .ratelimit import PRIORITY_CANCEL, PRIORITY_NEW, PRIORITY_QUERY, _RequestScheduler
+from .replay import _ReplaySequencer
+
+if TYPE_CHECKING:
+    # the network stack is only loaded once used, replaying and converting
+    # recordings don't need it
+    import aiohttp
+
+    from .websocket import _ManagedWebsocket
 
 _REST = "https://api.pro.coinbase.com"
 _WS = "wss://ws-feed.pro.coinbase.com"
 _REST_SANDBOX = "https://api-public.sandbox.pro.coinbase.com"
 _WS_SANDBOX = "wss://ws-feed-public.sandbox.pro.coinbase.com"
 
+# http connection pool size, keep-alive (seconds) and request timeout (seconds)
+_POOL_SIZE = 32
+_KEEPALIVE = 60.0
+_TIMEOUT = 10.0
+
+# coinbase rate limits (requests per second, burst), and each
+# endpoint's bucket and priority. Private limits are per account
+_LIMITS: Tuple[Dict[str, Tuple[float, float]], Dict[str, Tuple[str, int]], Tuple[str, int]] = (
+    {"public": (3.0, 6.0), "private": (5.0, 10.0)},
+    {
+        "cancelOrder": ("private", PRIORITY_CANCEL),
+        "cancelAll": ("private", PRIORITY_CANCEL),
+        "newOrder": ("private", PRIORITY_NEW),
+        "accounts": ("private", PRIORITY_QUERY),
+        "account": ("private", PRIORITY_QUERY),
+        "products": ("public", PRIORITY_QUERY),
+        "orderBook": ("public", PRIORITY_QUERY),
+    },
+    ("private", PRIORITY_QUERY),
+)
+
+# attempts of a request the venue throttles regardless
+_THROTTLE_RETRIES = 3
+
+# max concurrent account lookups, and how long (seconds) to cache accounts
+_ACCOUNT_CONCURRENCY = 8
+_ACCOUNTS_TTL = 30.0
+
 _SUBSCRIPTION: Dict[str, Union[str, List[str]]] = {
     "type": "subscribe",
     "product_ids": [],
     "channels": ["user", "heartbeat"],
 }
 
-class CoinbaseExchangeClient(AuthBase):
+# how long (seconds) a cached instrument catalog is used without refreshing,
+# how long a worker waits for another to fetch it, and after how long an
+# abandoned refresh lock is ignored
+_CATALOG_TTL = 24 * 3600.0
+_CATALOG_WAIT = 10.0
+_CATALOG_LOCK_TIMEOUT = 60.0
+
+# products list kept alongside a recording, to replay it without fetching one
+PRODUCTS = "products.json"
+
+# how far (ns) before a keyframe to look for messages applied after it
+_KEYFRAME_SLACK = 5_000_000_000
+
+# message types of interest on the unsequenced channels, others are dropped undecoded
+_USER_TYPES = ("received", "match", "done", "error")
+_L2_TYPES = frozenset(("l2update", "ticker", "snapshot") + _USER_TYPES)
+_TRADES_TYPES = frozenset(("ticker",) + _USER_TYPES)
+
+_Handler = Callable[[Dict[str, Any], Any], Optional[Event]]
+
+
+def _readCatalog(path: str) -> Optional[Tuple[float, List[dict]]]:
+    """(fetch time, products) of a cached catalog, None if missing or unreadable"""
+    try:
+        with open(path) as fp:
+            catalog = json.load(fp)
+        return float(catalog["fetched"]), catalog["products"]
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def _writeCatalog(path: str, products: List[dict]) -> None:
+    # write aside and rename, readers never see a partial catalog
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = "{}.{}.tmp".format(path, os.getpid())
+    with open(tmp, "w") as fp:
+        json.dump({"fetched": time.time(), "products": products}, fp)
+    os.replace(tmp, path)
+
+
+def _createLock(lock: str) -> bool:
+    """create `lock` holding our pid, False if it exists"""
+    try:
+        fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return False
+    with os.fdopen(fd, "w") as fp:
+        fp.write(str(os.getpid()))
+    return True
+
+
+def _lockCatalog(path: str) -> bool:
+    """take the lock on fetching a catalog, False if another process has it"""
+    lock = path + ".lock"
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    if _createLock(lock):
+        return True
+
+    aside = "{}.{}".format(lock, os.getpid())
+    try:
+        with open(lock) as fp:
+            owner = fp.read()
+        if time.time() - os.path.getmtime(lock) <= _CATALOG_LOCK_TIMEOUT:
+            return False
+
+        # left behind by a worker which died: move it aside, which only one
+        # of several workers taking it over at once does
+        os.rename(lock, aside)
+        with open(aside) as fp:
+            moved = fp.read()
+    except OSError:
+        return False
+
+    if moved != owner:
+        # another worker took it over first and this is its fresh lock
+        os.rename(aside, lock)
+        return False
+
+    os.unlink(aside)
+    return _createLock(lock)
+
+
+def _unlockCatalog(path: str) -> None:
+    lock = path + ".lock"
+    try:
+        with open(lock) as fp:
+            if fp.read() != str(os.getpid()):
+                # not ours (any more), e.g. taken over as stale
+                return
+        os.unlink(lock)
+    except OSError:
+        pass
+
+
+def _keyframeResync(product_id: str, keyframe: Tuple[int, int, Any]) -> Dict[str, Any]:
+    """a synthetic resync message loading a book from a recorded keyframe"""
+    _, sequence, rows = keyframe
+    orders = list(
+        zip(
+            rows["price"].tolist(),
+            rows["volume"].tolist(),
+            [id.decode() for id in rows["id"].tolist()],
+        )
+    )
+    buys = (rows["side"] == _SIDE_CODES[Side.BUY]).tolist()
+    return {
+        "type": "resync",
+        "product_id": product_id,
+        "sequence": sequence,
+        "book": {
+            "sequence": sequence,
+            "bids": [o for o, buy in zip(orders, buys) if buy],
+            "asks": [o for o, buy in zip(orders, buys) if not buy],
+        },
+    }
+
+
+def _ignore(event: Event) -> None:
+    """callback for books maintained from the feed, whose events we emit ourselves"""
+
+
+class CoinbaseExchangeClient(object):
     def __init__(
         self,
         trading_type: TradingType,
@@ -67,171 +235,400 @@ class CoinbaseExchangeClient(AuthBase):
         self.secret_key = secret_key
         self.passphrase = passphrase
 
+        # decode the signing key once, not per request
+        self._hmac_key = base64.b64decode(secret_key)
+
+        # shared http session, see `_session`
+        self._http: Optional["aiohttp.ClientSession"] = None
+
+        # request latency by endpoint
+        self.metrics = LatencyMetrics()
+
+        # rate limits, queueing delay by endpoint is in `limiter.metrics`
+        self.limiter = _RequestScheduler(*_LIMITS)
+
+        # cached result of `instruments`
+        self._instruments: Optional[List[Instrument]] = None
+
+        # if set, file the products list is cached in across processes, and
+        # any refresh of it in flight
+        self.catalog: Optional[str] = None
+        self._catalog_refresh: Optional["asyncio.Future[None]"] = None
+
+        # websocket feeds opened, closed with the client
+        self._websockets: List["_ManagedWebsocket"] = []
+
+        # cached result of `accounts`, the time it was loaded, and any in-flight load
+        self._accounts_cache: Optional[List[Position]] = None
+        self._accounts_time = 0.0
+        self._accounts_loading: Optional["asyncio.Future[List[Position]]"] = None
+
         # multiply by 100,000,000 and do everything in integer volumes
         self._multiple = 100_000_000 if satoshis else 1.0
 
-        # order_map
+        # our open orders, by exchange id. Evicted on `done`
         self._order_map: Dict[str, Order] = {}
 
-        # sequence number for order book
-        self.seqnum: Dict[Instrument, int] = {}
+        # our submitted orders whose exchange id is not known yet, by client_oid
+        self._pending: Dict[str, Order] = {}
+
+        # orders resting on the l3 books, by order id
+        self._resting: Dict[str, Order] = {}
+
+        # sequence number for order book, by product id
+        self.seqnum: Dict[str, int] = {}
+
+        # if set, every raw websocket frame is recorded
+        self.recorder: Optional[Recorder] = None
+
+        # product id -> interned instrument, populated by `instruments`
+        self._by_product_id: Dict[str, Instrument] = _exchangedb.brokerIds(exchange)
+
+        # websocket message type -> handler(message, book), returning an event or None
+        self._l3_handlers: Dict[str, _Handler] = {
+            "received": self._process_received,
+            "open": self._process_open,
+            "done": self._process_done,
+            "match": self._process_match,
+            "change": self._process_change,
+        }
+        self._l2_handlers: Dict[str, _Handler] = {
+            "l2update": self._process_l2update,
+            "ticker": self._process_ticker,
+            "snapshot": self._process_snapshot,
+            # our orders, from the user channel
+            "received": self._process_received,
+            "match": self._process_fill,
+            "done": self._process_done,
+        }
+        self._trades_handlers: Dict[str, _Handler] = {
+            "ticker": self._process_ticker,
+            "received": self._process_received,
+            "match": self._process_fill,
+            "done": self._process_done,
+        }
+
+    def _sign(self, timestamp: str, method: str, path: str, body: str = "") -> str:
+        """sign a message in the coinbase specified auth scheme"""
+        message = timestamp + method + path + body
+        signature = hmac.new(self._hmac_key, message.encode(), hashlib.sha256)
+        return base64.b64encode(signature.digest()).decode()
+
+    def _session(self) -> "aiohttp.ClientSession":
+        """shared keep-alive, connection pooled session.
+
+        Created lazily as it must be constructed inside the running event loop"""
+        if self._http is None or self._http.closed:
+            import aiohttp
+
+            self._http = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=_POOL_SIZE, keepalive_timeout=_KEEPALIVE
+                ),
+                timeout=aiohttp.ClientTimeout(total=_TIMEOUT),
+                json_serialize=json.dumps,
+            )
+        return self._http
+
+    async def close(self) -> None:
+        """close websocket feeds and the shared http session, and flush the
+        recorder if any"""
+        for ws in self._websockets:
+            ws.close()
+        self._websockets = []
+
+        if self._http is not None and not self._http.closed:
+            await self._http.close()
+        self._http = None
+
+        if self.recorder is not None:
+            self.recorder.close()
+
+        if self._catalog_refresh is not None:
+            self._catalog_refresh.cancel()
+
+    async def _request(
+        self, endpoint: str, method: str, path: str, jsn: Optional[dict] = None
+    ) -> Tuple[int, Any]:
+        """issue a signed request, rate limited and prioritized by `endpoint`
+        (see `_LIMITS`), returning (status, json body). Identical in-flight GETs
+        share one request"""
+        key = (method, path) if method == "GET" else None
+
+        for _ in range(_THROTTLE_RETRIES):
+            status, res = await self.limiter.submit(
+                endpoint, lambda: self._send(endpoint, method, path, jsn), key
+            )
+            if status != 429:
+                break
 
-    def __call__(self, request):
-        # This is used by `requests` to sign the requests
-        # in the coinbase specified auth scheme
-        timestamp = str(time.time())
-        message = (
-            timestamp
-            + request.method
-            + request.path_url
-            + (request.body or b"").decode()
-        )
-        hmac_key = base64.b64decode(self.secret_key)
-        signature = hmac.new(hmac_key, message.encode(), hashlib.sha256)
-        signature_b64 = base64.b64encode(signature.digest()).decode()
+            # throttled anyway, e.g. by another client on the same key
+            self.limiter.throttled(endpoint)
 
-        request.headers.update(
-            {
-                "CB-ACCESS-SIGN": signature_b64,
-                "CB-ACCESS-TIMESTAMP": timestamp,
-                "CB-ACCESS-KEY": self.api_key,
-                "CB-ACCESS-PASSPHRASE": self.passphrase,
-                "Content-Type": "application/json",
-            }
-        )
+        return status, res
 
-        return request
-    
-    def _products(self) -> dict:
+    async def _send(
+        self, endpoint: str, method: str, path: str, jsn: Optional[dict] = None
+    ) -> Tuple[int, Any]:
+        """issue a signed request over the shared session,
+        returning (status, json body). `endpoint` names the request for metrics"""
+        body = json.dumps(jsn) if jsn is not None else ""
+        timestamp = str(time.time())
+        headers = {
+            "CB-ACCESS-SIGN": self._sign(timestamp, method, path, body),
+            "CB-ACCESS-TIMESTAMP": timestamp,
+            "CB-ACCESS-KEY": self.api_key,
+            "CB-ACCESS-PASSPHRASE": self.passphrase,
+            "Content-Type": "application/json",
+        }
+
+        with self.metrics.time(endpoint):
+            async with self._session().request(
+                method, self.api_url + path, data=body or None, headers=headers
+            ) as resp:
+                return resp.status, await resp.json(content_type=None)
+
+    async def _products(self) -> dict:
         """fetch list of products from coinbase rest api"""
-        return requests.get(f"{self.api_url}/products", auth=self).json()
-    
-    def _accounts(self) -> dict:
+        return (await self._request("products", "GET", "/products"))[1]
+
+    async def _accounts(self) -> dict:
         """fetch a list of accounts from coinbase rest api"""
-        return requests.get(f"{self.api_url}/accounts", auth=self).json()
+        return (await self._request("accounts", "GET", "/accounts"))[1]
 
-    def _account(self, account_id: str) -> dict:
+    async def _account(self, account_id: str) -> dict:
         """fetch single account info from coinbase rest api"""
-        return requests.get(
-            f"{self.api_url}/accounts/{account_id}", auth=self
-        ).json()
-    
-    def _newOrder(self, order_json: dict) -> str:
+        return (await self._request("account", "GET", f"/accounts/{account_id}"))[1]
+
+    async def _newOrder(self, order_json: dict) -> str:
         """create a new order"""
 
         # post my order to the rest endpoint
-        res = requests.post(
-            f"{self.api_url}/orders", json=order_json, auth=self
-        )
+        status, res = await self._request("newOrder", "POST", "/orders", order_json)
 
         # if successful, return the new order id
-        if res.status_code == 200:
+        if status == 200:
             # TODO what if filled immediately?
-            return res.json()["id"]
+            return res["id"]
 
-        # TODO    
+        # TODO
         return ""
-    
-    def _cancelOrder(self, order_jsn: dict) -> bool:
+
+    async def _cancelOrder(self, order_jsn: dict) -> bool:
         """delete an existing order"""
         # delete order with given order id
-        resp = requests.delete(
-            "{}/{}/{}?product_id={}".format(
-                self.api_url, "orders", order_jsn["id"], order_jsn["product_id"]
-            ),
-            auth=self
+        status, _ = await self._request(
+            "cancelOrder",
+            "DELETE",
+            "/orders/{}?product_id={}".format(order_jsn["id"], order_jsn["product_id"]),
         )
 
         # if successfully deleted, return True
-        if resp.status_code == 200:
-            return True
-        # otherwise return false
-        return False
-    
-    def _orderBook(self, id: str) -> dict:
+        return status == 200
+
+    async def _cancelAll(self, product_id: str = "") -> Optional[List[str]]:
+        """delete all open orders, or all open orders of `product_id`,
+        returning the ids of those deleted, None if rejected"""
+        path = "/orders?product_id={}".format(product_id) if product_id else "/orders"
+        status, res = await self._request("cancelAll", "DELETE", path)
+        if status != 200 or not isinstance(res, list):
+            return None
+        return [str(id) for id in res]
+
+    async def _orderBook(self, id: str) -> dict:
         # fetch an instrument's level 3 orderbook from rest api
-        return requests.get(
-            f"{self.api_url}/products/{id}/book?level=3", auth=self
-        ).json()
-    
-    @lru_cache(None)
-    def instruments(self) -> List[Instrument]:
-        """construct a list of instruments from the coinbase-returned json list of instruments"""
+        status, book = await self._request(
+            "orderBook", "GET", f"/products/{id}/book?level=3"
+        )
+        if not 200 <= status < 300:
+            # e.g. throttled, or a server error
+            raise Exception(
+                "Coinbase order book {} failed: {} {}".format(id, status, book)
+            )
+        return book
+
+    async def instruments(self) -> List[Instrument]:
+        """construct a list of instruments from the coinbase-returned json list of instruments.
+
+        With a `catalog`, the products list is loaded from it rather than
+        fetched while less than `_CATALOG_TTL` old. Older, it is still used,
+        and refreshed in the background"""
+        # only fetch once
+        if self._instruments is not None:
+            return self._instruments
+
+        products = None
+        if self.catalog:
+            cached = _readCatalog(self.catalog)
+            if cached is not None:
+                fetched, products = cached
+                if time.time() - fetched > _CATALOG_TTL:
+                    self._catalog_refresh = asyncio.ensure_future(
+                        self._refreshCatalog()
+                    )
+
+        if products is None:
+            products = await self._fetchCatalog()
+
+        if self.recorder is not None:
+            _writeCatalog(os.path.join(self.recorder.path, PRODUCTS), products)
+
+        self._instruments = self._register(products)
+        return self._instruments
+
+    def loadInstruments(self, paths: List[str]) -> List[Instrument]:
+        """construct instruments from the first readable catalog of `paths`,
+        however old, without fetching anything, e.g. to replay a recording"""
+        for path in paths:
+            cached = _readCatalog(path)
+            if cached is not None:
+                self._instruments = self._register(cached[1])
+                return self._instruments
+        raise Exception(
+            "No coinbase instrument catalog in: {}".format(", ".join(paths))
+        )
+
+    async def _fetchCatalog(self) -> List[dict]:
+        """fetch the products list into the catalog, if any. Of several
+        workers sharing a catalog, one fetches while the others wait for it"""
+        if not self.catalog:
+            return await self._products()  # type: ignore
+
+        deadline = time.monotonic() + _CATALOG_WAIT
+        while not _lockCatalog(self.catalog):
+            if time.monotonic() > deadline:
+                # give up waiting, fetch our own
+                return await self._products()  # type: ignore
+            await asyncio.sleep(0.1)
+
+            cached = _readCatalog(self.catalog)
+            if cached is not None:
+                return cached[1]
+
+        try:
+            products = await self._products()
+            if isinstance(products, list):
+                _writeCatalog(self.catalog, products)
+            return products  # type: ignore
+        finally:
+            _unlockCatalog(self.catalog)
+
+    async def _refreshCatalog(self) -> None:
+        """refresh a stale catalog, registering any new products"""
+        if not _lockCatalog(cast(str, self.catalog)):
+            # another worker is refreshing it
+            return
+
+        try:
+            products = await self._products()
+            if isinstance(products, list):
+                _writeCatalog(cast(str, self.catalog), products)
+                self._instruments = self._register(products)
+        except Exception as e:
+            logging.warning("coinbase instrument catalog refresh failed: %s", e)
+        finally:
+            _unlockCatalog(cast(str, self.catalog))
+
+    def _register(self, products: List[dict]) -> List[Instrument]:
         ret = []
-        
-        # this will fetch a list of pairs
-        products = self._products()
-        
+
         for product in products:
             # separate pair into base and quote
             first = product["base_currency"]
             second = product["quote_currency"]
 
             # for each pair, construct both underlying currencies as well as
-            # the pair object
+            # the pair object, interned so websocket messages can resolve
+            # their product id to the shared instance
             ret.append(
-                Instrument(
-                    name="{}-{}".format(first, second),
-                    type=InstrumentType.PAIR,
-                    exchange=self.exchange,
-                    broker_id=product["id"],
-                    leg1=self.currency(first),
-                    leg2=self.currency(second),
-                    leg1_side=Side.BUY,
-                    leg2_side=Side.SELL,
-                    price_increment=float(product["base_increment"]),
+                _exchangedb.register(
+                    Instrument(
+                        name="{}-{}".format(first, second),
+                        type=InstrumentType.PAIR,
+                        exchange=self.exchange,
+                        broker_id=product["id"],
+                        leg1=self.currency(first),
+                        leg2=self.currency(second),
+                        leg1_side=Side.BUY,
+                        leg2_side=Side.SELL,
+                        price_increment=float(product["base_increment"]),
+                    ),
+                    self.exchange,
+                    product["id"],
                 )
             )
 
         return ret
-    
+
     @lru_cache(None)
     def currency(self, symbol: str) -> Instrument:
         # construct a base currency from the symbol
-        return Instrument(name=symbol, type=InstrumentType.CURRENCY)
+        return _exchangedb.register(
+            Instrument(name=symbol, type=InstrumentType.CURRENCY)
+        )
     
-    @lru_cache(None)
-    async def accounts(self) -> List[Position]:
-        """fetch a list of coinbase accounts. These store quantities of InstrumentType.CURRENCY"""
-        ret = []
-        
+    async def accounts(self, refresh: bool = False) -> List[Position]:
+        """fetch a list of coinbase accounts. These store quantities of InstrumentType.CURRENCY
+
+        Results are cached for `_ACCOUNTS_TTL` seconds, pass `refresh=True` to
+        force a reload. Concurrent callers share a single in-flight load."""
+        if (
+            not refresh
+            and self._accounts_cache is not None
+            and time.monotonic() - self._accounts_time < _ACCOUNTS_TTL
+        ):
+            return self._accounts_cache
+
+        if self._accounts_loading is None or self._accounts_loading.done():
+            self._accounts_loading = asyncio.ensure_future(self._loadAccounts())
+        return await asyncio.shield(self._accounts_loading)
+
+    async def _loadAccounts(self) -> List[Position]:
         # fetch all accounts
-        accounts = self._accounts()
+        accounts = await self._accounts()
 
         # if unauthorized or invalid api key, raise
         if accounts == {"message": "Unauthorized."} or \
             accounts == {"message": "Invalid API Key"}:
             raise Exception("Coinbase Auth Failed")
-        
-        # for each account
-        for account in accounts:
-            # grab the id to lookup info
-            acc_data = self._account(account["id"])
 
+        # bound the number of account lookups in flight
+        semaphore = asyncio.Semaphore(_ACCOUNT_CONCURRENCY)
+
+        async def _details(account: dict) -> dict:
+            # the listing normally carries everything we need,
+            # only look up accounts where it doesn't
+            if "balance" in account and "trading_enabled" in account:
+                return account
+            async with semaphore:
+                return await self._account(account["id"])
+
+        ret = []
+        now = datetime.now()
+
+        # grab info for all accounts concurrently
+        for acc_data in await asyncio.gather(*(_details(a) for a in accounts)):
             # if tradeable and positive balance
             if acc_data["trading_enabled"] and float(acc_data["balance"]) > 0:
                 # construct a position representing the balance
-                
                 pos = Position(
                     float(acc_data["balance"]) * self._multiple,
                     0.0,
-                    datetime.now(),
-                    Instrument(
-                        acc_data["currency"],
-                        InstrumentType.CURRENCY,
-                        exchange=self.exchange,
-                    ),
+                    now,
+                    self.currency(acc_data["currency"]),
                     self.exchange,
                     []
                 )
                 ret.append(pos)
 
+        self._accounts_cache = ret
+        self._accounts_time = time.monotonic()
         return ret
 
     async def newOrder(self, order: Order) -> bool:
         """given an aat order, construct a coinbase order json"""
         jsn: Dict[str, Union[str, int, float]] = {}
-        jsn["product_id"] = order.instrument.name
+        jsn["product_id"] = cast(str, order.instrument.brokerId)
 
         if order.order_type == OrderType.LIMIT:
             jsn["type"] = "limit"
@@ -277,12 +674,23 @@ class CoinbaseExchangeClient(AuthBase):
             elif stop_order.order_type == OrderType.MARKET:
                 jsn["type"] = "market"
 
+        # our id for the order, so websocket messages which
+        # beat the REST response can be matched to it
+        client_oid = str(uuid.uuid4())
+        jsn["client_oid"] = client_oid
+        self._pending[client_oid] = order
+
         # submit the order json
-        id = self._newOrder(jsn)
+        try:
+            id = await self._newOrder(jsn)
+        finally:
+            self._pending.pop(client_oid, None)
+
         if id != "":
-            # successful
-            order.id = str(id)
-            self._order_map[order.id] = order
+            # successful, unless already resolved from the websocket
+            if order.id != id:
+                order.id = str(id)
+                self._order_map[order.id] = order
             return True
         
         return False
@@ -292,8 +700,87 @@ class CoinbaseExchangeClient(AuthBase):
         jsn = {}
         
         jsn["id"] = order.id
-        jsn["product_id"] = cast(str. order.instrument.brokerId)
-        return self._cancelOrder(jsn)
+        jsn["product_id"] = cast(str, order.instrument.brokerId)
+        return await self._cancelOrder(jsn)
+
+    async def newOrders(self, orders: List[Order]) -> List[bool]:
+        """submit orders concurrently over the pooled session, returning per order success"""
+        return await self._concurrently(self.newOrder, orders)
+
+    async def cancelOrders(self, orders: List[Order]) -> List[bool]:
+        """cancel orders concurrently over the pooled session, returning per order
+        success. Several orders which are all of a product's open orders (of
+        those we track) are cancelled in one request for the product"""
+        by_product: Dict[str, List[int]] = {}
+        for i, order in enumerate(orders):
+            by_product.setdefault(cast(str, order.instrument.brokerId), []).append(i)
+
+        open: Dict[str, set] = {}
+        for id, order in self._order_map.items():
+            open.setdefault(cast(str, order.instrument.brokerId), set()).add(id)
+
+        products = [
+            product_id
+            for product_id, indices in by_product.items()
+            if len(indices) > 1
+            and product_id in open
+            and {orders[i].id for i in indices} >= open[product_id]
+        ]
+        singles = [
+            i
+            for product_id, indices in by_product.items()
+            if product_id not in products
+            for i in indices
+        ]
+
+        results = await asyncio.gather(
+            self._concurrently(self.cancelOrder, [orders[i] for i in singles]),
+            *(
+                self._cancelProduct(p, [orders[i] for i in by_product[p]])
+                for p in products
+            ),
+        )
+
+        ret = [False] * len(orders)
+        for indices, result in zip(
+            [singles] + [by_product[p] for p in products], results
+        ):
+            for i, success in zip(indices, result):
+                ret[i] = success
+        return ret
+
+    async def _cancelProduct(self, product_id: str, orders: List[Order]) -> List[bool]:
+        """cancel every open order of a product, returning which of `orders` were"""
+        try:
+            canceled = await self._cancelAll(product_id)
+        except Exception as e:
+            logging.error("coinbase cancel of all %s orders failed: %s", product_id, e)
+            canceled = None
+        ids = set(canceled or ())
+        return [order.id in ids for order in orders]
+
+    async def cancelAll(self, instrument: Optional[Instrument] = None) -> List[str]:
+        """cancel all open orders in one request, or all open orders of `instrument`,
+        returning the ids of those cancelled"""
+        canceled = await self._cancelAll(
+            cast(str, instrument.brokerId) if instrument else ""
+        )
+        return canceled or []
+
+    async def _concurrently(
+        self, request: Callable[[Order], Awaitable[bool]], orders: List[Order]
+    ) -> List[bool]:
+        # one failure must not fail the rest of the batch
+        results = await asyncio.gather(
+            *(request(order) for order in orders), return_exceptions=True
+        )
+        ret = []
+        for order, result in zip(orders, results):
+            if isinstance(result, BaseException):
+                logging.error("coinbase order request failed for %s: %s", order, result)
+                result = False
+            ret.append(result)
+        return ret
     
     async def orderBook(self, subscriptions: List[Instrument]
                         ) -> AsyncGenerator[Any, Event]:
@@ -304,278 +791,463 @@ class CoinbaseExchangeClient(AuthBase):
             #       {'bids': [[price, volume, id]],
             #        'asks': [[price, volume, id]],
             #        'sequence': <some positive integer>}
-            ob = self._orderBook(cast(str, sub.brokerId))
-            
+            ob = await self._orderBook(cast(str, sub.brokerId))
+
             # set the last sequence number for when we connect to websocket later
-            self.seqnum[sub] = ob["sequence"]
-
-            # generate an open limit order for each bid
-            for bid, qty, id in ob["bids"]:
-                o = Order(
-                    float(qty) * self._multiple,
-                    float(bid),
-                    Side.BUY,
-                    sub,
-                    self.exchange,
-                    order_type=OrderType.LIMIT
-                )
-                yield Event(type=EventType.OPEN, target=o)
-
-            # generate an open limit order for each ask
-            for ask, qty, id in ob["asks"]:
-                o = Order(
-                    float(qty) * self._multiple,
-                    float(ask),
-                    Side.BUY,
-                    sub,
-                    self.exchange,
-                    order_type=OrderType.LIMIT
-                )
-                yield Event(type=EventType.OPEN, target=o)
+            self.seqnum[cast(str, sub.brokerId)] = ob["sequence"]
 
-    async def websocket_l3(self, subscriptions: List[Instrument]):
-        # copy the base subscription template
-        subscription = _SUBSCRIPTION.copy()
-        
-        # fill in l3 details
-        cast(List, subscription["channels"]).append("full")
+            for e in self._snapshot(sub, ob):
+                yield e
 
-        # for each subscription, add symbol to product_uds
-        for sub in subscriptions:
-            cast(List, subscription["product_ids"]).append(sub.brokerId)
+    def _snapshot(self, instrument: Instrument, ob: dict) -> List[Event]:
+        """open events for every order in a level 3 order book snapshot"""
+        ret = []
+
+        # generate an open limit order for each bid
+        for bid, qty, id in ob["bids"]:
+            o = Order(
+                float(qty) * self._multiple,
+                float(bid),
+                Side.BUY,
+                instrument,
+                self.exchange,
+                order_type=OrderType.LIMIT,
+                id=id,
+            )
+            ret.append(Event(type=EventType.OPEN, target=o))
+
+        # generate an open limit order for each ask
+        for ask, qty, id in ob["asks"]:
+            o = Order(
+                float(qty) * self._multiple,
+                float(ask),
+                Side.SELL,
+                instrument,
+                self.exchange,
+                order_type=OrderType.LIMIT,
+                id=id,
+            )
+            ret.append(Event(type=EventType.OPEN, target=o))
+
+        return ret
+
+    def _subscription(
+        self, channels: List[str], product_ids: List[str]
+    ) -> Dict[str, Union[str, List[str]]]:
+        """construct a signed subscription message"""
+        subscription: Dict[str, Union[str, List[str]]] = {
+            "type": "subscribe",
+            "product_ids": list(product_ids),
+            "channels": cast(List[str], _SUBSCRIPTION["channels"]) + channels,
+        }
 
         # sign the message in a similar way to the rest api, but
         # using the message of GET/users/self/verify
         timestamp = str(time.time())
-        message = timestamp + "GET/users/self/verify"
-        hmac_key = base64.b64decode(self.secret_key)
-        signature = hmac.new(hmac_key, message.encode(), hashlib.sha256)
-        signature_b64 = base64.b64encode(signature.digest()).decode()
-
         subscription.update(
             {
-                "signature": signature_b64,
+                "signature": self._sign(timestamp, "GET", "/users/self/verify"),
                 "timestamp": timestamp,
                 "key": self.api_key,
                 "passphrase": self.passphrase,
             }
         )
+        return subscription
 
-        # construct a new websocket session
-        session = aiohttp.ClientSession()
-        
-        # connect to the websocket
-        async with session.ws_connect(self.ws_url) as ws:
-            # send the subscription
-            await ws.send_str(json.dumps(subscription))
-
-            # for each message returned
-            async for msg in ws:
-                # only handle text message
-                if msg.type == aiohttp.WSMsgType.TEXT:
-                    # load the data as json
-                    x = json.loads(msg.data)
-
-                    # skip earlier messages that our orderbook already reflects
-                    if "sequence" in x:
-                        inst = Instrument(
-                            x["product_id"], InstrumentType.PAIR, self.exchange
-                        )
-                        if x.get("sequence", float("inf")) < self.seqnum.get(inst, 0):
-                            # if msg has a sequence number, and that number is < the last sequence number
-                            # ignore
-                            continue
-
-                    if x["type"] in ("subscriptions", "heartbeat"):
-                        # TODO yield heartbeats?
-                        continue
+    def _websocket(
+        self,
+        channels: List[str],
+        subscriptions: List[Instrument],
+        sequenced: bool = False,
+        types: Optional[Collection[str]] = None,
+    ) -> "_ManagedWebsocket":
+        """managed websocket feed, gap checked and resynced if `sequenced`,
+        and dropping unsequenced frames not of `types` before decoding"""
+        from .websocket import _ManagedWebsocket
+
+        ws = _ManagedWebsocket(
+            self,
+            channels,
+            [cast(str, sub.brokerId) for sub in subscriptions],
+            resync=self._orderBook if sequenced else None,
+            types=types,
+        )
+        self._websockets.append(ws)
+        return ws
 
-                    elif x["type"] == "received":
-                        o = self._process_received(x)
-
-                        if o:
-                            # yield an open event for the new order
-                            e = Event(type=EventType.OPEN, target=o)
-                            yield e
-
-                        elif x["type"] == "done":
-                            o = cast(Order, self._process_done(x))
-                            if o:
-                                e = Event(type=EventType.CANCEL, target=o)
-                                yield o
-                        
-                        elif x["type"] == "match":
-                            o = cast(Order, self._process_match(x))
-                            if o:
-                                e = Event(type=EventType.TRADE, target=o)
-                                yield o
-                        
-                        elif x["type"] == "open":
-                            o = cast(Order, self._process_open(x))
-                            if o:
-                                e = Event(type=EventType.OPEN, target=o)
-                                yield o
-                        
-                        elif x["type"] == "change":
-                            o = cast(Order, self._process_change(x))
-                            if o:
-                                e = Event(type=EventType.CHANGE, target=o)
-                                yield o
-                        
-                        elif x["type"] == "error":
-                            pass
-                        else:
-                            # TODO unhandled
-                            print ("TODO: unhandled")
-
-    async def websocket_l2(self, subscriptions: List[Instrument]): 
-        # copy the base subscription template
-        subscription = _SUBSCRIPTION.copy()
-        
-        # fill in l2 details
-        cast(List, subscription["channels"]).append("level2")
+    async def websocket_l3(
+        self,
+        subscriptions: List[Instrument],
+        books: Optional[Dict[str, OrderBook]] = None,
+    ) -> AsyncGenerator[Event, None]:
+        """stream the full channel, maintaining a local order book per product.
 
-        # get trades
-        cast(List, subscription["channels"]).append("ticker")
+        Each product is loaded from a REST snapshot once its first message
+        arrives, with messages buffered meanwhile and applied by sequence (see
+        `_ManagedWebsocket`).
 
-        # for each subcription, add symbol to product_ids
-        for sub in subscriptions:
-            cast(List, subscription["product_ids"]).append(sub.brokerId)
+        Args:
+            subscriptions (List[Instrument]): instruments to stream
+            books (Dict[str, OrderBook]): books to maintain, by product id. Created if not provided
+        """
+        books = self._l3Books(subscriptions, books)
+        handlers = self._l3_handlers
 
-        # sign the message in a similar way to the rest api, but
-        # using the message of GET/users/self/verify
-        timestamp = str(time.time())
-        message = timestamp + "GET/users/self/verify"
-        hmac_key = base64.b64decode(self.secret_key)
-        signature = hmac.new(hmac_key, message.encode(), hashlib.sha256)
-        signature_b64 = base64.b64encode(signature.digest()).decode()
+        events: List[Event] = []
 
-        # update the subscription message with the signing info
-        subscription.update(
-            {
-                "signature": signature_b64,
-                "timestamp": timestamp,
-                "key": self.api_key,
-                "passphrase": self.passphrase,
-            }
-        )
+        # for each message returned, in sequence per product
+        async for x in self._websocket(["full"], subscriptions, True).messages():
+            # resyncs (re)load the product's book from a snapshot
+            self._dispatch(x, handlers, books, events)
 
-        # construct a new websocket session
-        session = aiohttp.ClientSession()
+            for e in events:
+                yield e
+            del events[:]
 
-        # connect to the websocket
-        async with session.ws_connect(self.ws_url) as ws:
-            # send the subscription  
-            await ws.send_str(json.dumps(subscription))
+            # TODO yield heartbeats?
 
-            # for each message returned
-            async for msg in ws:
-                # only handle text message
-                if msg.type == aiohttp.WSMsgType.TEXT:
-                    # load the data as json
-                    x = json.loads(msg.data)
+    async def websocket_l2(
+        self,
+        subscriptions: List[Instrument],
+        books: Optional[Dict[str, OrderBookLite]] = None,
+    ) -> AsyncGenerator[Event, None]:
+        """stream the level2 and ticker channels, maintaining an aggregated book per product.
+
+        Book updates are applied in place and surfaced as one DATA event per
+        message, whose data is `{"snapshot": bool, "changes": [(side, price, volume), ...]}`.
+        A snapshot replaces the book and carries no changes, read the book instead.
+
+        Args:
+            subscriptions (List[Instrument]): instruments to stream
+            books (Dict[str, OrderBookLite]): books to maintain, by product id. Created if not provided
+        """
+        books = self._l2Books(subscriptions, books)
+        handlers = self._l2_handlers
+
+        # l2 updates and trades
+        async for x in self._websocket(
+            ["level2", "ticker"], subscriptions, types=_L2_TYPES
+        ).messages():
+            handler = handlers.get(x["type"])
+
+            if handler is not None:
+                e = handler(x, books.get(x["product_id"]))
+                if e is not None:
+                    yield e
+
+            elif x["type"] == "error":
+                logging.error("coinbase websocket error: %s", x)
+
+    async def websocket_trades(
+        self, subscriptions: List[Instrument]
+    ) -> AsyncGenerator[Event, None]:
+        handlers = self._trades_handlers
+
+        # trades
+        async for x in self._websocket(
+            ["ticker"], subscriptions, types=_TRADES_TYPES
+        ).messages():
+            handler = handlers.get(x["type"])
+
+            if handler is not None:
+                e = handler(x, None)
+                if e is not None:
+                    yield e
+
+            elif x["type"] == "error":
+                logging.error("coinbase websocket error: %s", x)
+
+    async def websocket_batches(
+        self,
+        level: str,
+        subscriptions: List[Instrument],
+        books: Optional[Dict[str, Any]] = None,
+    ) -> AsyncGenerator[List[Event], None]:
+        """like `websocket_l3`, `websocket_l2` or `websocket_trades` by `level`,
+        but yielding the events of everything received since the last batch
+        as one list, see `_ManagedWebsocket.batches`"""
+        handlers, books = self._feed(level, subscriptions, books)
+        if level == "l3":
+            ws = self._websocket(["full"], subscriptions, True)
+        elif level == "l2":
+            ws = self._websocket(["level2", "ticker"], subscriptions, types=_L2_TYPES)
+        else:
+            ws = self._websocket(["ticker"], subscriptions, types=_TRADES_TYPES)
 
-                    # ignore subscription  and heartbeat messages
-                    if x["type"] in ("subscriptions", "heartbeat"):
-                        # TODO yield heartbeats?
-                        continue
+        async for batch in ws.batches():
+            events: List[Event] = []
+            for x in batch:
+                self._dispatch(x, handlers, books, events)
+            if events:
+                yield events
 
-                    elif x["type"] == "snapshot":
-                        # maintain order book internally
-                        # TODO
-                        ...
+    async def replay_batches(
+        self,
+        level: str,
+        subscriptions: List[Instrument],
+        replay: Replay,
+        books: Optional[Dict[str, Any]] = None,
+        speed: float = 0.0,
+    ) -> AsyncGenerator[List[Event], None]:
+        """like `websocket_batches`, but from a recording of the feed.
+
+        Frames are decoded and yielded a recorded block at a time. With a
+        `speed`, receive times are kept to, scaled by `speed` (2.0 replays at
+        twice real time), otherwise the recording is replayed as fast as
+        possible. Sequenced (l3) products are replayed from their next
+        recorded snapshot, see `_ReplaySequencer`.
+
+        Args:
+            level (str): order book level the feed was recorded at, in (l3, l2, trades)
+            subscriptions (List[Instrument]): instruments to replay
+            replay (Replay): recording to replay, see `aat.exchange.replay`
+            books (Dict[str, Any]): books to maintain, by product id. Created if not provided
+            speed (float): wall clock speed multiple, 0 for as fast as possible
+        """
+        handlers, books = self._feed(level, subscriptions, books)
+        if level == "l3":
+            types: Optional[Collection[str]] = None
+            sequencer: Optional[_ReplaySequencer] = _ReplaySequencer()
+        else:
+            types = _L2_TYPES if level == "l2" else _TRADES_TYPES
+            sequencer = None
 
-                    elif x["type"] == "l2update":
-                        # maintain order book internally
-                        # TODO
-                        ...
+        pacer = Pacer(speed)
 
-                    elif x["type"] == "ticker":
-                        # maintain order book internally
-                        # TODO
-                        t = self._process_ticker(x)
-                        e = Event(type=EventType.TRADE, target=t)
-                        yield e
+        for ns, frames in replay.batches():
+            events: List[Event] = []
 
-    async def websocket_trades(self, subscriptions: List[Instrument]):
-        # copy the base subscription template
-        subscription = _SUBSCRIPTION.copy()
+            for i, frame in enumerate(frames):
+                if types is not None:
+                    type = frameType(frame)
+                    if type is not None and type not in types:
+                        continue
 
-        # get trades
-        cast(List, subscription["channels"]).append("ticker")
+                delay = pacer.delay(int(ns[i]))
+                if delay:
+                    if events:
+                        yield events
+                        events = []
+                    await asyncio.sleep(delay)
+
+                x = loads(frame)
+                count = len(events)
+                if sequencer is None:
+                    self._dispatch(x, handlers, books, events)
+                else:
+                    for y in sequencer.process(x):
+                        self._dispatch(y, handlers, books, events)
+
+                if len(events) > count:
+                    # stamp with the recorded receive time, so replays can be
+                    # merged with each other in time order
+                    timestamp = _from_ns(int(ns[i]))
+                    for e in events[count:]:
+                        if e.target is not None:
+                            e.target.timestamp = timestamp
+
+            if events:
+                yield events
+
+    def book_at(
+        self, recording: str, instrument: Instrument, timestamp: int
+    ) -> OrderBook:
+        """the l3 book of `instrument` as of `timestamp` (ns since epoch),
+        rebuilt from a recording: its last keyframe before `timestamp` (see
+        `Recorder.keyframe`) and the recorded messages after it"""
+        product_id = cast(str, instrument.brokerId)
+
+        # a scratch client, so rebuilding does not touch our orders' state
+        client = CoinbaseExchangeClient(
+            TradingType.BACKTEST, self.exchange, "", "", "", self._multiple != 1.0
+        )
+        books = client._l3Books([instrument], None)
+        handlers = client._l3_handlers
+        sequencer = _ReplaySequencer()
+
+        start = 0
+        after: Dict[str, int] = {}
+        keyframe = Keyframes(recording).at(product_id, timestamp)
+        if keyframe is not None:
+            ns, sequence, _ = keyframe
+            for x in sequencer.process(_keyframeResync(product_id, keyframe)):
+                client._dispatch(x, handlers, books, [])
+
+            # messages received shortly before the keyframe may have been
+            # applied after it, skip only those it has by sequence number
+            start = ns - _KEYFRAME_SLACK
+            after[product_id] = sequence + 1
+
+        for ns_, frames in Replay(
+            recording, start=start, sequence=after, product_ids=[product_id]
+        ).batches():
+            stop = int(np.searchsorted(ns_, timestamp, side="right"))
+            for frame in frames[:stop]:
+                for x in sequencer.process(loads(frame)):
+                    client._dispatch(x, handlers, books, [])
+            if stop < len(frames):
+                break
+
+        return books[product_id]
+
+    def _feed(
+        self,
+        level: str,
+        subscriptions: List[Instrument],
+        books: Optional[Dict[str, Any]],
+    ) -> Tuple[Dict[str, _Handler], Dict[str, Any]]:
+        """handlers and books of a feed `level`"""
+        if level == "l3":
+            return self._l3_handlers, self._l3Books(subscriptions, books)
+        elif level == "l2":
+            return self._l2_handlers, self._l2Books(subscriptions, books)
+        return self._trades_handlers, {}
+
+    def _dispatch(
+        self,
+        x: Dict[str, Any],
+        handlers: Dict[str, _Handler],
+        books: Dict[str, Any],
+        events: List[Event],
+    ) -> None:
+        """handle a decoded message, appending any events to `events`"""
+        type = x["type"]
+        handler = handlers.get(type)
 
-        # for each subcription, add symbol to product_ids
-        for sub in subscriptions:
-            cast(List, subscription["product_ids"]).append(sub.brokerId)
+        if handler is not None:
+            e = handler(x, books.get(x["product_id"]))
+            if e is not None:
+                events.append(e)
 
-        # sign the message in a similar way to the rest api, but
-        # using the message of GET/users/self/verify
-        timestamp = str(time.time())
-        message = timestamp + "GET/users/self/verify"
-        hmac_key = base64.b64decode(self.secret_key)
-        signature = hmac.new(hmac_key, message.encode(), hashlib.sha256)
-        signature_b64 = base64.b64encode(signature.digest()).decode()
+        elif type == "resync":
+            events.extend(self._process_resync(x, books[x["product_id"]]))
 
-        # update the subscription message with the signing info
-        subscription.update(
-            {
-                "signature": signature_b64,
-                "timestamp": timestamp,
-                "key": self.api_key,
-                "passphrase": self.passphrase,
-            }
+        else:
+            if type == "error":
+                logging.error("coinbase websocket error: %s", x)
+            return
+
+        if self.recorder is not None and "sequence" in x:
+            self._keyframe(x["product_id"], x["sequence"], books.get(x["product_id"]))
+
+    def _keyframe(self, product_id: str, sequence: int, book: Any) -> None:
+        """record a keyframe of an l3 book, if one is due"""
+        recorder = cast(Recorder, self.recorder)
+        if not isinstance(book, OrderBook) or not recorder.keyframeDue(product_id):
+            return
+
+        # copied out here, as the book changes under the writer thread
+        multiple = self._multiple
+        recorder.keyframe(
+            product_id,
+            sequence,
+            [
+                (o.id, _SIDE_CODES[o.side], o.price, (o.volume - o.filled) / multiple)
+                for o in book
+            ],
         )
 
-        # construct a new websocket session
-        session = aiohttp.ClientSession()
-
-        async with session.ws_connect(self.ws_url) as ws:
-            # send the subscription
-            await ws.send_str(json.dumps(subscription))
-            
-            # for each message returned
-            async for msg in ws:
-                 # only handle text messages
-                if msg.type == aiohttp.WSMsgType.TEXT:
-                    # load the data as json
-                    x = json.loads(msg.data)
-
-                    # ignore subscription  and heartbeat messages
-                    if x["type"] in ("subscriptions", "heartbeat"):
-                        # TODO yield heartbeats?
-                        continue
+    def _l3Books(
+        self, subscriptions: List[Instrument], books: Optional[Dict[str, OrderBook]]
+    ) -> Dict[str, OrderBook]:
+        """`books`, with any missing subscriptions' books created"""
+        if books is None:
+            books = {}
+        for sub in subscriptions:
+            if sub.brokerId not in books:
+                books[cast(str, sub.brokerId)] = OrderBook(
+                    sub, self.exchange, callback=_ignore
+                )
+        return books
+
+    def _l2Books(
+        self, subscriptions: List[Instrument], books: Optional[Dict[str, OrderBookLite]]
+    ) -> Dict[str, OrderBookLite]:
+        """`books`, with any missing subscriptions' books created"""
+        if books is None:
+            books = {}
+        for sub in subscriptions:
+            if sub.brokerId not in books:
+                books[cast(str, sub.brokerId)] = OrderBookLite(sub, self.exchange)
+        return books
 
-                    elif x["type"] == "ticker":
-                        t = self._process_ticker(x)
-                        e = Event(type=EventType.TRADE, target=t)
-                        yield e
+    def _process_ticker(self, x: Dict[str, Any], book: Any = None) -> Event:
+        size = float(x["last_size"]) * self._multiple
+        price = float(x["price"])
 
-    def _process_ticker(self, x: Dict[str, Union[str, int, float]]) -> Trade:
         o = Order(
-            float(x["last_size"]) * self._multiple,
-            float(x["price"]),
-            Side(str(x["side"]).upper()),
-            Instrument(str(x["product_id"]), InstrumentType.PAIR, self.exchange),
+            size,
+            price,
+            SIDES[x["side"]],
+            self._by_product_id[x["product_id"]],
             self.exchange,
-            filled=float(x["last_size"]) * self._multiple
+            filled=size,
         )
+        return Event(type=EventType.TRADE, target=Trade(size, price, o))
 
-        t = Trade(
-            float(x["last_size"]) * self._multiple,
-            float(x["price"]),
-            o
+    def _process_snapshot(self, x: Dict[str, Any], book: OrderBookLite) -> Event:
+        # {
+        #     "type": "snapshot",
+        #     "product_id": "BTC-USD",
+        #     "bids": [["10101.10", "0.45054140"]],
+        #     "asks": [["10102.55", "0.57753524"]]
+        # }
+        multiple = self._multiple
+        book.load(
+            [(float(p), float(v) * multiple) for p, v in x["bids"]],
+            [(float(p), float(v) * multiple) for p, v in x["asks"]],
+        )
+        return Event(
+            type=EventType.DATA,
+            target=Data(
+                book.instrument, self.exchange, data={"snapshot": True, "changes": []}
+            ),
         )
-        return t
-
-    def _process_snapshot(self) -> None:
-        # TODO
-        pass
 
-    def _process_l2update(self) -> None:
-        # TODO
-        pass
+    def _process_l2update(self, x: Dict[str, Any], book: OrderBookLite) -> Event:
+        # size is the new volume at the level, 0 removes it
+        # {
+        #     "type": "l2update",
+        #     "product_id": "BTC-USD",
+        #     "time": "2019-08-14T20:42:27.265Z",
+        #     "changes": [
+        #         ["buy", "10101.80000000", "0.162567"]
+        #     ]
+        # }
+        multiple = self._multiple
+        deltas = [
+            (SIDES[side], float(p), float(v) * multiple) for side, p, v in x["changes"]
+        ]
+        book.apply(deltas)
+        return Event(
+            type=EventType.DATA,
+            target=Data(
+                book.instrument,
+                self.exchange,
+                data={"snapshot": False, "changes": deltas},
+            ),
+        )
 
-    def _process_open(self, x: Dict[str, Union[str, int, float]]) -> Order:
+    def _process_resync(self, x: Dict[str, Any], book: OrderBook) -> List[Event]:
+        # forget the orders of the old book and reload it from the snapshot
+        for o in book:
+            self._resting.pop(o.id, None)
+
+        events = []
+        orders = []
+        for e in self._snapshot(book.instrument, x["book"]):
+            # rest our own order objects where they are ours
+            o = self._order_map.get(e.target.id)
+            if o is not None:
+                e = Event(type=EventType.OPEN, target=o)
+            self._resting[e.target.id] = e.target
+            orders.append(e.target)
+            events.append(e)
+
+        book.load(orders)
+        return events
+
+    def _process_open(self, x: Dict[str, Any], book: OrderBook) -> Optional[Event]:
         # The order is now open on the order book.
         # This message will only be sent for orders
         # which are not fully filled immediately.
@@ -591,61 +1263,85 @@ class CoinbaseExchangeClient(AuthBase):
         #     "remaining_size": "1.00",
         #     "side": "sell"
         # }
+        id = x["order_id"]
 
-        o = Order(
-            float(x["remaining_size"]) * self._multiple,
-            float(x["price"]),
-            Side(str(x["side"]).upper()),
-            Instrument(str(x["product_id"]), InstrumentType.PAIR, self.exchange),
-            self.exchange,
-        )
-        return o
-
-    def _process_match(self, x: Dict[str, Union[str, int, float]]) -> Trade:
-        if str(x.get("taker_order_id", "")) in self._order_map:
-            o = self._order_map[str(x.get("taker_order_id"))]
-
-            o.filled = float(x["size"]) * self._multiple
-
-            # my order
-            mine = True
-
-        elif str(x.get("maker_order_id", "")) in self._order_map:
-            o = self._order_map[str(x.get("maker_order_id"))]
-            # TODO filled?
-
-            # my order
-            mine = True
-
-        else:
+        # rest our own order object if it is ours
+        o = self._order_map.get(id)
+        if o is None:
             o = Order(
-                float(x["size"]) * self._multiple,
+                float(x["remaining_size"]) * self._multiple,
                 float(x["price"]),
-                Side(str(x["side"]).upper()),
-                Instrument(str(x["product_id"]), InstrumentType.PAIR, self.exchange),
+                SIDES[x["side"]],
+                book.instrument,
                 self.exchange,
-                filled=float(x["size"]) * self._multiple,
+                order_type=OrderType.LIMIT,
+                id=id,
             )
 
-            # not my order
-            mine = False
+        self._resting[id] = o
+        book.add(o)
+        return Event(type=EventType.OPEN, target=o)
+
+    def _process_match(self, x: Dict[str, Any], book: OrderBook) -> Optional[Event]:
+        # A trade occurred between two orders. The aggressor
+        # or taker order is the one executing immediately
+        # after being received and the maker order is a
+        # resting order on the book. The side field
+        # indicates the maker order side.
+        # {
+        #     "type": "match",
+        #     "trade_id": 10,
+        #     "sequence": 50,
+        #     "maker_order_id": "ac928c66-ca53-498f-9c13-a110027a60e8",
+        #     "taker_order_id": "132fb6ae-456b-4654-b4e0-d681ac05cea1",
+        #     "time": "2014-11-07T08:19:27.028459Z",
+        #     "product_id": "BTC-USD",
+        #     "size": "5.23512",
+        #     "price": "400.23",
+        #     "side": "sell"
+        # }
+        size = float(x["size"]) * self._multiple
+        price = float(x["price"])
+
+        # the maker is resting on our book, update it in place.
+        # it is removed from the book by its `done` message
+        maker = self._resting.get(x["maker_order_id"])
+        if maker is not None:
+            maker.filled = min(maker.volume, maker.filled + size)
+
+        mine = self._order_map.get(x["taker_order_id"])
+        if mine is not None:
+            # my order, which keeps the cumulative fill as its state
+            mine.filled = min(mine.volume, mine.filled + size)
+        else:
+            mine = self._order_map.get(x["maker_order_id"])
+
+        # the trade is of this match's size only, not of all the taker's
+        # fills so far
+        taker = Order(
+            size,
+            price,
+            OPPOSITE_SIDES[x["side"]],
+            book.instrument,
+            self.exchange,
+            filled=size,
+            id=x["taker_order_id"],
+        )
 
-        # create a trader with this order as the taker
-        # makers would be accumulated via the
-        # `elif x['reason'] == 'filled'` block above
         t = Trade(
-            float(x["size"]) * self._multiple,
-            float(x["price"]),
-            taker_order=o,
-            maker_orders=[],
+            size,
+            price,
+            taker_order=taker,
+            maker_orders=[maker] if maker is not None else [],
+            id=str(x["trade_id"]),
         )
 
-        if mine:
-            t.my_order = o
+        if mine is not None:
+            t.my_order = mine
 
-        return t
+        return Event(type=EventType.TRADE, target=t)
 
-    def _process_done(self, x: Dict[str, Union[str, int, float]]) -> Optional[Order]:
+    def _process_done(self, x: Dict[str, Any], book: OrderBook) -> Optional[Event]:
         # The order is no longer on the order book. Sent for
         # all orders for which there was a received message.
         # This message can result from an order being canceled
@@ -669,46 +1365,27 @@ class CoinbaseExchangeClient(AuthBase):
         #     "side": "sell",
         #     "remaining_size": "0"
         # }
-        if x["reason"] == "canceled":
-            id = x["order_id"]
+        # our order is finished, stop tracking it
+        mine = self._order_map.pop(x["order_id"], None)
 
-            # if cancelled
-            if "price" not in x:
-                # cancel this event if we have a full local order book
-                # where we can determine the original order
-                print("TODO: noprice")
-                return None
-
-            # FIXME don't use remaining_size, lookup original size in order book
-            o = Order(
-                float(x["remaining_size"]) * self._multiple,
-                float(x["price"]),
-                Side(str(x["side"]).upper()),
-                Instrument(
-                    str(x["product_id"]),
-                    InstrumentType.PAIR,
-                    self.exchange,
-                ),
-                self.exchange,
-                id=id,
-            )
-            return o
+        o = self._resting.pop(x["order_id"], None)
 
-        elif x["reason"] == "filled":
-            # Will have a match event
-            # TODO route these to full local order book
+        if o is None:
+            # never rested on the book (filled immediately, a market
+            # order, or an l2 feed). Our own orders still need a cancel
+            if mine is not None and x["reason"] == "canceled":
+                return Event(type=EventType.CANCEL, target=mine)
             return None
 
-        else:
-            # TODO unhandled
-            # this should never print
-            print("TODO: unhandled", x)
+        book.cancel(o)
+
+        if x["reason"] == "canceled":
+            return Event(type=EventType.CANCEL, target=o)
+
+        # filled, the trade was reported by its `match` message
         return None
 
-    def _process_received(
-        self, x: Dict[str, Union[str, int, float]]
-    ) -> Optional[Order]:
-        # generate new Open events
+    def _process_received(self, x: Dict[str, Any], book: OrderBook) -> Optional[Event]:
         # A valid order has been received and is now active.
         # This message is emitted for every single valid order as
         # soon as the matching engine receives it whether it fills
@@ -751,48 +1428,35 @@ class CoinbaseExchangeClient(AuthBase):
         #     "side": "buy",
         #     "order_type": "market"
         # }
-        id = x["order_id"]
-
-        # FIXME make sure we dont need this
-        # if id in self._order_map:
-        #     # yield a received event and get order from dict
-        #     o = self._order_map[id]
-        #     yield Event(type=EventType.RECEIVED, target=o)
-
-        if x["order_type"] == "market":
-            if "size" in x and float(x["size"]) <= 0:
-                # ignore zero size orders
-                # TODO why do we even get these?
+        # received orders do not rest on the book, so
+        # only orders we are tracking are of interest
+        o = self._order_map.get(x["order_id"])
+
+        if o is None:
+            # our order, before its REST submission has returned
+            o = self._pending.pop(x.get("client_oid", ""), None)
+            if o is None:
                 return None
+            o.id = x["order_id"]
+            self._order_map[o.id] = o
 
-            elif "size" not in x and "funds" in x:
-                print("TODO: funds")
-                # TODO can't handle these yet, no mapping from funds to size/price
-                return None
+        return Event(type=EventType.RECEIVED, target=o)
 
-            # create a market data order from the event data
-            # TODO set something for price? float('inf') ?
-            o = Order(
-                float(x["size"]) * self._multiple,
-                0.0,
-                Side(str(x["side"]).upper()),
-                Instrument(str(x["product_id"]), InstrumentType.PAIR, self.exchange),
-                self.exchange,
-                id=id,
-            )
+    def _process_fill(self, x: Dict[str, Any], book: Any = None) -> Optional[Event]:
+        # a `match` of our own order, from the user channel on feeds
+        # without a book. The trade itself arrives via the ticker
+        size = float(x["size"]) * self._multiple
 
-        else:
-            # create limit order from the event data
-            o = Order(
-                float(x["size"]) * self._multiple,
-                float(x["price"]),
-                Side(str(x["side"]).upper()),
-                Instrument(str(x["product_id"]), InstrumentType.PAIR, self.exchange),
-                self.exchange,
-            )
-        return o
+        o = self._order_map.get(x["taker_order_id"]) or self._order_map.get(
+            x["maker_order_id"]
+        )
+        if o is None:
+            return None
+
+        o.filled = min(o.volume, o.filled + size)
+        return Event(type=EventType.FILL, target=o)
 
-    def _process_change(self, x: Dict[str, Union[str, int, float]]) -> Optional[Order]:
+    def _process_change(self, x: Dict[str, Any], book: OrderBook) -> Optional[Event]:
         # An order has changed. This is the result
         # of self-trade prevention adjusting the
         # order size or available funds. Orders can
@@ -825,4 +1489,12 @@ class CoinbaseExchangeClient(AuthBase):
         #     "price": "400.23",
         #     "side": "sell"
         # }
-        ...
+        o = self._resting.get(x["order_id"]) or self._order_map.get(x["order_id"])
+
+        if o is None or "new_size" not in x:
+            # not tracked, or a market order's funds changed
+            return None
+
+        # orders only ever shrink, size is what remains
+        o.volume = o.filled + float(x["new_size"]) * self._multiple
+        return Event(type=EventType.CHANGE, target=o)
@@ -1,23 +1,45 @@
+import asyncio
 import os
-from typing import List, AsyncGenerator, Any
+from datetime import datetime
+from typing import Any, AsyncGenerator, Dict, List, Optional, Union, cast
 from aat import Instrument
 
-from aat.core import ExchangeType, Order, Instrument, Position, Event
+from aat.core import ExchangeType, Order, OrderBook, OrderBookLite, Instrument, Position, Event
 from aat.config import TradingType, InstrumentType
+from aat.core.exchange.db import _exchangedb
+from aat.core.order_book.base import OrderBookBase
 from aat.exchange import Exchange
+from aat.core.data.codec import timestampNs
+from aat.exchange.replay import Pacer, Recorder, Replay, TickStore
 
-from .client import CoinbaseExchangeClient
+from .client import PRODUCTS, CoinbaseExchangeClient
+
+# where the instrument catalog is cached by default
+_CACHE = os.path.join(os.path.expanduser("~"), ".cache", "aat")
 
 class CoinbaseProExchange(Exchange):
     """Coinbase Pro Exchange
 
+    For BACKTEST and SIMULATION, market data is replayed from a recording
+    (see `record`) instead, as fast as possible or at `replay_speed` times
+    real time respectively. No orders reach the venue when replaying, nor is
+    anything fetched from it: instruments are loaded from the products list
+    recorded along (or else the instrument cache).
+
     Args:
-        trading_type (TradingType): type of trading to do. Must be Sandbox or Live
+        trading_type (TradingType): type of trading to do
         verbose (bool): run in verbose mode
         api_key (str): Coinbase API key
         api_secret (str): Coinbase API secret
         api_passphrase (str): Coinbase API passphrase
         order_book_level (str): Level of orderbook to trace, must be 'l3', 'l2', or 'trades'
+        record (str): if set, directory to record the raw websocket feed into
+        replay (str): for BACKTEST and SIMULATION, directory of a recording or tick store to replay
+        replay_start (int): receive time (ns since epoch) to start the replay at
+        replay_sequence (Dict[str, int]): per product id, sequence number to start the replay at
+        replay_speed (float): for SIMULATION, wall clock speed multiple of the replay
+        instrument_cache (str): directory to cache the instrument catalog in across
+            processes, default ~/.cache/aat. Empty to fetch it on every start
     """
 
     def __init__(
@@ -29,6 +51,12 @@ class CoinbaseProExchange(Exchange):
         api_passphrase: str = "",
         order_book_level: str = "trades",
         satoshis: bool = False,
+        record: str = "",
+        replay: str = "",
+        replay_start: int = 0,
+        replay_sequence: Optional[Dict[str, int]] = None,
+        replay_speed: float = 1.0,
+        instrument_cache: str = _CACHE,
         **kwargs: dict
     ) -> None:
         self._trading_type = trading_type
@@ -44,22 +72,30 @@ class CoinbaseProExchange(Exchange):
             raise NotImplementedError("`order_book_level` must be in (l3, l2, trades)")
         self._order_book_level = order_book_level
 
+        # backtest and simulation replay a recording
+        self._replay = replay
+        self._replay_start = replay_start
+        self._replay_sequence = replay_sequence
+        self._replay_speed = (
+            replay_speed if trading_type == TradingType.SIMULATION else 0.0
+        )
+        if trading_type in (TradingType.BACKTEST, TradingType.SIMULATION):
+            if not replay:
+                raise NotImplementedError(
+                    "{} requires a recording to `replay`".format(trading_type)
+                )
+
         # enforce authentication
-        if not (self._api_key and self._api_secret and self._api_passphrase):
+        elif not (self._api_key and self._api_secret and self._api_passphrase):
             raise Exception("No coinbase auth!")
 
-        # don't implement backtest for now
-        if trading_type == TradingType.BACKTEST:
-            raise NotImplementedError()
-        
-        # don't implement simulation for now
-        if trading_type == TradingType.SIMULATION:
-            raise NotImplementedError()
-        
         if self._trading_type == TradingType.SANDBOX:
             # coinbase sandbox
             super().__init__(ExchangeType("coinbaseprosandbox"))
 
+        elif self._replay:
+            super().__init__(ExchangeType("coinbasepro"))
+
         else:
             # Coinbase live trading
             print("*" * 100)
@@ -80,19 +116,51 @@ class CoinbaseProExchange(Exchange):
             self._api_passphrase,
             self._satoshis,
         )
+
+        # products list shared by workers, see `CoinbaseExchangeClient.instruments`
+        if instrument_cache:
+            self._client.catalog = os.path.join(
+                instrument_cache, "{}-products.json".format(self.exchange().name)
+            )
+
+        # recording to rebuild past books from, see `book_at`
+        self._recording = replay or record
+        if record:
+            self._client.recorder = Recorder(record)
         
         # list of market data subscriptions
         self._subscriptions: List[Instrument] = []
 
+        # l3 or l2 order books, by product id, maintained by `tick`
+        self._books: Dict[str, OrderBookBase] = {}
+
     async def connect(self) -> None:
         """connect to exchange, should be asynchronous"""
+        if self._replay:
+            # nothing is fetched when replaying: products are those recorded
+            # with the replay, or else those cached
+            self._client.loadInstruments(
+                [os.path.join(self._replay, PRODUCTS)]
+                + ([self._client.catalog] if self._client.catalog else [])
+            )
+            return
+
         # instantiate instruments
-        self._client.instruments()
+        await self._client.instruments()
+
+    async def close(self) -> None:
+        """close the client's websocket feeds and http session"""
+        await self._client.close()
+
+    async def instruments(self) -> List[Instrument]:
+        """instruments listed on the exchange, once connected"""
+        return await self._client.instruments()
 
     async def lookup(self, instrument: Instrument) -> List[Instrument]:
         """lookup an instrument on the exchange"""
-        # TODO
-        raise NotImplementedError()
+        return _exchangedb.instruments(
+            name=instrument.name, type=instrument.type, exchange=self.exchange()
+        )
     
 
     # ******************* #
@@ -100,39 +168,154 @@ class CoinbaseProExchange(Exchange):
     # ******************* #
     async def tick(self) -> AsyncGenerator[Any, Event]:
         """return data from exchange"""
-        if self._order_book_level == "l3":
-            # First, roll through order book snapshot
-            async for item in self._client.orderBook(self._subscriptions):
-                yield item
+        if self._replay:
+            async for batch in self.tick_batches():
+                for tick in batch:
+                    yield tick
 
-            # then stream in live updates
-            async for tick in self._client.websocket_l3(self._subscriptions):
+        elif self._order_book_level == "l3":
+            # snapshots are loaded and updates applied to our books by sequence
+            async for tick in self._client.websocket_l3(
+                self._subscriptions, self._books  # type: ignore
+            ):
                 yield tick
 
         elif self._order_book_level == "l2":
-            async for tick in self._client.websocket_l2(self._subscriptions):
+            async for tick in self._client.websocket_l2(
+                self._subscriptions, self._books  # type: ignore
+            ):
                 yield tick
 
         elif self._order_book_level == "trades":
             async for tick in self._client.websocket_trades(self._subscriptions):
                 yield tick
 
+    async def tick_batches(self) -> AsyncGenerator[List[Event], None]:
+        """return data from exchange, batched by what arrived since the last batch,
+        or by recorded block when replaying"""
+        if self._replay and TickStore.isStore(self._replay):
+            async for batch in self._storeBatches():
+                yield batch
+            return
+
+        if self._replay:
+            replay = Replay(
+                self._replay,
+                start=self._replay_start,
+                sequence=self._replay_sequence,
+                product_ids=[cast(str, sub.brokerId) for sub in self._subscriptions],
+            )
+            async for batch in self._client.replay_batches(
+                self._order_book_level,
+                self._subscriptions,
+                replay,
+                self._books,
+                self._replay_speed,
+            ):
+                yield batch
+            return
+
+        async for batch in self._client.websocket_batches(
+            self._order_book_level, self._subscriptions, self._books
+        ):
+            yield batch
+
+    async def _storeBatches(self) -> AsyncGenerator[List[Event], None]:
+        """replay from a tick store rather than a recording"""
+        if self._order_book_level == "l3":
+            raise NotImplementedError("tick stores hold no l3 data")
+
+        store = TickStore(self._replay)
+        pacer = Pacer(self._replay_speed)
+        books = {
+            sub: self._books[cast(str, sub.brokerId)]
+            for sub in self._subscriptions
+            if sub.brokerId in self._books
+        }
+        kinds = ["l2", "trades"] if self._order_book_level == "l2" else ["trades"]
+
+        for batch in store.batches(
+            self._subscriptions,
+            kinds,
+            self.exchange(),
+            start=self._replay_start or None,
+            books=books,  # type: ignore
+        ):
+            if self._replay_speed:
+                # pace each event
+                for e in batch:
+                    delay = pacer.delay(timestampNs(e.target.timestamp))
+                    if delay:
+                        await asyncio.sleep(delay)
+                    yield [e]
+            else:
+                yield batch
+
     async def subscribe(self, instrument: Instrument) -> None:
         # can only subscribe to pair data
         if instrument.type == InstrumentType.PAIR:
             self._subscriptions.append(instrument)
 
+            if self._order_book_level == "l3":
+                self._books[instrument.brokerId] = OrderBook(
+                    instrument, self.exchange(), callback=lambda event: None
+                )
+            elif self._order_book_level == "l2":
+                self._books[instrument.brokerId] = OrderBookLite(
+                    instrument, self.exchange()
+                )
+
+    async def book(self, instrument: Instrument) -> Optional[OrderBookBase]:
+        """return the order book maintained for `instrument`, if any"""
+        return self._books.get(instrument.brokerId)
+
+    async def book_at(
+        self, instrument: Instrument, timestamp: Union[datetime, int]
+    ) -> OrderBook:
+        """return the l3 order book of `instrument` as it was at `timestamp`
+        (a datetime, or ns since epoch), rebuilt from the recording being
+        recorded or replayed"""
+        if not self._recording or TickStore.isStore(self._recording):
+            raise Exception("book_at requires a recording to `record` or `replay`")
+        if isinstance(timestamp, datetime):
+            timestamp = timestampNs(timestamp)
+        return self._client.book_at(self._recording, instrument, timestamp)
+
     # ******************* #
     # Order Entry Methods #
     # ******************* #
-    async def accounts(self) -> List[Position]:
-        """get accounts from source"""
-        return await self._client.accounts()
+    async def accounts(self, refresh: bool = False) -> List[Position]:
+        """get accounts from source, cached unless `refresh`"""
+        if self._replay:
+            return []
+        return await self._client.accounts(refresh)
 
     async def newOrder(self, order: Order) -> bool:
         """submit a new order to the exchange. should set the given order's `id` field to exchange-assigned id"""
+        if self._replay:
+            return False
         return await self._client.newOrder(order)
 
     async def cancelOrder(self, order: Order) -> bool:
         """cancel a previously submitted order to the exchange."""
-        return await self._client.cancelOrder(order)
\ No newline at end of file
+        if self._replay:
+            return False
+        return await self._client.cancelOrder(order)
+
+    async def newOrders(self, orders: List[Order]) -> List[bool]:
+        """submit several new orders to the exchange concurrently"""
+        if self._replay:
+            return [False] * len(orders)
+        return await self._client.newOrders(orders)
+
+    async def cancelOrders(self, orders: List[Order]) -> List[bool]:
+        """cancel several previously submitted orders concurrently"""
+        if self._replay:
+            return [False] * len(orders)
+        return await self._client.cancelOrders(orders)
+
+    async def cancelAll(self, instrument: Optional[Instrument] = None) -> List[str]:
+        """cancel all open orders, or all open orders of `instrument`"""
+        if self._replay:
+            return []
+        return await self._client.cancelAll(instrument)
@@ -0,0 +1,337 @@
+# convert coinbase recordings into tick stores, in parallel:
+#
+#   python -m aat.exchange.crypto.coinbase.convert <recording> <store> [processes]
+import math
+import os
+import shutil
+import sys
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+import numpy as np  # type: ignore
+
+from aat.config import InstrumentType, Side, TradingType
+from aat.core import ExchangeType, Instrument, OrderBookLite
+from aat.core.data.codec import _SIDE_CODES, _SIDES
+from aat.exchange.replay import (
+    SCHEMAS,
+    Keyframes,
+    Replay,
+    SegmentReader,
+    TickStore,
+    segments,
+)
+from aat.exchange.replay.convert import Carry, convert
+
+from .client import (
+    _KEYFRAME_SLACK,
+    PRODUCTS,
+    CoinbaseExchangeClient,
+    _keyframeResync,
+)
+from .decode import OPPOSITE_SIDES, SIDES, loads
+from .replay import _ReplaySequencer
+
+_L3_TYPES = frozenset(("received", "open", "done", "match", "change", "resync"))
+_TRADE_TYPES = frozenset(("match", "last_match", "ticker"))
+
+_BUY = _SIDE_CODES[Side.BUY]
+_SELL = _SIDE_CODES[Side.SELL]
+
+
+class _SegmentConverter(object):
+    """Rows of one segment's ticks, by product id and kind.
+
+    Trades come from the full channel's matches or the ticker, whichever was
+    recorded, deduplicated by trade id. l2 deltas are taken as recorded. Top
+    of book is taken from l3 books rebuilt by replaying the full channel (see
+    `_ReplaySequencer`), after every message which moves it. A converter
+    carries its books and last trade ids from one segment to the next; the
+    first is seeded from the recording (see `seed`). Top of l2 books is left
+    to `_L2Tops`, which carries them across all segments. Times are receive
+    times.
+    """
+
+    def __init__(self) -> None:
+        self._exchange = ExchangeType("coinbasepro")
+        self._client = CoinbaseExchangeClient(
+            TradingType.BACKTEST, self._exchange, "", "", ""
+        )
+        self._sequencer = _ReplaySequencer()
+
+        self._l3: Dict[str, Any] = {}
+        self._tops: Dict[str, Tuple[float, float, float, float]] = {}
+        self._trade_ids: Dict[str, int] = {}
+
+        self.rows: Dict[Tuple[str, str], List[Tuple]] = {}
+
+        # whether to keep rows, not while seeding
+        self._emit = True
+
+    def _instrument(self, product_id: str) -> Instrument:
+        instrument = self._client._by_product_id.get(product_id)
+        if instrument is None:
+            instrument = self._client._by_product_id[product_id] = Instrument(
+                name=product_id,
+                type=InstrumentType.PAIR,
+                exchange=self._exchange,
+                broker_id=product_id,
+            )
+        return instrument
+
+    def _append(self, product_id: str, kind: str, row: Tuple) -> None:
+        if not self._emit:
+            return
+        rows = self.rows.get((product_id, kind))
+        if rows is None:
+            rows = self.rows[(product_id, kind)] = []
+        rows.append(row)
+
+    def process(self, ns: int, x: Dict[str, Any]) -> None:
+        type = x.get("type")
+        product_id = x.get("product_id")
+        if not product_id:
+            return
+
+        if type in _TRADE_TYPES and "trade_id" in x:
+            if x["trade_id"] > self._trade_ids.get(product_id, -1):
+                self._trade_ids[product_id] = x["trade_id"]
+                # matches carry the maker's side, the ticker the taker's
+                sides = OPPOSITE_SIDES if type != "ticker" else SIDES
+                size = x["size"] if "size" in x else x["last_size"]
+                self._append(
+                    product_id,
+                    "trades",
+                    (ns, float(x["price"]), float(size), _SIDE_CODES[sides[x["side"]]]),
+                )
+
+        if type == "snapshot":
+            for p, v in x["bids"]:
+                self._append(product_id, "l2", (ns, _BUY, float(p), float(v), 1))
+            for p, v in x["asks"]:
+                self._append(product_id, "l2", (ns, _SELL, float(p), float(v), 1))
+
+        elif type == "l2update":
+            for side, p, v in x["changes"]:
+                code = _SIDE_CODES[SIDES[side]]
+                self._append(product_id, "l2", (ns, code, float(p), float(v), 0))
+
+        elif type in _L3_TYPES and "sequence" in x:
+            for y in self._sequencer.process(x):
+                books = self._l3
+                if y["type"] == "resync" and product_id not in books:
+                    books = self._client._l3Books([self._instrument(product_id)], books)
+                if product_id in books:
+                    self._client._dispatch(y, self._client._l3_handlers, books, [])
+                    self._top(ns, product_id, books[product_id])
+
+    def _top(self, ns: int, product_id: str, book: Any) -> None:
+        top = _bbo(book)
+        last = self._tops.get(product_id)
+        # nan != nan, compare as strings
+        if last is None or repr(last) != repr(top):
+            self._tops[product_id] = top
+            self._append(product_id, "bbo", (ns,) + top)
+
+    def seed(self, recording: str, start: int) -> None:
+        """rebuild l3 books as of `start` (ns since epoch), from the last
+        keyframe before it (else the start of the recording) and the recorded
+        messages after that, as `CoinbaseExchangeClient.book_at` does, and the
+        last trade ids of other products, without keeping rows"""
+        keyframes = Keyframes(recording)
+        keyframed = set(keyframes.products())
+        self._emit = False
+        try:
+            for product_id in sorted(keyframed):
+                keyframe = keyframes.at(product_id, start)
+                replay = Replay(recording, product_ids=[product_id])
+                if keyframe is not None:
+                    ns, sequence, _ = keyframe
+                    self.process(ns, _keyframeResync(product_id, keyframe))
+                    replay = Replay(
+                        recording,
+                        start=ns - _KEYFRAME_SLACK,
+                        sequence={product_id: sequence + 1},
+                        product_ids=[product_id],
+                    )
+                for ns, x in _before(replay, start):
+                    self.process(ns, x)
+
+            # others' trades repeated after `start` (e.g. on reconnecting) are
+            # in the segment before it, books without keyframes need all of it
+            previous = [
+                first
+                for first in (
+                    int(os.path.basename(p).split(".")[0]) for p in segments(recording)
+                )
+                if first < start
+            ]
+            l3: Set[str] = set()
+            if previous:
+                replay = Replay(recording, start=previous[-1])
+                for ns, x in _before(replay, start):
+                    product_id = x.get("product_id")
+                    if product_id in keyframed:
+                        continue
+                    if x.get("type") in _L3_TYPES and "sequence" in x:
+                        l3.add(product_id)
+                    elif x.get("type") in _TRADE_TYPES:
+                        self.process(ns, x)
+            if l3:
+                for ns, x in _before(Replay(recording, product_ids=sorted(l3)), start):
+                    self.process(ns, x)
+        finally:
+            self._emit = True
+
+
+def _before(replay: Replay, end: int) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """(receive ns, message) of a replay, until `end` (ns since epoch)"""
+    for ns_, frames in replay.batches():
+        stop = int(np.searchsorted(ns_, end, side="left"))
+        for ns, frame in zip(ns_[:stop].tolist(), frames[:stop]):
+            yield ns, loads(frame)
+        if stop < len(frames):
+            return
+
+
+def _bbo(book: Any) -> Tuple[float, float, float, float]:
+    """bbo row of a book, nan prices for empty sides"""
+    tob = book.topOfBook()
+    bid, ask = tob[Side.BUY], tob[Side.SELL]
+    return (
+        bid.price if bid.volume else math.nan,
+        bid.volume,
+        ask.price if ask.volume else math.nan,
+        ask.volume,
+    )
+
+
+class _L2Tops(Carry):
+    """Top of book of l2 products, rebuilt from their converted l2 deltas
+    with books carried across segments, in order, as segments converted
+    independently can't know their books at the start."""
+
+    def __init__(self) -> None:
+        self._books: Dict[str, OrderBookLite] = {}
+        self._tops: Dict[str, Tuple[float, float, float, float]] = {}
+
+    def _book(self, name: str) -> OrderBookLite:
+        book = self._books.get(name)
+        if book is None:
+            book = self._books[name] = OrderBookLite(
+                Instrument(name=name, type=InstrumentType.PAIR)
+            )
+        return book
+
+    def apply(self, ticks: TickStore) -> Dict[Tuple[str, str], np.ndarray]:
+        ret: Dict[Tuple[str, str], np.ndarray] = {}
+        names = sorted({name for name, kind, _ in ticks.partitions() if kind == "l2"})
+        for name in names:
+            instrument = Instrument(name=name, type=InstrumentType.PAIR)
+            l2 = ticks.load(instrument, "l2")
+            book = self._book(name)
+
+            timestamps = l2["timestamp"].tolist()
+            sides = l2["side"].tolist()
+            prices = l2["price"].tolist()
+            volumes = l2["volume"].tolist()
+            snapshots = l2["snapshot"].tolist()
+
+            rows: List[Tuple] = []
+            last = self._tops.get(name)
+            n = len(timestamps)
+            for i in range(n):
+                if snapshots[i] and (
+                    not i or not snapshots[i - 1] or timestamps[i - 1] != timestamps[i]
+                ):
+                    # a snapshot replaces the book
+                    book.reset()
+                book.update(_SIDES[sides[i]], prices[i], volumes[i])
+
+                # top after the last row of an update or snapshot
+                if i + 1 < n and (
+                    timestamps[i + 1] == timestamps[i]
+                    and snapshots[i + 1] == snapshots[i]
+                ):
+                    continue
+                top = _bbo(book)
+                # nan != nan, compare as strings
+                if last is None or repr(last) != repr(top):
+                    last = top
+                    rows.append((timestamps[i],) + top)
+
+            if last is not None:
+                self._tops[name] = last
+            if rows:
+                ret[(name, "bbo")] = np.array(rows, dtype=SCHEMAS["bbo"])
+        return ret
+
+    def state(self) -> Any:
+        return {
+            name: {
+                "bids": [(level.price, level.volume) for level in levels[Side.BUY]],
+                "asks": [(level.price, level.volume) for level in levels[Side.SELL]],
+                "top": self._tops.get(name),
+            }
+            for name, book in self._books.items()
+            for levels in (book.levels(1 << 30),)
+        }
+
+    def load(self, state: Any) -> None:
+        for name, book in state.items():
+            self._book(name).load(book["bids"], book["asks"])
+            if book["top"] is not None:
+                self._tops[name] = tuple(book["top"])  # type: ignore
+
+
+def convertSegment(
+    segment: str, store: str, converter: Optional[_SegmentConverter] = None
+) -> _SegmentConverter:
+    """convert one recorded segment into a tick store of its trades, l2 deltas
+    and top of l3 books, see `_SegmentConverter`. Returns the converter to
+    convert the next segment with, else one is seeded from the recording"""
+    if converter is None:
+        converter = _SegmentConverter()
+        start = int(os.path.basename(segment).split(".")[0])
+        converter.seed(os.path.dirname(segment), start)
+
+    reader = SegmentReader(segment)
+    try:
+        for records, _, frames in reader.blocks():
+            for ns, frame in zip(records["ns"].tolist(), frames):
+                converter.process(ns, loads(frame))
+    finally:
+        reader.close()
+
+    ticks = TickStore(store)
+    for (product_id, kind), rows in converter.rows.items():
+        ticks.append(
+            converter._instrument(product_id),
+            kind,
+            np.array(rows, dtype=SCHEMAS[kind]),
+        )
+    converter.rows = {}
+    return converter
+
+
+def convertRecording(
+    recording: str, store: str, processes: Optional[int] = None
+) -> int:
+    """convert a coinbase recording into a tick store across a process pool,
+    resuming any interrupted conversion. Returns the number of segments converted"""
+    converted = convert(recording, store, convertSegment, processes, _L2Tops())
+
+    # keep the products list to replay the store with
+    products = os.path.join(recording, PRODUCTS)
+    if os.path.exists(products):
+        shutil.copyfile(products, os.path.join(store, PRODUCTS))
+    return converted
+
+
+if __name__ == "__main__":
+    # workers must unpickle `convertSegment` from its module, not __main__
+    from aat.exchange.crypto.coinbase.convert import convertRecording  # noqa: F811
+
+    converted = convertRecording(
+        sys.argv[1], sys.argv[2], int(sys.argv[3]) if len(sys.argv) > 3 else None
+    )
+    print("converted {} segments".format(converted))
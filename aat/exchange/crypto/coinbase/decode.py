@@ -0,0 +1,40 @@
+import json
+from typing import Any, Callable, Dict, Optional, Union
+
+from aat.config import Side
+
+try:
+    # optional, several times faster than the stdlib and decodes bytes directly
+    import orjson  # type: ignore
+
+    loads: Callable[[Union[str, bytes]], Any] = orjson.loads
+    BACKEND = "orjson"
+except ImportError:
+    loads = json.loads
+    BACKEND = "json"
+
+# precomputed lookups for coinbase's string fields
+SIDES: Dict[str, Side] = {"buy": Side.BUY, "sell": Side.SELL}
+OPPOSITE_SIDES: Dict[str, Side] = {"buy": Side.SELL, "sell": Side.BUY}
+
+# coinbase always serializes `type` first
+_PREFIX = '{"type":"'
+_PREFIX_BYTES = _PREFIX.encode()
+
+
+def frameType(frame: Union[str, bytes]) -> Optional[str]:
+    """the message type of a raw frame, without decoding it.
+
+    Returns None if the frame does not start with the type field, in which
+    case it has to be decoded to tell."""
+    if isinstance(frame, bytes):
+        if not frame.startswith(_PREFIX_BYTES):
+            return None
+        end = frame.find(b'"', len(_PREFIX_BYTES))
+        return frame[len(_PREFIX_BYTES) : end].decode() if end > 0 else None
+
+    if not frame.startswith(_PREFIX):
+        return None
+    end = frame.find('"', len(_PREFIX))
+    return frame[len(_PREFIX) : end] if end > 0 else None
+
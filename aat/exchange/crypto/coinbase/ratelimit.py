@@ -0,0 +1,167 @@
+import asyncio
+import itertools
+import time
+from heapq import heappop, heappush
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+from aat.common import LatencyMetrics
+
+T = TypeVar("T")
+
+# priority classes, lower is served first
+PRIORITY_CANCEL = 0
+PRIORITY_NEW = 1
+PRIORITY_QUERY = 2
+
+
+class _TokenBucket(object):
+    """`rate` tokens per second, holding at most `burst`"""
+
+    __slots__ = ["rate", "burst", "_tokens", "_time"]
+
+    def __init__(self, rate: float, burst: float) -> None:
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._time = time.monotonic()
+
+    def take(self) -> float:
+        """take a token, returning 0 if one was available, else seconds until one is"""
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._time) * self.rate)
+        self._time = now
+
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+    def refund(self) -> None:
+        self._tokens = min(self.burst, self._tokens + 1)
+
+    def empty(self) -> None:
+        """the venue throttled us regardless, assume the bucket is drained"""
+        self.take()
+        self._tokens = min(self._tokens, 0.0)
+
+
+class _RequestScheduler(object):
+    """Schedules requests against per-endpoint token buckets.
+
+    Endpoints map to named buckets (several endpoints may share one, as venue
+    limits often apply per account). When a bucket is exhausted requests wait
+    in a priority queue, so cancels go ahead of new orders, which go ahead of
+    queries, and FIFO within a class. Identical in-flight queries can be
+    coalesced onto one request by passing a `key`.
+
+    Args:
+        buckets (Dict[str, Tuple[float, float]]): bucket name to (rate per second, burst)
+        endpoints (Dict[str, Tuple[str, int]]): endpoint name to (bucket name, priority)
+        default (Tuple[str, int]): bucket name and priority of unlisted endpoints
+    """
+
+    def __init__(
+        self,
+        buckets: Dict[str, Tuple[float, float]],
+        endpoints: Dict[str, Tuple[str, int]],
+        default: Tuple[str, int],
+    ) -> None:
+        self._buckets = {
+            name: _TokenBucket(rate, burst) for name, (rate, burst) in buckets.items()
+        }
+        self._endpoints = endpoints
+        self._default = default
+
+        # per bucket: heap of (priority, seqnum, future) and the task serving it
+        self._waiting: Dict[str, List[Tuple[int, int, "asyncio.Future[None]"]]] = {
+            name: [] for name in buckets
+        }
+        self._drains: Dict[str, Optional["asyncio.Future[None]"]] = {
+            name: None for name in buckets
+        }
+        self._seqnum = itertools.count()
+
+        # coalesced in-flight requests, by key
+        self._inflight: Dict[Hashable, "asyncio.Future[Any]"] = {}
+
+        # queueing delay by endpoint
+        self.metrics = LatencyMetrics()
+
+    async def submit(
+        self,
+        endpoint: str,
+        request: Callable[[], Awaitable[T]],
+        key: Optional[Hashable] = None,
+    ) -> T:
+        """run `request` once `endpoint` may be called. If `key` is given and a
+        request with the same key is in flight, share its result instead"""
+        if key is None:
+            await self.acquire(endpoint)
+            return await request()
+
+        inflight = self._inflight.get(key)
+        if inflight is None:
+
+            async def run() -> T:
+                await self.acquire(endpoint)
+                return await request()
+
+            inflight = self._inflight[key] = asyncio.ensure_future(run())
+            inflight.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+        # one caller being cancelled must not cancel the shared request
+        return await asyncio.shield(inflight)
+
+    async def acquire(self, endpoint: str) -> None:
+        """wait for a token of `endpoint`'s bucket, by priority"""
+        name, priority = self._endpoints.get(endpoint, self._default)
+        bucket = self._buckets[name]
+        waiting = self._waiting[name]
+        start = time.perf_counter()
+
+        if not waiting and bucket.take() == 0.0:
+            self.metrics.record(endpoint, 0.0)
+            return
+
+        future: "asyncio.Future[None]" = asyncio.get_event_loop().create_future()
+        heappush(waiting, (priority, next(self._seqnum), future))
+
+        drain = self._drains[name]
+        if drain is None or drain.done():
+            self._drains[name] = asyncio.ensure_future(self._drain(name))
+
+        await future
+        self.metrics.record(endpoint, time.perf_counter() - start)
+
+    def throttled(self, endpoint: str) -> None:
+        """the venue rejected a request of `endpoint` for rate, back off its bucket"""
+        self._buckets[self._endpoints.get(endpoint, self._default)[0]].empty()
+
+    async def _drain(self, name: str) -> None:
+        bucket = self._buckets[name]
+        waiting = self._waiting[name]
+
+        while waiting:
+            wait = bucket.take()
+            if wait:
+                await asyncio.sleep(wait)
+                continue
+
+            # hand the token to the most urgent waiter still waiting
+            while waiting:
+                _, _, future = heappop(waiting)
+                if not future.done():
+                    future.set_result(None)
+                    break
+            else:
+                bucket.refund()
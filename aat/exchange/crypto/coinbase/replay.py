@@ -0,0 +1,78 @@
+from collections import deque
+from typing import Any, Deque, Dict, List
+
+# max messages buffered per product while waiting for its next snapshot
+_BUFFER = 100_000
+
+
+class _ReplaySequencer(object):
+    """Sequences a recorded full channel feed, as `_ManagedWebsocket` does live.
+
+    Recordings carry the synthetic `resync` messages, so instead of fetching a
+    snapshot on a product's first message or a gap, its messages are buffered
+    until the next recorded `resync`, after which those newer than the
+    snapshot are applied. A replay starting mid-recording therefore starts
+    each product at its next snapshot.
+    """
+
+    def __init__(self) -> None:
+        # last applied sequence number, by product id
+        self.seqnum: Dict[str, int] = {}
+
+        # products waiting for a snapshot, and their buffered messages
+        self._buffers: Dict[str, Deque[Dict[str, Any]]] = {}
+
+    def process(self, x: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """messages ready to apply, given the next recorded message"""
+        if "sequence" not in x or x["type"] == "heartbeat":
+            # unsequenced
+            return [x]
+
+        product_id = x["product_id"]
+        ret: List[Dict[str, Any]] = []
+
+        if x["type"] == "resync":
+            last = self.seqnum.get(product_id)
+            if product_id not in self._buffers and last is not None:
+                if x["sequence"] <= last:
+                    # older than the book, e.g. from before a keyframe
+                    return ret
+
+            self.seqnum[product_id] = x["sequence"]
+            ret.append(x)
+
+            buffered = sorted(
+                self._buffers.pop(product_id, ()), key=lambda b: b["sequence"]
+            )
+            for i, b in enumerate(buffered):
+                if product_id in self._buffers:
+                    # gapped again, keep buffering the rest
+                    self._buffers[product_id].extend(buffered[i:])
+                    break
+                self._sequence(product_id, b, ret)
+            return ret
+
+        if product_id in self._buffers:
+            self._buffers[product_id].append(x)
+            return ret
+
+        self._sequence(product_id, x, ret)
+        return ret
+
+    def _sequence(
+        self, product_id: str, x: Dict[str, Any], ret: List[Dict[str, Any]]
+    ) -> None:
+        last = self.seqnum.get(product_id)
+        sequence = x["sequence"]
+
+        if last is not None and sequence <= last:
+            # stale or duplicate
+            return
+
+        if last is None or sequence > last + 1:
+            # no snapshot yet, or a gap the recording resynced after
+            self._buffers[product_id] = deque([x], maxlen=_BUFFER)
+            return
+
+        self.seqnum[product_id] = sequence
+        ret.append(x)
@@ -0,0 +1,305 @@
+import asyncio
+import json
+import logging
+import random
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncGenerator,
+    Awaitable,
+    Callable,
+    Collection,
+    Dict,
+    List,
+    Optional,
+    Union,
+)
+
+import aiohttp
+
+from .decode import frameType, loads
+
+if TYPE_CHECKING:
+    from .client import CoinbaseExchangeClient
+
+
+# reconnect and resync backoff (seconds): initial, cap
+_BACKOFF = 0.5
+_BACKOFF_MAX = 30.0
+
+# coinbase sends heartbeats every second, reconnect
+# if nothing at all arrives for this long (seconds)
+_RECEIVE_TIMEOUT = 10.0
+
+_DATA_FRAMES = (aiohttp.WSMsgType.TEXT, aiohttp.WSMsgType.BINARY)
+
+# fetches a REST snapshot for a product id
+_Resync = Callable[[str], Awaitable[Dict[str, Any]]]
+
+
+class _ManagedWebsocket(object):
+    """A coinbase websocket feed that survives disconnects.
+
+    Runs over the client's shared http session, reconnects with jittered
+    exponential backoff and resubscribes on every connect.
+
+    For sequenced channels (`full`), tracks the last sequence number per
+    product in `client.seqnum`. Stale and duplicate messages are dropped. On a
+    product's first message, or a gap, only that product is resynced: its messages are buffered
+    while `resync` fetches a fresh REST snapshot, then a synthetic
+    `{"type": "resync", "product_id": ..., "sequence": ..., "book": ...}`
+    message is yielded followed by the buffered messages newer than the
+    snapshot. Other products keep streaming throughout.
+
+    If the client has a `recorder`, every data frame is recorded as received,
+    before any filtering, as are the synthetic resync messages.
+
+    Args:
+        client (CoinbaseExchangeClient): client to take the session, signing and seqnum from
+        channels (List[str]): coinbase channels to subscribe to (in addition to user and heartbeat)
+        product_ids (List[str]): coinbase product ids to subscribe to
+        resync (Callable): coroutine function fetching a REST snapshot by product id, enables gap detection
+        types (Collection[str]): for unsequenced feeds, message types to decode. Other frames are dropped undecoded
+    """
+
+    def __init__(
+        self,
+        client: "CoinbaseExchangeClient",
+        channels: List[str],
+        product_ids: List[str],
+        resync: Optional[_Resync] = None,
+        types: Optional[Collection[str]] = None,
+    ) -> None:
+        self._client = client
+        self._channels = channels
+        self._product_ids = product_ids
+        self._resync = resync
+        self._types = types if resync is None else None
+
+        # last applied sequence number, by product id
+        self._seqnum: Dict[str, int] = client.seqnum
+
+        # products being resynced: buffered messages, snapshot fetch
+        self._buffers: Dict[str, List[Dict[str, Any]]] = {}
+        self._resyncs: Dict[str, "asyncio.Future[Dict[str, Any]]"] = {}
+        # failed snapshot fetches in a row, by product id
+        self._attempts: Dict[str, int] = {}
+
+        self._closed = False
+
+        # stats
+        self.reconnects = 0
+        self.gaps = 0
+
+    def close(self) -> None:
+        """stop after the current message"""
+        self._closed = True
+        for task in self._resyncs.values():
+            task.cancel()
+
+    async def messages(self) -> AsyncGenerator[Dict[str, Any], None]:
+        """decoded messages, in sequence per product, across reconnects"""
+        async for frame in self._frames():
+            for x in self._process(loads(frame)):
+                yield x
+
+    async def batches(self) -> AsyncGenerator[List[Dict[str, Any]], None]:
+        """like `messages`, but yielding everything received since the last
+        batch at once. Frames are read by a background task, so batches grow
+        while the consumer is busy and are a single message when it keeps up"""
+        pending: List[Union[str, bytes]] = []
+        ready = asyncio.Event()
+
+        async def pump() -> None:
+            try:
+                async for frame in self._frames():
+                    pending.append(frame)
+                    ready.set()
+            finally:
+                ready.set()
+
+        task = asyncio.ensure_future(pump())
+        try:
+            while True:
+                await ready.wait()
+                ready.clear()
+
+                if not pending:
+                    if task.done():
+                        # surface any error from the reader
+                        task.result()
+                        break
+                    continue
+
+                frames = pending[:]
+                del pending[:]
+
+                batch: List[Dict[str, Any]] = []
+                for frame in frames:
+                    batch.extend(self._process(loads(frame)))
+                if batch:
+                    yield batch
+        finally:
+            task.cancel()
+
+    async def _frames(self) -> AsyncGenerator[Union[str, bytes], None]:
+        """raw data frames, across reconnects"""
+        backoff = _BACKOFF
+        types = self._types
+        recorder = self._client.recorder
+
+        while not self._closed:
+            try:
+                async with self._client._session().ws_connect(
+                    self._client.ws_url, heartbeat=_RECEIVE_TIMEOUT / 2
+                ) as ws:
+                    await ws.send_str(
+                        json.dumps(
+                            self._client._subscription(
+                                self._channels, self._product_ids
+                            )
+                        )
+                    )
+
+                    while not self._closed:
+                        msg = await ws.receive(timeout=_RECEIVE_TIMEOUT)
+
+                        if msg.type not in _DATA_FRAMES:
+                            # closed, closing or errored, reconnect
+                            break
+
+                        # connection is healthy again
+                        backoff = _BACKOFF
+
+                        if recorder is not None:
+                            recorder.record(msg.data)
+
+                        if types is not None:
+                            type = frameType(msg.data)
+                            if type is not None and type not in types:
+                                continue
+
+                        yield msg.data
+
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logging.warning("coinbase websocket error: %s", e)
+
+            if self._closed:
+                break
+
+            # back off before reconnecting. Sequenced products will detect
+            # the messages missed while disconnected as a gap and resync
+            self.reconnects += 1
+            await asyncio.sleep(backoff * (0.5 + random.random() / 2))
+            backoff = min(backoff * 2, _BACKOFF_MAX)
+
+    def _process(self, x: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """apply sequencing to a message, returning messages ready to yield"""
+        ret: List[Dict[str, Any]] = []
+
+        # flush any products whose snapshot has arrived
+        if self._resyncs:
+            for product_id in [p for p, t in self._resyncs.items() if t.done()]:
+                self._flush(product_id, ret)
+
+        if self._resync is None or "sequence" not in x or x["type"] == "heartbeat":
+            # unsequenced
+            ret.append(x)
+            return ret
+
+        product_id = x["product_id"]
+
+        if product_id in self._buffers:
+            # resync in progress for this product
+            self._buffers[product_id].append(x)
+            return ret
+
+        self._sequence(product_id, x, ret)
+        return ret
+
+    def _sequence(
+        self, product_id: str, x: Dict[str, Any], ret: List[Dict[str, Any]]
+    ) -> None:
+        last = self._seqnum.get(product_id)
+        sequence = x["sequence"]
+
+        if last is not None and sequence <= last:
+            # stale or duplicate (e.g. also delivered on the user channel)
+            return
+
+        if last is None or sequence > last + 1:
+            if last is None:
+                # first message for this product, load the initial snapshot
+                logging.info("coinbase %s loading snapshot", product_id)
+            else:
+                # gap, resync this product only
+                self.gaps += 1
+                logging.warning(
+                    "coinbase %s sequence gap %d -> %d, resyncing",
+                    product_id,
+                    last,
+                    sequence,
+                )
+            self._buffers[product_id] = [x]
+            self._startResync(product_id)
+            return
+
+        self._seqnum[product_id] = sequence
+        ret.append(x)
+
+    def _startResync(self, product_id: str) -> None:
+        self._resyncs[product_id] = asyncio.ensure_future(
+            self._fetchSnapshot(product_id, self._attempts.get(product_id, 0))
+        )
+
+    async def _fetchSnapshot(self, product_id: str, attempt: int) -> Dict[str, Any]:
+        if attempt:
+            # backing off after failures, e.g. while throttled
+            backoff = min(_BACKOFF * 2 ** (attempt - 1), _BACKOFF_MAX)
+            await asyncio.sleep(backoff * (0.5 + random.random() / 2))
+
+        book = await self._resync(product_id)  # type: ignore
+        if "sequence" not in book:
+            raise Exception("snapshot without a sequence: {}".format(book))
+        return book
+
+    def _flush(self, product_id: str, ret: List[Dict[str, Any]]) -> None:
+        task = self._resyncs.pop(product_id)
+        buffered = self._buffers.pop(product_id)
+
+        if task.cancelled() or task.exception() is not None:
+            # try again after a while, keeping what we buffered so far
+            self._attempts[product_id] = self._attempts.get(product_id, 0) + 1
+            logging.warning(
+                "coinbase %s resync failed (attempt %d): %s",
+                product_id,
+                self._attempts[product_id],
+                None if task.cancelled() else task.exception(),
+            )
+            self._buffers[product_id] = buffered
+            self._startResync(product_id)
+            return
+
+        self._attempts.pop(product_id, None)
+        book = task.result()
+        self._seqnum[product_id] = book["sequence"]
+        resync = {
+            "type": "resync",
+            "product_id": product_id,
+            "sequence": book["sequence"],
+            "book": book,
+        }
+        ret.append(resync)
+
+        if self._client.recorder is not None:
+            # so recordings can be replayed from the snapshot
+            self._client.recorder.record(resync)
+
+        # replay what arrived while the snapshot loaded
+        buffered.sort(key=lambda b: b["sequence"])
+        for i, b in enumerate(buffered):
+            if product_id in self._buffers:
+                # gapped again, keep buffering the rest
+                self._buffers[product_id].extend(buffered[i:])
+                return
+            self._sequence(product_id, b, ret)
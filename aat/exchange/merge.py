@@ -0,0 +1,240 @@
+import asyncio
+import heapq
+from typing import AsyncGenerator, AsyncIterator, List, Optional, Sequence, Tuple
+
+from aat.config import TradingType
+from aat.core import Event
+from aat.core.data.codec import timestampsNs
+
+from .base.market_data import _MarketData
+
+# end of a source's stream
+_DONE = None
+
+
+def _keys(events: List[Event], last: int) -> Tuple[List[int], int]:
+    """event times (ns since epoch) of a batch, and its last. Events without
+    a timestamp (e.g. heartbeats) take the time of the event before them"""
+    stamps = [getattr(e.target, "timestamp", None) for e in events]
+    times = iter(timestampsNs(t for t in stamps if t is not None))
+    keys = []
+    for timestamp in stamps:
+        if timestamp is not None:
+            last = next(times)
+        keys.append(last)
+    return keys, last
+
+
+class _Source(object):
+    """One market data stream, read ahead of the merge by a task of its own
+    into a bounded buffer of batches"""
+
+    __slots__ = (
+        "index",
+        "_batches",
+        "_buffer",
+        "_task",
+        "events",
+        "keys",
+        "pos",
+        "last",
+    )
+
+    def __init__(
+        self, index: int, batches: AsyncIterator[List[Event]], read_ahead: int
+    ) -> None:
+        self.index = index
+        self._batches = batches
+        self._buffer: asyncio.Queue = asyncio.Queue(read_ahead)
+        self._task: Optional[asyncio.Task] = None
+
+        # current batch, its event times, and the next event in it
+        self.events: List[Event] = []
+        self.keys: List[int] = []
+        self.pos = 0
+        self.last = 0
+
+    def start(self, ready: Optional[asyncio.Event] = None) -> None:
+        self._task = asyncio.ensure_future(self._read(ready))
+
+    async def _read(self, ready: Optional[asyncio.Event]) -> None:
+        try:
+            async for batch in self._batches:
+                if batch:
+                    await self._buffer.put(batch)
+                    if ready is not None:
+                        ready.set()
+            await self._buffer.put(_DONE)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # surfaced by the merge, in stream order
+            await self._buffer.put(e)
+        if ready is not None:
+            ready.set()
+
+    def pending(self) -> bool:
+        return not self._buffer.empty()
+
+    def take(self) -> Optional[List[Event]]:
+        """the next buffered batch, None at the end of the stream"""
+        batch = self._buffer.get_nowait()
+        if isinstance(batch, Exception):
+            raise batch
+        return batch
+
+    async def next(self) -> bool:
+        """advance to the next batch, False at the end of the stream"""
+        batch = await self._buffer.get()
+        if isinstance(batch, Exception):
+            raise batch
+        if batch is _DONE:
+            return False
+        self.events = batch
+        self.keys, self.last = _keys(batch, self.last)
+        self.pos = 0
+        return True
+
+    def stop(self) -> None:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+
+
+class TickMerge(_MarketData):
+    """Merges the market data of several exchanges (or replays) into one stream.
+
+    For BACKTEST and SIMULATION, events are merged in event time order: a
+    k-way merge on each source's next event time, ties going to the earlier
+    source. Sources are expected to be in time order themselves, and their
+    own order is always kept. Nothing is emitted until every source still
+    streaming has a next event, so a run of events from one source up to the
+    next event of any other is emitted at once.
+
+    For LIVE and SANDBOX, batches are interleaved as they arrive, taking at
+    most one batch from each source in turn, so that a busy source cannot
+    starve the others.
+
+    Sources are pulled by `tick_batches`, each by its own task, which reads up
+    to `read_ahead` batches ahead of the merge.
+
+    Args:
+        sources (Sequence[_MarketData]): exchanges or replays to merge
+        trading_type (TradingType): whether to merge in time or arrival order
+        read_ahead (int): batches buffered per source
+        batch (int): events per merged batch in time order
+    """
+
+    def __init__(
+        self,
+        sources: Sequence[_MarketData],
+        trading_type: TradingType = TradingType.BACKTEST,
+        read_ahead: int = 4,
+        batch: int = 4096,
+    ) -> None:
+        self._sources = list(sources)
+        self._trading_type = trading_type
+        self._read_ahead = max(1, read_ahead)
+        self._batch = batch
+
+    async def close(self) -> None:
+        """close every source"""
+        for source in self._sources:
+            await source.close()
+
+    async def tick(self) -> AsyncGenerator[Event, None]:  # type: ignore
+        """return merged data"""
+        async for batch in self.tick_batches():
+            for event in batch:
+                yield event
+
+    async def tick_batches(self) -> AsyncGenerator[List[Event], None]:  # type: ignore
+        """return merged data, in batches"""
+        sources = [
+            _Source(i, s.tick_batches(), self._read_ahead)  # type: ignore
+            for i, s in enumerate(self._sources)
+        ]
+        try:
+            if self._trading_type in (TradingType.LIVE, TradingType.SANDBOX):
+                merged = self._interleave(sources)
+            else:
+                merged = self._merge(sources)
+            async for batch in merged:
+                yield batch
+        finally:
+            for source in sources:
+                source.stop()
+
+    async def _merge(self, sources: List[_Source]) -> AsyncGenerator[List[Event], None]:
+        for source in sources:
+            source.start()
+
+        # (next event time, source index) of every source still streaming
+        heap: List[Tuple[int, int]] = []
+        for source in sources:
+            if await source.next():
+                heap.append((source.keys[0], source.index))
+        heapq.heapify(heap)
+
+        out: List[Event] = []
+        while heap:
+            _, index = heapq.heappop(heap)
+            source = sources[index]
+
+            # emit from this source up to the next event of any other
+            bound, other = heap[0] if heap else (0, -1)
+            while True:
+                events, keys, pos = source.events, source.keys, source.pos
+                end = len(events)
+                if other >= 0:
+                    while pos < end:
+                        key = keys[pos]
+                        if key > bound or (key == bound and index > other):
+                            break
+                        out.append(events[pos])
+                        pos += 1
+                else:
+                    out.extend(events[pos:])
+                    pos = end
+                source.pos = pos
+
+                if len(out) >= self._batch:
+                    yield out
+                    out = []
+
+                if pos < end:
+                    heapq.heappush(heap, (keys[pos], index))
+                    break
+                if not await source.next():
+                    break
+
+        if out:
+            yield out
+
+    async def _interleave(
+        self, sources: List[_Source]
+    ) -> AsyncGenerator[List[Event], None]:
+        ready = asyncio.Event()
+        for source in sources:
+            source.start(ready)
+
+        streaming = list(sources)
+        first = 0
+        while streaming:
+            await ready.wait()
+            ready.clear()
+
+            # one batch from each source with any, starting after the source
+            # served first last time round
+            count = len(streaming)
+            order = streaming[first % count :] + streaming[: first % count]
+            first += 1
+            for source in order:
+                if source.pending():
+                    batch = source.take()
+                    if batch is _DONE:
+                        streaming.remove(source)
+                    else:
+                        yield batch
+
+            if any(source.pending() for source in streaming):
+                ready.set()
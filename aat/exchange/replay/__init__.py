@@ -0,0 +1,4 @@
+from .keyframes import Keyframes  # noqa: F401
+from .recorder import Recorder, SegmentReader, segments  # noqa: F401
+from .replay import Pacer, Replay  # noqa: F401
+from .tickstore import SCHEMAS, TickStore  # noqa: F401
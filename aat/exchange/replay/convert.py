@@ -0,0 +1,179 @@
+import json
+import os
+import shutil
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+import numpy as np  # type: ignore
+
+from .recorder import segments
+from .tickstore import _DAY, TickStore
+
+# converts the frames of one segment file into a new tick store at a path,
+# given what it returned for the previous segment of the same worker (None
+# for the first) and returning what to give it for the next, e.g. state to
+# carry across segments. Must be picklable (a module level function) to run
+# in the pool
+Converter = Callable[[str, str, Any], Any]
+
+
+class Carry(object):
+    """State carried across segments, e.g. books, which segments converted
+    independently can't have.
+
+    Run in the converting process, on each converted segment in order, just
+    before it is merged. Its state is checkpointed with the merged segments,
+    so must be JSON serializable.
+    """
+
+    def apply(self, ticks: TickStore) -> Dict[Tuple[str, str], np.ndarray]:
+        """rows to append for a converted segment, by (instrument name, kind)"""
+        raise NotImplementedError()
+
+    def state(self) -> Any:
+        raise NotImplementedError()
+
+    def load(self, state: Any) -> None:
+        raise NotImplementedError()
+
+_STAGING = ".staging"
+_CHECKPOINT = "checkpoint.json"
+_DONE = "done"
+
+
+def _convertRange(
+    converter: Converter, segments: List[str], stagings: List[str]
+) -> List[str]:
+    """worker: convert consecutive segments in order, each into a fresh
+    staging store marked done once complete"""
+    carried = None
+    for segment, staging in zip(segments, stagings):
+        shutil.rmtree(staging, ignore_errors=True)
+        carried = converter(segment, staging, carried)
+        open(os.path.join(staging, _DONE), "w").close()
+    return segments
+
+
+def _ranges(todo: List[str], done: Set[str], workers: int) -> List[List[str]]:
+    """runs of consecutive segments not done yet, split into about one
+    range per worker"""
+    runs: List[List[str]] = [[]]
+    for segment in todo:
+        if segment in done:
+            runs.append([])
+        else:
+            runs[-1].append(segment)
+    runs = [run for run in runs if run]
+
+    size = max(1, -(-sum(map(len, runs)) // workers))
+    return [run[i : i + size] for run in runs for i in range(0, len(run), size)]
+
+
+def convert(
+    recording: str,
+    store: str,
+    converter: Converter,
+    processes: Optional[int] = None,
+    carry: Optional[Carry] = None,
+) -> int:
+    """Convert a recording into a tick store, a range of consecutive segments
+    per worker process.
+
+    Workers convert their segments in order (see `Converter`) into staging
+    stores, which are merged into
+    `store` in segment order as soon as all earlier segments are. Merged
+    segments are checkpointed, so an interrupted conversion resumes where
+    it left off (reusing staging stores completed before the interruption),
+    and converting a recording again only converts segments added since.
+
+    Args:
+        recording (str): recording directory, see `Recorder`
+        store (str): tick store directory, created if missing
+        converter (Converter): converts a segment into a tick store
+        processes (int): worker processes, default one per cpu
+        carry (Carry): state carried across segments, adding to each
+
+    Returns:
+        number of segments converted
+    """
+    target = TickStore(store)
+    staging = os.path.join(
+        store, _STAGING, os.path.basename(os.path.abspath(recording))
+    )
+    os.makedirs(staging, exist_ok=True)
+
+    checkpoint = os.path.join(staging, _CHECKPOINT)
+    state: Dict[str, Any] = {"recording": os.path.abspath(recording), "merged": []}
+    if os.path.exists(checkpoint):
+        with open(checkpoint) as fp:
+            state = json.load(fp)
+
+    if state.get("merging"):
+        # interrupted mid merge, drop what it appended before redoing it
+        target.truncate([tuple(length) for length in state.pop("merging")])
+    if carry is not None and state.get("carry") is not None:
+        carry.load(state["carry"])
+
+    merged: List[str] = state["merged"]
+    todo = [s for s in segments(recording) if os.path.basename(s) not in merged]
+    if not todo:
+        return 0
+
+    def stagingOf(segment: str) -> str:
+        return os.path.join(staging, os.path.basename(segment))
+
+    def save() -> None:
+        # checkpoint atomically
+        with open(checkpoint + ".tmp", "w") as fp:
+            json.dump(state, fp)
+        os.replace(checkpoint + ".tmp", checkpoint)
+
+    def merge(segment: str) -> None:
+        ticks = TickStore(stagingOf(segment))
+        extra = carry.apply(ticks) if carry is not None else {}
+
+        # what is about to be appended to, so a merge interrupted after
+        # appending some of it can be undone rather than appended twice
+        keys = {(n, k, d) for n, k, d in ticks.partitions()}
+        for (name, kind), rows in extra.items():
+            days = np.unique(rows["timestamp"] // _DAY).tolist()
+            keys.update((name, kind, day) for day in days)
+        state["merging"] = target.lengths(sorted(keys))
+        save()
+
+        target.merge(ticks)
+        for (name, kind), rows in extra.items():
+            target.append(name, kind, rows)
+
+        # then checkpoint, and drop the staging store
+        del state["merging"]
+        merged.append(os.path.basename(segment))
+        if carry is not None:
+            state["carry"] = carry.state()
+        save()
+        shutil.rmtree(stagingOf(segment))
+
+    done = {s for s in todo if os.path.exists(os.path.join(stagingOf(s), _DONE))}
+    pending: Dict[Future, List[str]] = {}
+
+    with ProcessPoolExecutor(processes) as pool:
+        for run in _ranges(todo, done, processes or os.cpu_count() or 1):
+            future = pool.submit(
+                _convertRange, converter, run, [stagingOf(s) for s in run]
+            )
+            pending[future] = run
+
+        next = 0
+        while next < len(todo):
+            # merge the converted prefix, in order
+            while next < len(todo) and todo[next] in done:
+                merge(todo[next])
+                next += 1
+
+            if pending:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    done.update(future.result())
+                    del pending[future]
+
+    return len(todo)
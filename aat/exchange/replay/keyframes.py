@@ -0,0 +1,103 @@
+import os
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np  # type: ignore
+
+# Keyframes are snapshots of sequenced order books, kept next to a
+# recording's segments as `keyframes/<product id>.kf`: back to back zlib
+# compressed arrays of KEYFRAME_DTYPE, one row per resting order, with a
+# `.kfi` index of KEYFRAME_INDEX_DTYPE entries. A book at any instant is
+# then the last keyframe before it, plus the recorded messages after its
+# sequence number.
+KEYFRAME_DTYPE = np.dtype(
+    [
+        ("id", "S40"),
+        ("side", "u1"),
+        ("price", "<f8"),
+        ("volume", "<f8"),
+    ]
+)
+
+KEYFRAME_INDEX_DTYPE = np.dtype(
+    [
+        ("ns", "<i8"),
+        ("sequence", "<i8"),
+        ("offset", "<u8"),
+        ("length", "<u4"),
+        ("count", "<u4"),
+    ]
+)
+
+_DIR = "keyframes"
+
+# a keyframe: time taken (ns since epoch), sequence number of the last
+# message applied to the book, and its orders
+Keyframe = Tuple[int, int, np.ndarray]
+
+
+class Keyframes(object):
+    """Keyframes of a recording, by product id.
+
+    Args:
+        path (str): recording directory, see `Recorder`
+    """
+
+    def __init__(self, path: str) -> None:
+        self._path = os.path.join(path, _DIR)
+        self._indexes: Dict[str, np.ndarray] = {}
+
+    def _file(self, product_id: str, suffix: str) -> str:
+        return os.path.join(self._path, product_id.replace(os.sep, "_") + suffix)
+
+    def write(self, product_id: str, ns: int, sequence: int, rows: np.ndarray) -> None:
+        """append a keyframe of `rows` of KEYFRAME_DTYPE"""
+        os.makedirs(self._path, exist_ok=True)
+        payload = zlib.compress(np.ascontiguousarray(rows, KEYFRAME_DTYPE).tobytes(), 1)
+
+        with open(self._file(product_id, ".kf"), "ab") as fp:
+            offset = fp.tell()
+            fp.write(payload)
+
+        entry = np.array(
+            [(ns, sequence, offset, len(payload), len(rows))],
+            dtype=KEYFRAME_INDEX_DTYPE,
+        )
+        with open(self._file(product_id, ".kfi"), "ab") as fp:
+            fp.write(entry.tobytes())
+
+        self._indexes.pop(product_id, None)
+
+    def products(self) -> List[str]:
+        """product ids with keyframes"""
+        if not os.path.isdir(self._path):
+            return []
+        names = os.listdir(self._path)
+        return sorted(name[: -len(".kfi")] for name in names if name.endswith(".kfi"))
+
+    def index(self, product_id: str) -> np.ndarray:
+        """KEYFRAME_INDEX_DTYPE entry per keyframe of `product_id`"""
+        index = self._indexes.get(product_id)
+        if index is None:
+            path = self._file(product_id, ".kfi")
+            if os.path.exists(path):
+                index = np.fromfile(path, dtype=KEYFRAME_INDEX_DTYPE)
+            else:
+                index = np.empty(0, dtype=KEYFRAME_INDEX_DTYPE)
+            self._indexes[product_id] = index
+        return index
+
+    def at(self, product_id: str, ns: int) -> Optional[Keyframe]:
+        """the last keyframe of `product_id` taken at or before `ns`, if any"""
+        index = self.index(product_id)
+        i = int(np.searchsorted(index["ns"], ns, side="right")) - 1
+        if i < 0:
+            return None
+
+        entry = index[i]
+        with open(self._file(product_id, ".kf"), "rb") as fp:
+            fp.seek(int(entry["offset"]))
+            payload = fp.read(int(entry["length"]))
+
+        rows = np.frombuffer(zlib.decompress(payload), dtype=KEYFRAME_DTYPE)
+        return int(entry["ns"]), int(entry["sequence"]), rows
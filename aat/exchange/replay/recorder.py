@@ -0,0 +1,435 @@
+import json
+import logging
+import mmap
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np  # type: ignore
+
+from .keyframes import KEYFRAME_DTYPE, Keyframes
+
+# A recording is a directory of segment files, `<first ns>.seg`, each a
+# sequence of independently compressed blocks:
+#
+#   block header  _BLOCK: magic, compressed length, raw length
+#   payload       zlib(count, products length, products, records, frames)
+#
+# where `products` is the block's product ids joined by newlines, `records`
+# is `count` RECORD_DTYPE entries and `frames` the raw frames back to back.
+# Next to each segment, `<first ns>.idx` holds one INDEX_DTYPE entry per
+# block, so seeking is a binary search plus one block decompression.
+_MAGIC = b"AATB"
+_BLOCK = struct.Struct("<4sII")
+_COUNTS = struct.Struct("<II")
+
+SEGMENT_SUFFIX = ".seg"
+INDEX_SUFFIX = ".idx"
+
+# one frame: receive time (ns since epoch), sequence number (0 if none),
+# index into the block's products (0 is none) and length of the frame
+RECORD_DTYPE = np.dtype(
+    [
+        ("ns", "<i8"),
+        ("sequence", "<i8"),
+        ("product", "<u2"),
+        ("length", "<u4"),
+    ]
+)
+
+INDEX_DTYPE = np.dtype(
+    [
+        ("first_ns", "<i8"),
+        ("last_ns", "<i8"),
+        ("offset", "<u8"),
+        ("length", "<u4"),
+        ("count", "<u4"),
+    ]
+)
+
+# a decoded block: records, products by index, frames by record
+Block = Tuple[np.ndarray, List[str], List[bytes]]
+
+# what `record` does once the writer is `max_pending` frames behind:
+#   drop:  the frame is dropped, and counted
+#   block: the caller waits for the writer to catch up
+POLICIES = ("drop", "block")
+
+
+
+class _Keyframe(object):
+    """a book to write as a keyframe, see `Recorder.keyframe`"""
+
+    __slots__ = ["product_id", "sequence", "orders"]
+
+    def __init__(
+        self,
+        product_id: str,
+        sequence: int,
+        orders: List[Tuple[str, int, float, float]],
+    ) -> None:
+        self.product_id = product_id
+        self.sequence = sequence
+        self.orders = orders
+
+
+# a raw frame, a message to serialize on the writer thread, or a keyframe
+_Frame = Union[str, bytes, Dict[str, Any], _Keyframe]
+
+_STOP = None
+
+
+def _field(frame: bytes, name: bytes) -> bytes:
+    """the raw value of a top level json field, without decoding the frame"""
+    start = frame.find(b'"' + name + b'":')
+    if start < 0:
+        return b""
+    start += len(name) + 3
+    while frame[start : start + 1] == b" ":
+        start += 1
+
+    if frame[start : start + 1] == b'"':
+        return frame[start + 1 : frame.find(b'"', start + 1)]
+    end = start
+    while end < len(frame) and frame[end : end + 1] not in b",} ":
+        end += 1
+    return frame[start:end]
+
+
+class Recorder(object):
+    """Records raw websocket frames into a directory of rotating segment files.
+
+    `record` only stamps the receive time and enqueues the frame; a
+    background thread extracts product ids and sequence numbers, batches
+    frames into blocks, compresses and appends them, so the event loop
+    never blocks on disk or compression.
+
+    At most `max_pending` frames wait for the writer, beyond which they are
+    dropped or `record` blocks, as `policy` says (see `POLICIES`). If the
+    writer fails, recording stops: `record` logs it, and `close` raises it.
+
+    Books maintained from sequenced feeds can also be written as keyframes
+    every `keyframe_interval` seconds (see `Keyframes`), so that replaying
+    a book to an instant does not have to start at the recording's start.
+
+    Args:
+        path (str): directory to record into, created if missing
+        segment_size (int): rotate to a new segment once one exceeds this many bytes
+        block_records (int): max frames per compressed block
+        block_interval (float): max seconds a frame waits before its block is written
+        level (int): zlib compression level
+        keyframe_interval (float): min seconds between keyframes of a product
+        max_pending (int): most frames waiting to be written
+        policy (str): what to do with frames beyond those, in `POLICIES`
+    """
+
+    def __init__(
+        self,
+        path: str,
+        segment_size: int = 64 << 20,
+        block_records: int = 4096,
+        block_interval: float = 1.0,
+        level: int = 1,
+        keyframe_interval: float = 30.0,
+        max_pending: int = 1 << 20,
+        policy: str = "drop",
+    ) -> None:
+        if policy not in POLICIES:
+            raise NotImplementedError("`policy` must be in {}".format(POLICIES))
+
+        os.makedirs(path, exist_ok=True)
+        self._path = path
+        self._segment_size = segment_size
+        self._block_records = block_records
+        self._block_interval = block_interval
+        self._level = level
+
+        self._keyframes = Keyframes(path)
+        self._keyframe_interval = keyframe_interval
+        self._keyframe_times: Dict[str, float] = {}
+
+        self._queue: "queue.Queue[Optional[Tuple[int, _Frame]]]" = queue.Queue(
+            max_pending
+        )
+        self._block = policy == "block"
+
+        # why the writer stopped, if it failed
+        self._error: Optional[BaseException] = None
+        self._reported = False
+
+        # stats
+        self.records = 0
+        self.blocks = 0
+        self.bytes = 0
+        self.dropped = 0
+
+        self._thread = threading.Thread(
+            target=self._run, name="aat-recorder", daemon=True
+        )
+        self._thread.start()
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def record(self, frame: _Frame, ns: Optional[int] = None) -> None:
+        """record a raw frame, received at `ns` (default now). Messages not
+        received as frames (e.g. REST snapshots) can be recorded as dicts"""
+        self._put((ns or time.time_ns(), frame))
+
+    def _put(self, item: Tuple[int, Any]) -> None:
+        if self._error is not None:
+            if not self._reported:
+                self._reported = True
+                logging.error("recorder writer failed, not recording: %r", self._error)
+            self.dropped += 1
+            return
+
+        try:
+            self._queue.put(item, block=self._block)
+        except queue.Full:
+            if not self.dropped:
+                logging.warning("recorder writer behind, dropping frames")
+            self.dropped += 1
+
+    def keyframeDue(self, product_id: str) -> bool:
+        """whether to take a keyframe of `product_id`'s book now"""
+        now = time.monotonic()
+        if now - self._keyframe_times.get(product_id, 0.0) < self._keyframe_interval:
+            return False
+        self._keyframe_times[product_id] = now
+        return True
+
+    def keyframe(
+        self,
+        product_id: str,
+        sequence: int,
+        orders: List[Tuple[str, int, float, float]],
+        ns: Optional[int] = None,
+    ) -> None:
+        """record a keyframe of a book at `sequence`, as its resting orders'
+        (id, side code, price, remaining volume). The caller must copy these
+        out of the book, they are encoded and written on the writer thread"""
+        self._put((ns or time.time_ns(), _Keyframe(product_id, sequence, orders)))
+
+    def close(self) -> None:
+        """write out everything recorded and stop the writer, raising if it
+        failed"""
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+        if self._error is not None:
+            raise Exception("Recorder writer failed") from self._error
+
+    # ************* #
+    # Writer thread #
+    # ************* #
+    def _run(self) -> None:
+        seg = idx = None
+        size = 0
+
+        try:
+            while True:
+                pending, stop = self._collect()
+
+                if pending:
+                    if seg is None or size >= self._segment_size:
+                        if seg is not None:
+                            seg.close()
+                            idx.close()  # type: ignore
+                        base = os.path.join(self._path, "{:020d}".format(pending[0][0]))
+                        seg = open(base + SEGMENT_SUFFIX, "ab")
+                        idx = open(base + INDEX_SUFFIX, "ab")
+                        size = 0
+
+                    size += self._write(seg, idx, size, pending)  # type: ignore
+
+                if stop:
+                    break
+        except Exception as e:
+            self._error = e
+            logging.exception("recorder writer failed, recording stopped")
+        finally:
+            if seg is not None:
+                seg.close()
+                idx.close()  # type: ignore
+
+    def _collect(self) -> Tuple[List[Tuple[int, _Frame]], bool]:
+        """block for one frame, then gather up to a block's worth. Keyframes
+        are written as they come"""
+        pending: List[Tuple[int, _Frame]] = []
+        deadline: Optional[float] = None
+
+        while len(pending) < self._block_records:
+            try:
+                if deadline is None:
+                    item = self._queue.get()
+                else:
+                    item = self._queue.get(
+                        timeout=max(0.0, deadline - time.monotonic())
+                    )
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return pending, True
+
+            ns, frame = item  # type: ignore
+            if isinstance(frame, _Keyframe):
+                rows = np.array(frame.orders, dtype=KEYFRAME_DTYPE)
+                self._keyframes.write(frame.product_id, ns, frame.sequence, rows)
+                continue
+
+            pending.append(item)  # type: ignore
+            if deadline is None:
+                deadline = time.monotonic() + self._block_interval
+        return pending, False
+
+    def _write(
+        self,
+        seg: "os.PathLike",
+        idx: "os.PathLike",
+        offset: int,
+        pending: List[Tuple[int, _Frame]],
+    ) -> int:
+        records = np.zeros(len(pending), dtype=RECORD_DTYPE)
+        products = {"": 0}
+        frames = []
+
+        for i, (ns, frame) in enumerate(pending):
+            if isinstance(frame, dict):
+                frame = json.dumps(frame, separators=(",", ":"))
+            if isinstance(frame, str):
+                frame = frame.encode()
+            product = _field(frame, b"product_id").decode()
+            sequence = _field(frame, b"sequence")
+
+            records[i] = (
+                ns,
+                int(sequence) if sequence.isdigit() else 0,
+                products.setdefault(product, len(products)),
+                len(frame),
+            )
+            frames.append(frame)
+
+        names = "\n".join(list(products)[1:]).encode()
+        raw = b"".join(
+            [_COUNTS.pack(len(pending), len(names)), names, records.tobytes()] + frames
+        )
+        payload = zlib.compress(raw, self._level)
+
+        seg.write(_BLOCK.pack(_MAGIC, len(payload), len(raw)))  # type: ignore
+        seg.write(payload)  # type: ignore
+        seg.flush()  # type: ignore
+
+        length = _BLOCK.size + len(payload)
+        entry = np.array(
+            [(pending[0][0], pending[-1][0], offset, length, len(pending))],
+            dtype=INDEX_DTYPE,
+        )
+        idx.write(entry.tobytes())  # type: ignore
+        idx.flush()  # type: ignore
+
+        self.records += len(pending)
+        self.blocks += 1
+        self.bytes += length
+        return length
+
+
+class SegmentReader(object):
+    """Reads one segment file, memory mapped.
+
+    Args:
+        path (str): segment file
+    """
+
+    def __init__(self, path: str) -> None:
+        self._path = path
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._mmap = (
+            mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        )
+        self._index = self._loadIndex(size)
+
+    @property
+    def index(self) -> np.ndarray:
+        """INDEX_DTYPE entry per block"""
+        return self._index
+
+    def _loadIndex(self, size: int) -> np.ndarray:
+        path = self._path[: -len(SEGMENT_SUFFIX)] + INDEX_SUFFIX
+        if os.path.exists(path):
+            index = np.fromfile(path, dtype=INDEX_DTYPE)
+            # drop entries for blocks not (fully) on disk yet
+            return index[index["offset"] + index["length"] <= size]
+
+        # no index, walk the block headers
+        entries = []
+        offset = 0
+        while offset + _BLOCK.size <= size:
+            magic, length, _ = _BLOCK.unpack_from(self._mmap, offset)
+            if magic != _MAGIC or offset + _BLOCK.size + length > size:
+                break
+            records, _, _ = self._block(offset)
+            entries.append(
+                (
+                    records["ns"][0],
+                    records["ns"][-1],
+                    offset,
+                    _BLOCK.size + length,
+                    len(records),
+                )
+            )
+            offset += _BLOCK.size + length
+        return np.array(entries, dtype=INDEX_DTYPE)
+
+    def _block(self, offset: int) -> Block:
+        magic, length, raw_length = _BLOCK.unpack_from(self._mmap, offset)
+        if magic != _MAGIC:
+            raise Exception("Corrupt segment {} at {}".format(self._path, offset))
+
+        start = offset + _BLOCK.size
+        raw = zlib.decompress(self._mmap[start : start + length], bufsize=raw_length)
+
+        count, names = _COUNTS.unpack_from(raw)
+        pos = _COUNTS.size
+        products = [""] + (raw[pos : pos + names].decode().split("\n") if names else [])
+        pos += names
+
+        records = np.frombuffer(raw, dtype=RECORD_DTYPE, count=count, offset=pos)
+        pos += count * RECORD_DTYPE.itemsize
+
+        frames = []
+        for length in records["length"].tolist():
+            frames.append(raw[pos : pos + length])
+            pos += length
+        return records, products, frames
+
+    def block(self, i: int) -> Block:
+        """decode the `i`th block"""
+        return self._block(int(self._index["offset"][i]))
+
+    def seek(self, ns: int) -> int:
+        """index of the first block which may hold frames received at or after `ns`"""
+        return int(np.searchsorted(self._index["last_ns"], ns, side="left"))
+
+    def blocks(self, start: int = 0) -> Iterator[Block]:
+        """decoded blocks, from the `start`th"""
+        for i in range(start, len(self._index)):
+            yield self.block(i)
+
+    def close(self) -> None:
+        if isinstance(self._mmap, mmap.mmap):
+            self._mmap.close()
+        self._file.close()
+
+
+def segments(path: str) -> List[str]:
+    """segment files of a recording, in time order"""
+    return sorted(
+        os.path.join(path, f) for f in os.listdir(path) if f.endswith(SEGMENT_SUFFIX)
+    )
@@ -0,0 +1,165 @@
+import os
+import time
+from typing import Collection, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np  # type: ignore
+
+from .recorder import SegmentReader, segments
+
+# a batch of frames and their receive times (ns)
+Batch = Tuple[np.ndarray, List[bytes]]
+
+# sleep only once this far (seconds) ahead of the replay
+_RESOLUTION = 0.001
+
+
+class Pacer(object):
+    """Keeps a replay to the wall clock, scaled by `speed` (2.0 replays at
+    twice real time, 0 as fast as possible)"""
+
+    def __init__(self, speed: float = 0.0) -> None:
+        self._speed = speed
+        self._first = 0
+        self._start = 0.0
+
+    def delay(self, ns: int) -> float:
+        """seconds to wait before replaying what happened at `ns` (since epoch)"""
+        if not self._speed:
+            return 0.0
+        if not self._first:
+            self._first = ns
+            self._start = time.monotonic()
+
+        elapsed = time.monotonic() - self._start
+        delay = (ns - self._first) / 1e9 / self._speed - elapsed
+        return delay if delay > _RESOLUTION else 0.0
+
+
+class Replay(object):
+    """Reads a recording back in receive order, a block at a time.
+
+    Segments are memory mapped and only blocks at or after the start are
+    decompressed. Frames are filtered on their recorded product and sequence
+    number before being handed out, so nothing is decoded only to be dropped.
+
+    Args:
+        path (str): recording directory, see `Recorder`
+        start (int): receive time (ns since epoch) to start at
+        sequence (Dict[str, int]): per product id, sequence number to start at
+        product_ids (Collection[str]): product ids to replay, default all
+    """
+
+    def __init__(
+        self,
+        path: str,
+        start: int = 0,
+        sequence: Optional[Dict[str, int]] = None,
+        product_ids: Optional[Collection[str]] = None,
+    ) -> None:
+        self._segments = segments(path)
+        if not self._segments:
+            raise Exception("No recording in {}".format(path))
+
+        self._start = start
+        self._sequence = sequence or {}
+        self._product_ids = set(product_ids) if product_ids is not None else None
+
+    def batches(self) -> Iterator[Batch]:
+        """(receive ns, frames) per block, from the start"""
+        segment, block = self._seek()
+
+        for path in self._segments[segment:]:
+            reader = SegmentReader(path)
+            try:
+                for records, products, frames in reader.blocks(block):
+                    mask = self._mask(records, products)
+                    if mask is None:
+                        yield records["ns"], frames
+                    elif mask.any():
+                        yield records["ns"][mask], [
+                            frames[i] for i in np.flatnonzero(mask).tolist()
+                        ]
+            finally:
+                reader.close()
+            block = 0
+
+    def _mask(self, records: np.ndarray, products: List[str]) -> Optional[np.ndarray]:
+        """frames of `records` to replay, None for all"""
+        mask = None
+
+        if self._start:
+            mask = records["ns"] >= self._start
+
+        if self._product_ids is not None:
+            wanted = [i for i, p in enumerate(products) if p in self._product_ids]
+            keep = np.isin(records["product"], wanted)
+            mask = keep if mask is None else mask & keep
+
+        for i, product in enumerate(products):
+            sequence = self._sequence.get(product)
+            if sequence is not None:
+                # drop this product's frames before its start
+                early = (records["product"] == i) & (records["sequence"] < sequence)
+                mask = ~early if mask is None else mask & ~early
+
+        return mask
+
+    def _seek(self) -> Tuple[int, int]:
+        """(segment, block) to start reading at"""
+        start = self._seekTime(self._start)
+
+        # products replayed from the start time, without a sequence to start at
+        if self._product_ids is None or not self._sequence:
+            return start
+        if not self._product_ids.issubset(self._sequence):
+            return start
+
+        # the earliest any product starts at, but nothing before the start time
+        return max(
+            start,
+            min(self._seekSequence(p, self._sequence[p]) for p in self._product_ids),
+        )
+
+    def _seekTime(self, ns: int) -> Tuple[int, int]:
+        # segments are named by their first receive time
+        firsts = [int(os.path.basename(path).split(".")[0]) for path in self._segments]
+        segment = max(0, int(np.searchsorted(firsts, ns, side="right")) - 1)
+
+        reader = SegmentReader(self._segments[segment])
+        try:
+            return segment, reader.seek(ns)
+        finally:
+            reader.close()
+
+    def _seekSequence(self, product_id: str, sequence: int) -> Tuple[int, int]:
+        # sequence numbers increase with receive time, so find the first
+        # segment whose last sequence of the product reaches `sequence`, then
+        # bisect its blocks. Blocks without the product sort with those after
+        for segment, path in enumerate(self._segments):
+            reader = SegmentReader(path)
+            try:
+                lo, hi = 0, len(reader.index)
+                if hi == 0 or _last(reader, hi - 1, product_id) < sequence:
+                    continue
+
+                while lo < hi:
+                    mid = (lo + hi) // 2
+                    if _last(reader, mid, product_id) < sequence:
+                        lo = mid + 1
+                    else:
+                        hi = mid
+                return segment, lo
+            finally:
+                reader.close()
+
+        # past the end of the recording
+        return len(self._segments), 0
+
+
+def _last(reader: SegmentReader, block: int, product_id: str) -> float:
+    """last sequence number of `product_id` in a block, inf if it has none"""
+    records, products, _ = reader.block(block)
+    if product_id not in products:
+        return float("inf")
+    sequences = records["sequence"][records["product"] == products.index(product_id)]
+    return int(sequences.max()) if len(sequences) else float("inf")
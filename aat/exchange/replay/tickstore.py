@@ -0,0 +1,494 @@
+import json
+import os
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np  # type: ignore
+
+from aat.config import EventType, Side
+from aat.core import Data, Event, ExchangeType, Instrument, Order, OrderBookLite, Trade
+from aat.core.data.codec import _SIDES, _from_ns, timestampNs
+
+# A tick store is a directory of
+#
+#   <instrument>/<kind>/<YYYYMMDD>/<column>.bin
+#
+# partitions, one raw little endian file per column of the kind's schema, in
+# timestamp order, plus `timestamp.idx` holding every _STRIDE'th timestamp.
+# Loading a time range bisects the sparse index, then one _STRIDE window of
+# the memory mapped timestamps, and slices the other columns without copying.
+SCHEMAS: Dict[str, np.dtype] = {
+    # trade prints, side is the taker's (see `aat.core.data.codec` side codes)
+    "trades": np.dtype(
+        [("timestamp", "<i8"), ("price", "<f8"), ("volume", "<f8"), ("side", "u1")]
+    ),
+    # top of book
+    "bbo": np.dtype(
+        [
+            ("timestamp", "<i8"),
+            ("bid_price", "<f8"),
+            ("bid_volume", "<f8"),
+            ("ask_price", "<f8"),
+            ("ask_volume", "<f8"),
+        ]
+    ),
+    # new volume at a price level, 0 removes it. Rows of one timestamp are one
+    # update, or a snapshot replacing the book if flagged
+    "l2": np.dtype(
+        [
+            ("timestamp", "<i8"),
+            ("side", "u1"),
+            ("price", "<f8"),
+            ("volume", "<f8"),
+            ("snapshot", "u1"),
+        ]
+    ),
+}
+
+_MARKER = "tickstore.json"
+_VERSION = 1
+
+_STRIDE = 4096
+_DAY = 86_400_000_000_000
+
+# timestamps (ns since epoch) or datetimes
+_Time = Union[int, datetime, None]
+
+
+def _day(name: str) -> int:
+    """days since epoch of a partition directory name"""
+    return int(
+        datetime.strptime(name, "%Y%m%d").replace(tzinfo=timezone.utc).timestamp()
+    ) // 86_400
+
+
+def _ns(t: _Time, default: int) -> int:
+    if t is None:
+        return default
+    if isinstance(t, datetime):
+        return timestampNs(t)
+    return t
+
+
+class _Partition(object):
+    """one day of one kind of one instrument"""
+
+    def __init__(self, path: str, dtype: np.dtype) -> None:
+        self.path = path
+        self.dtype = dtype
+        self._columns: Optional[Dict[str, np.ndarray]] = None
+        self._index: Optional[np.ndarray] = None
+
+    def _file(self, column: str) -> str:
+        return os.path.join(self.path, column + ".bin")
+
+    def rows(self) -> int:
+        # columns are appended one after another, count only complete rows
+        if not os.path.exists(self.path):
+            return 0
+        return min(
+            os.path.getsize(self._file(name)) // self.dtype[name].itemsize
+            if os.path.exists(self._file(name))
+            else 0
+            for name in self.dtype.names
+        )
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        """memory mapped columns"""
+        if self._columns is None:
+            rows = self.rows()
+            self._columns = {
+                name: np.memmap(
+                    self._file(name), dtype=self.dtype[name], mode="r", shape=(rows,)
+                )
+                if rows
+                else np.empty(0, dtype=self.dtype[name])
+                for name in self.dtype.names
+            }
+        return self._columns
+
+    def index(self) -> np.ndarray:
+        if self._index is None:
+            path = os.path.join(self.path, "timestamp.idx")
+            if os.path.exists(path):
+                index = np.fromfile(path, dtype="<i8")
+            else:
+                index = np.empty(0, dtype="<i8")
+            self._index = index[: (self.rows() + _STRIDE - 1) // _STRIDE]
+        return self._index
+
+    def bisect(self, ns: int) -> int:
+        """first row at or after `ns`"""
+        index = self.index()
+        timestamps = self.columns()["timestamp"]
+
+        window = int(np.searchsorted(index, ns, side="left")) - 1
+        if window < 0:
+            return 0
+        lo = window * _STRIDE
+        hi = min(lo + _STRIDE, len(timestamps))
+        return lo + int(np.searchsorted(timestamps[lo:hi], ns, side="left"))
+
+    def slice(self, start: int, end: int) -> Dict[str, np.ndarray]:
+        """columns of rows in [start, end)"""
+        lo, hi = self.bisect(start), self.bisect(end)
+        return {name: column[lo:hi] for name, column in self.columns().items()}
+
+    def append(self, rows: np.ndarray) -> None:
+        count = self.rows()
+        if count and rows["timestamp"][0] < self.columns()["timestamp"][-1]:
+            raise Exception(
+                "Ticks must be appended in time order: {}".format(self.path)
+            )
+
+        os.makedirs(self.path, exist_ok=True)
+        for name in self.dtype.names:
+            mode = "r+b" if os.path.exists(self._file(name)) else "wb"
+            with open(self._file(name), mode) as fp:
+                # drop any partial write of an interrupted append
+                fp.truncate(count * self.dtype[name].itemsize)
+                fp.seek(0, os.SEEK_END)
+                fp.write(np.ascontiguousarray(rows[name]).tobytes())
+
+        # every _STRIDE'th row's timestamp, continuing the index
+        first = -count % _STRIDE
+        with open(os.path.join(self.path, "timestamp.idx"), "ab") as fp:
+            fp.truncate((count + _STRIDE - 1) // _STRIDE * 8)
+            fp.write(np.ascontiguousarray(rows["timestamp"][first::_STRIDE]).tobytes())
+
+        self._columns = self._index = None
+
+    def truncate(self, rows: int) -> None:
+        """drop rows past the first `rows`"""
+        for name in self.dtype.names:
+            if os.path.exists(self._file(name)):
+                with open(self._file(name), "r+b") as fp:
+                    fp.truncate(rows * self.dtype[name].itemsize)
+
+        index = os.path.join(self.path, "timestamp.idx")
+        if os.path.exists(index):
+            with open(index, "r+b") as fp:
+                fp.truncate((rows + _STRIDE - 1) // _STRIDE * 8)
+
+        self._columns = self._index = None
+
+
+# a partition: instrument name, kind and day (since epoch)
+_Key = Tuple[str, str, int]
+
+
+class TickStore(object):
+    """Columnar store of trades, top of book and l2 deltas, by instrument and day.
+
+    Args:
+        path (str): directory of the store, created if missing
+    """
+
+    def __init__(self, path: str) -> None:
+        os.makedirs(path, exist_ok=True)
+        marker = os.path.join(path, _MARKER)
+        if not os.path.exists(marker):
+            with open(marker, "w") as fp:
+                json.dump({"version": _VERSION, "stride": _STRIDE}, fp)
+
+        self._path = path
+        self._partitions: Dict[Tuple[str, str, int], _Partition] = {}
+
+    @staticmethod
+    def isStore(path: str) -> bool:
+        """whether `path` is a tick store (as opposed to e.g. a recording)"""
+        return os.path.exists(os.path.join(path, _MARKER))
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def _dir(self, name: str, kind: str) -> str:
+        if kind not in SCHEMAS:
+            raise Exception("Unknown tick kind: {}".format(kind))
+        return os.path.join(self._path, name.replace(os.sep, "_"), kind)
+
+    def _partition(self, name: str, kind: str, day: int) -> _Partition:
+        key = (name, kind, day)
+        partition = self._partitions.get(key)
+        if partition is None:
+            path = os.path.join(
+                self._dir(name, kind),
+                datetime.fromtimestamp(day * 86_400, timezone.utc).strftime("%Y%m%d"),
+            )
+            partition = self._partitions[key] = _Partition(path, SCHEMAS[kind])
+        return partition
+
+    def _days(self, name: str, kind: str) -> List[int]:
+        path = self._dir(name, kind)
+        if not os.path.exists(path):
+            return []
+        return sorted(_day(d) for d in os.listdir(path))
+
+    def days(self, instrument: Instrument, kind: str) -> List[int]:
+        """days (since epoch) with ticks of `kind` for `instrument`"""
+        return self._days(instrument.name, kind)
+
+    def partitions(self) -> List[_Key]:
+        """(instrument name, kind, day) of every partition"""
+        ret: List[_Key] = []
+        for name in sorted(os.listdir(self._path)):
+            path = os.path.join(self._path, name)
+            if name.startswith(".") or not os.path.isdir(path):
+                continue
+            for kind in SCHEMAS:
+                ret.extend((name, kind, day) for day in self._days(name, kind))
+        return ret
+
+    def lengths(self, keys: Sequence[_Key]) -> List[Tuple[str, str, int, int]]:
+        """(name, kind, day, rows stored) of partitions, to undo appending to
+        them with `truncate`"""
+        return [key + (self._partition(*key).rows(),) for key in keys]
+
+    def truncate(self, lengths: Sequence[Tuple[str, str, int, int]]) -> None:
+        """drop rows appended to partitions since their `lengths`"""
+        for name, kind, day, rows in lengths:
+            self._partition(name, kind, day).truncate(rows)
+
+    def merge(self, other: "TickStore") -> None:
+        """append everything in `other`, which must all be after what is stored"""
+        for name, kind, day in other.partitions():
+            columns = other._partition(name, kind, day).columns()
+            rows = np.empty(len(columns["timestamp"]), dtype=SCHEMAS[kind])
+            for column, values in columns.items():
+                rows[column] = values
+            self._partition(name, kind, day).append(rows)
+
+    def append(
+        self, instrument: Union[Instrument, str], kind: str, rows: np.ndarray
+    ) -> None:
+        """append rows of `SCHEMAS[kind]` for an instrument (or its name), in
+        time order and after any stored"""
+        if not len(rows):
+            return
+        if rows.dtype != SCHEMAS[kind]:
+            rows = rows.astype(SCHEMAS[kind])
+        if (np.diff(rows["timestamp"]) < 0).any():
+            raise Exception("Ticks must be appended in time order")
+
+        name = instrument if isinstance(instrument, str) else instrument.name
+        days = rows["timestamp"] // _DAY
+        bounds = [0] + (np.flatnonzero(np.diff(days)) + 1).tolist() + [len(rows)]
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            self._partition(name, kind, int(days[lo])).append(rows[lo:hi])
+
+    def load(
+        self,
+        instrument: Instrument,
+        kind: str = "trades",
+        start: _Time = None,
+        end: _Time = None,
+    ) -> Dict[str, np.ndarray]:
+        """columns of `instrument`'s ticks of `kind` in [start, end).
+
+        Within one day the columns are memory mapped slices of the store, a
+        range spanning days is copied into one array per column."""
+        lo = _ns(start, 0)
+        hi = _ns(end, np.iinfo(np.int64).max)
+
+        chunks = [
+            self._partition(instrument.name, kind, day).slice(lo, hi)
+            for day in self.days(instrument, kind)
+            if lo // _DAY <= day <= (hi - 1) // _DAY
+        ]
+        chunks = [c for c in chunks if len(c["timestamp"])]
+
+        if not chunks:
+            return {
+                name: np.empty(0, dtype=SCHEMAS[kind][name])
+                for name in SCHEMAS[kind].names
+            }
+        if len(chunks) == 1:
+            return chunks[0]
+        return {
+            name: np.concatenate([c[name] for c in chunks])
+            for name in SCHEMAS[kind].names
+        }
+
+    def batches(
+        self,
+        instruments: Sequence[Instrument],
+        kinds: Sequence[str],
+        exchange: ExchangeType,
+        start: _Time = None,
+        end: _Time = None,
+        books: Optional[Dict[Instrument, OrderBookLite]] = None,
+        batch: int = 4096,
+    ) -> Iterator[List[Event]]:
+        """`Event`s of `instruments`' ticks of `kinds` in [start, end), in
+        time order, about `batch` ticks at a time.
+
+        Trades are TRADE events. Top of book and l2 updates are DATA events,
+        with data `{"bid": (price, volume), "ask": (price, volume)}` and
+        `{"snapshot": bool, "changes": [(side, price, volume), ...]}` (as the
+        live l2 feed) respectively; l2 updates are applied to `books`, if given.
+        """
+        books = books or {}
+        lo = _ns(start, 0)
+        hi = _ns(end, np.iinfo(np.int64).max)
+
+        sources = [(i, k) for i in instruments for k in kinds]
+        days = sorted(
+            {
+                day
+                for instrument, kind in sources
+                for day in self.days(instrument, kind)
+                if lo // _DAY <= day <= (hi - 1) // _DAY
+            }
+        )
+
+        for day in days:
+            chunks = [
+                self._partition(instrument.name, kind, day).slice(lo, hi)
+                for instrument, kind in sources
+            ]
+
+            # merge the day's sources by timestamp, ties in source order
+            timestamps = np.concatenate([c["timestamp"] for c in chunks])
+            source = np.repeat(
+                np.arange(len(chunks)), [len(c["timestamp"]) for c in chunks]
+            )
+            row = np.concatenate([np.arange(len(c["timestamp"])) for c in chunks])
+            order = np.argsort(timestamps, kind="stable")
+
+            b = 0
+            while b < len(order):
+                e = min(b + batch, len(order))
+                # don't split an update across batches
+                while e < len(order) and (
+                    source[order[e]] == source[order[e - 1]]
+                    and timestamps[order[e]] == timestamps[order[e - 1]]
+                ):
+                    e += 1
+
+                events = self._events(
+                    order[b:e],
+                    source,
+                    row,
+                    timestamps,
+                    chunks,
+                    sources,
+                    exchange,
+                    books,
+                )
+                if events:
+                    yield events
+                b = e
+
+    def _events(
+        self,
+        order: np.ndarray,
+        source: np.ndarray,
+        row: np.ndarray,
+        timestamps: np.ndarray,
+        chunks: List[Dict[str, np.ndarray]],
+        sources: List[Tuple[Instrument, str]],
+        exchange: ExchangeType,
+        books: Dict[Instrument, OrderBookLite],
+    ) -> List[Event]:
+        events: List[Event] = []
+
+        # as python values, indexing numpy per tick is slow
+        sources_ = source[order].tolist()
+        rows_ = row[order].tolist()
+        timestamps_ = timestamps[order].tolist()
+
+        # each source's rows of this batch are contiguous, take their columns
+        # from the first as lists
+        columns: Dict[int, Tuple[int, Dict[str, List]]] = {}
+        for s in set(sources_):
+            mine = row[order][source[order] == s]
+            lo, hi = int(mine.min()), int(mine.max()) + 1
+            columns[s] = (
+                lo,
+                {name: column[lo:hi].tolist() for name, column in chunks[s].items()},
+            )
+
+        i = 0
+        while i < len(sources_):
+            s = sources_[i]
+            instrument, kind = sources[s]
+            lo, cols = columns[s]
+            r = rows_[i] - lo
+            timestamp = _from_ns(timestamps_[i])
+
+            if kind == "trades":
+                volume = cols["volume"][r]
+                price = cols["price"][r]
+                o = Order(
+                    volume,
+                    price,
+                    _SIDES[cols["side"][r]],  # type: ignore
+                    instrument,
+                    exchange,
+                    filled=volume,
+                    timestamp=timestamp,
+                )
+                events.append(
+                    Event(type=EventType.TRADE, target=Trade(volume, price, o))
+                )
+                i += 1
+
+            elif kind == "bbo":
+                data = {
+                    "bid": (cols["bid_price"][r], cols["bid_volume"][r]),
+                    "ask": (cols["ask_price"][r], cols["ask_volume"][r]),
+                }
+                events.append(
+                    Event(
+                        type=EventType.DATA,
+                        target=Data(
+                            instrument, exchange, data=data, timestamp=timestamp
+                        ),
+                    )
+                )
+                i += 1
+
+            else:
+                # rows of this update
+                j = i + 1
+                while (
+                    j < len(sources_)
+                    and sources_[j] == s
+                    and timestamps_[j] == timestamps_[i]
+                ):
+                    j += 1
+                sides, prices, volumes = cols["side"], cols["price"], cols["volume"]
+                changes = [
+                    (_SIDES[sides[k - lo]], prices[k - lo], volumes[k - lo])
+                    for k in rows_[i:j]
+                ]
+                snapshot = bool(cols["snapshot"][r])
+
+                book = books.get(instrument)
+                if book is not None:
+                    if snapshot:
+                        book.load(
+                            [(p, v) for side, p, v in changes if side == Side.BUY],
+                            [(p, v) for side, p, v in changes if side == Side.SELL],
+                        )
+                    else:
+                        book.apply(changes)  # type: ignore
+
+                events.append(
+                    Event(
+                        type=EventType.DATA,
+                        target=Data(
+                            instrument,
+                            exchange,
+                            data={
+                                "snapshot": snapshot,
+                                "changes": [] if snapshot else changes,
+                            },
+                            timestamp=timestamp,
+                        ),
+                    )
+                )
+                i = j
+
+        return events
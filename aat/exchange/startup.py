@@ -0,0 +1,212 @@
+import asyncio
+import time
+import logging
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Awaitable,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+    cast,
+)
+
+from aat.config import TradingType
+from aat.config.parser import _exchangeClass
+
+if TYPE_CHECKING:
+    from aat.core import Instrument
+
+    from .exchange import Exchange
+
+# stages of starting an exchange, in order
+STAGES = ("construct", "connect", "instruments", "subscribe", "accounts")
+
+# seconds an exchange which failed to start has to close
+_CLOSE_TIMEOUT = 5.0
+
+
+class ExchangeStartup(object):
+    """How starting one exchange went: seconds spent per stage, and the
+    error (or timeout) it failed with, if any"""
+
+    __slots__ = ("spec", "exchange", "stages", "stage", "error")
+
+    def __init__(self, spec: str) -> None:
+        self.spec = spec
+        self.exchange: Optional["Exchange"] = None
+        self.stages: Dict[str, float] = {}
+
+        # the stage being run, or failed in
+        self.stage = ""
+        self.error: Optional[BaseException] = None
+
+    @property
+    def total(self) -> float:
+        return sum(self.stages.values())
+
+    def __repr__(self) -> str:
+        stages = " ".join(
+            "{}={:.3f}s".format(stage, self.stages[stage])
+            for stage in STAGES
+            if stage in self.stages
+        )
+        status = (
+            "failed in {}: {!r}".format(self.stage, self.error) if self.error else "ok"
+        )
+        return "{} {:.3f}s [{}] {}".format(self.spec, self.total, stages, status)
+
+
+def _construct(
+    spec: Union[str, list], trading_type: TradingType, verbose: bool
+) -> "Exchange":
+    clazz, args = _exchangeClass(spec)
+    return clazz(trading_type, verbose, *args)
+
+
+async def _close(exchange: "Exchange") -> None:
+    """close an exchange which failed to start, or was left out"""
+    try:
+        await asyncio.wait_for(exchange.close(), _CLOSE_TIMEOUT)
+    except Exception as e:
+        logging.warning("failed to close %r: %r", exchange, e)
+
+
+def _closeConstructed(future: "asyncio.Future[Exchange]") -> None:
+    # the constructor outlived its start, close what it constructed
+    if not future.cancelled() and future.exception() is None:
+        asyncio.ensure_future(_close(future.result()))
+
+
+async def _start(
+    spec: Union[str, list],
+    trading_type: TradingType,
+    verbose: bool,
+    subscriptions: Sequence["Instrument"],
+    load_accounts: bool,
+    startup: ExchangeStartup,
+) -> None:
+    loop = asyncio.get_event_loop()
+
+    async def stage(name: str, run: Awaitable[Any]) -> Any:
+        startup.stage = name
+        start = time.perf_counter()
+        try:
+            return await run
+        finally:
+            startup.stages[name] = time.perf_counter() - start
+
+    # exchanges are constructed (and their modules imported) off the loop,
+    # so that one's slow constructor doesn't hold up the others. A thread
+    # can't be interrupted, so if the start is cancelled meanwhile, whatever
+    # it constructs is closed once it has
+    construct = loop.run_in_executor(None, _construct, spec, trading_type, verbose)
+    try:
+        exchange = cast(
+            "Exchange", await stage("construct", asyncio.shield(construct))
+        )
+    except asyncio.CancelledError:
+        construct.add_done_callback(_closeConstructed)
+        raise
+    startup.exchange = exchange
+
+    await stage("connect", exchange.connect())
+    instruments = await stage("instruments", exchange.instruments())
+
+    # subscribe to the instruments the exchange trades, as it lists them
+    # (e.g. with their broker ids)
+    listed = {i: i for i in instruments}
+    wanted = [listed[i] for i in subscriptions if i in listed]
+    await stage("subscribe", asyncio.gather(*(exchange.subscribe(i) for i in wanted)))
+
+    if load_accounts:
+        await stage("accounts", exchange.accounts())
+    startup.stage = ""
+
+
+async def bootstrap(
+    exchanges: List,
+    trading_type: TradingType,
+    verbose: bool = False,
+    subscriptions: Sequence["Instrument"] = (),
+    load_accounts: bool = False,
+    timeout: float = 30.0,
+    partial: bool = False,
+) -> Tuple[List["Exchange"], List[ExchangeStartup]]:
+    """Construct and start exchanges concurrently, rather than one after another.
+
+    Each exchange, given as for `getExchanges`, is constructed, connected,
+    asked for its instruments, subscribed to those of `subscriptions` it
+    trades and optionally has its accounts loaded, in that order, while the
+    others do the same. Each has `timeout` seconds to do it all, or its start
+    is cancelled. Exchanges which fail to start are closed, as are those
+    which did when raising.
+
+    Args:
+        exchanges (List): exchanges in `getExchanges` form, `module:Class` plus args
+        trading_type (TradingType): trading type to construct exchanges with
+        verbose (bool): construct exchanges verbose
+        subscriptions (Sequence[Instrument]): instruments to subscribe to where traded
+        load_accounts (bool): load accounts from exchanges
+        timeout (float): seconds each exchange has to start
+        partial (bool): if any fail, return those which started rather than raise
+
+    Returns:
+        started exchanges, in the order given, and per exchange an
+        `ExchangeStartup` timing breakdown
+    """
+    if not exchanges:
+        raise Exception("Must provide exchanges")
+
+    startups = [
+        ExchangeStartup(spec if isinstance(spec, str) else " ".join(spec))
+        for spec in exchanges
+    ]
+
+    async def start(spec: Union[str, list], startup: ExchangeStartup) -> None:
+        task = asyncio.ensure_future(
+            _start(spec, trading_type, verbose, subscriptions, load_accounts, startup)
+        )
+        try:
+            done, _ = await asyncio.wait((task,), timeout=timeout)
+        finally:
+            if not task.done():
+                # timed out (or we were cancelled): cancel the start where
+                # it is, and let it unwind
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+
+        if not done:
+            startup.error = asyncio.TimeoutError(
+                "timed out after {}s".format(timeout)
+            )
+        elif task.exception() is not None:
+            startup.error = task.exception()
+
+        if startup.error is not None and startup.exchange is not None:
+            await _close(startup.exchange)
+
+    await asyncio.gather(
+        *(start(spec, startup) for spec, startup in zip(exchanges, startups))
+    )
+
+    for startup in startups:
+        if startup.error is None:
+            logging.info("started %r", startup)
+        else:
+            logging.warning("failed to start %r", startup)
+
+    failed = [s for s in startups if s.error is not None]
+    if failed and not partial:
+        await asyncio.gather(
+            *(_close(cast("Exchange", s.exchange)) for s in startups if not s.error)
+        )
+        raise Exception(
+            "Exchanges failed to start: {}".format("; ".join(map(repr, failed)))
+        )
+
+    started = [cast("Exchange", s.exchange) for s in startups if s.error is None]
+    return started, startups
@@ -0,0 +1,90 @@
+# cold start cost of importing each subpackage, each in a fresh interpreter:
+#
+#   python -m aat.importtime [runs] [subpackage ...]
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Sequence, Tuple
+
+SUBPACKAGES = [
+    "aat.common",
+    "aat.config",
+    "aat",
+    "aat.core",
+    "aat.core.data",
+    "aat.core.order_book",
+    "aat.exchange",
+    "aat.exchange.replay",
+    "aat.exchange.crypto.coinbase",
+]
+
+# the heaviest modules shown per subpackage
+_TOP = 5
+
+
+def _importtime(module: str) -> Tuple[float, List[Tuple[int, str]]]:
+    """seconds to import `module` in a fresh interpreter, and the self time
+    (us) of each module it imported, from `-X importtime`"""
+    code = (
+        "import time; start = time.perf_counter(); import {}; "
+        "print(time.perf_counter() - start)".format(module)
+    )
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    modules: List[Tuple[int, str]] = []
+    for line in out.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        fields = line[len("import time:") :].split("|")
+        if fields[2] == " site":
+            # imported at startup, not by `module`
+            modules = []
+        elif fields[0].strip().isdigit():
+            modules.append((int(fields[0]), fields[2].strip()))
+    return float(out.stdout.split()[-1]), modules
+
+
+def benchmark(
+    subpackages: Sequence[str] = SUBPACKAGES, runs: int = 5
+) -> Dict[str, Dict[str, object]]:
+    """{subpackage: {median, min (seconds), top [(self us, module)]}} of
+    importing each subpackage cold, `runs` times each"""
+    ret: Dict[str, Dict[str, object]] = {}
+    for module in subpackages:
+        times = []
+        selfs: Dict[str, int] = {}
+        for _ in range(runs):
+            seconds, modules = _importtime(module)
+            times.append(seconds)
+            for us, name in modules:
+                selfs[name] = min(us, selfs.get(name, us))
+
+        top = sorted(((us, name) for name, us in selfs.items()), reverse=True)
+        ret[module] = {
+            "median": statistics.median(times),
+            "min": min(times),
+            "top": top[:_TOP],
+        }
+    return ret
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    runs = int(args.pop(0)) if args and args[0].isdigit() else 5
+
+    for module, result in benchmark(args or SUBPACKAGES, runs).items():
+        print(
+            "{:32} {:8.1f}ms (min {:.1f}ms)".format(
+                module,
+                result["median"] * 1000,  # type: ignore
+                result["min"] * 1000,  # type: ignore
+            )
+        )
+        for us, name in result["top"]:  # type: ignore
+            print("    {:>8.1f}ms  {}".format(us / 1000, name))
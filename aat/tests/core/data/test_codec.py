@@ -0,0 +1,85 @@
+import pytest
+
+from aat.config import EventType, InstrumentType, OrderType, Side
+from aat.core import Data, Event, ExchangeType, Instrument, Order, Trade
+from aat.core.data.codec import _ID_WIDTH, BinaryCodec
+
+_EXCHANGE = ExchangeType("coinbasepro")
+_INSTRUMENT = Instrument("BTC-USD", InstrumentType.PAIR, broker_id="BTC-USD")
+
+
+def _order(id: str, volume: float = 1.5, side: Side = Side.BUY, **kwargs) -> Order:
+    return Order(volume, 100.0, side, _INSTRUMENT, _EXCHANGE, id=id, **kwargs)
+
+
+def _trade(my_order: str) -> Trade:
+    taker = _order("taker", filled=1.5)
+    makers = [_order("maker0", side=Side.SELL), _order("maker1", side=Side.SELL)]
+    mine = {
+        "taker": taker,
+        "maker": makers[1],
+        "own": _order("mine", side=Side.SELL),
+        "none": None,
+    }[my_order]
+    return Trade(1.5, 100.0, taker, makers, id="trade", my_order=mine)
+
+
+def _roundTrip(*events: Event) -> list:
+    codec, decoder = BinaryCodec(), BinaryCodec()
+    buffer = codec.encodeBatch(events)
+    decoder.loadSymbols(codec.symbols())
+    return decoder.decodeBatch(buffer)
+
+
+class TestBinaryCodec:
+    def test_round_trip(self):
+        id = "x" * _ID_WIDTH
+        (event,) = _roundTrip(Event(EventType.OPEN, _order(id)))
+        assert event.type == EventType.OPEN
+        assert event.target.id == id
+        assert event.target.volume == 1.5
+        assert event.target.price == 100.0
+        assert event.target.side == Side.BUY
+
+    def test_id_too_long(self):
+        with pytest.raises(ValueError):
+            BinaryCodec().encode(Event(EventType.OPEN, _order("x" * (_ID_WIDTH + 1))))
+
+    def test_trade(self):
+        mine = ("taker", "maker", "own", "none")
+        events = _roundTrip(*(Event(EventType.TRADE, _trade(m)) for m in mine))
+        assert len(events) == 4
+        for event in events:
+            trade = event.target
+            assert trade.id == "trade"
+            assert trade.volume == 1.5
+            assert trade.taker_order.id == "taker"
+            assert [o.id for o in trade.maker_orders] == ["maker0", "maker1"]
+
+        taker, maker, own, none = (e.target for e in events)
+        assert taker.my_order is taker.taker_order
+        assert maker.my_order is maker.maker_orders[1]
+        assert own.my_order.id == "mine"
+        assert none.my_order is None
+
+    def test_stop_order(self):
+        stop = _order(
+            "stop",
+            volume=0,
+            order_type=OrderType.STOP,
+            stop_target=_order("target", order_type=OrderType.LIMIT),
+        )
+        (event,) = _roundTrip(Event(EventType.OPEN, stop))
+        assert event.target.order_type == OrderType.STOP
+        assert event.target.stop_target.id == "target"
+        assert event.target.stop_target.order_type == OrderType.LIMIT
+
+    def test_none_target_and_data(self):
+        data = Data(_INSTRUMENT, _EXCHANGE, id="quote-1")
+        start, event = _roundTrip(
+            Event(EventType.START, None), Event(EventType.DATA, data)
+        )
+        assert start.type == EventType.START
+        assert start.target is None
+        assert event.target.id == "quote-1"
+        assert event.target.instrument == _INSTRUMENT
@@ -0,0 +1,91 @@
+from aat.config import EventType, InstrumentType, OrderType, Side, TradingType
+from aat.core import Event, ExchangeType, Instrument, Order, OrderBook, PositionManager
+from aat.exchange.crypto.coinbase.client import CoinbaseExchangeClient
+
+_EXCHANGE = ExchangeType("coinbasepro")
+_INSTRUMENT = Instrument("BTC-USD", InstrumentType.PAIR, broker_id="BTC-USD")
+
+
+class TestPositionManager:
+    def test_flat_after_rounding(self):
+        positions = PositionManager()
+        positions.fill(_INSTRUMENT, _EXCHANGE, Side.BUY, 0.1, 100.0)
+        positions.fill(_INSTRUMENT, _EXCHANGE, Side.BUY, 0.2, 100.0)
+        realized = positions.fill(_INSTRUMENT, _EXCHANGE, Side.SELL, 0.3, 110.0)
+
+        position = positions.position(_INSTRUMENT, _EXCHANGE)
+        assert position["size"] == 0.0
+        assert position["price"] == 0.0
+        assert abs(realized - 3.0) < 1e-9
+
+    def test_reversal(self):
+        positions = PositionManager()
+        positions.fill(_INSTRUMENT, _EXCHANGE, Side.BUY, 2.0, 100.0)
+        realized = positions.fill(_INSTRUMENT, _EXCHANGE, Side.SELL, 3.0, 90.0)
+
+        position = positions.position(_INSTRUMENT, _EXCHANGE)
+        assert realized == -20.0
+        assert position["size"] == -1.0
+        assert position["price"] == 90.0
+
+    def test_empty_fill(self):
+        positions = PositionManager()
+        assert positions.fill(_INSTRUMENT, _EXCHANGE, Side.BUY, 0.0, 100.0) == 0.0
+
+        position = positions.position(_INSTRUMENT, _EXCHANGE)
+        assert position["size"] == 0.0
+        assert position["price"] == 0.0
+
+    def test_partial_fills(self):
+        client = CoinbaseExchangeClient(TradingType.BACKTEST, _EXCHANGE, "", "", "")
+        order = Order(
+            3.0,
+            100.0,
+            Side.BUY,
+            _INSTRUMENT,
+            _EXCHANGE,
+            order_type=OrderType.LIMIT,
+            id="mine",
+        )
+        client._order_map["mine"] = order
+        book = OrderBook(_INSTRUMENT, _EXCHANGE)
+
+        positions = PositionManager()
+        for i, (size, price) in enumerate(((1.0, 99.0), (0.5, 100.0), (1.5, 101.0))):
+            trade = client._process_match(
+                {
+                    "trade_id": i,
+                    "maker_order_id": "maker",
+                    "taker_order_id": "mine",
+                    "size": str(size),
+                    "price": str(price),
+                    "side": "sell",
+                },
+                book,
+            ).target
+            assert trade.volume == size
+            assert trade.my_order is order
+            positions.onTrade(Event(type=EventType.TRADE, target=trade))
+
+        position = positions.position(_INSTRUMENT, _EXCHANGE)
+        assert order.filled == 3.0
+        assert position["size"] == 3.0
+        assert abs(position["price"] - (99.0 + 50.0 + 151.5) / 3.0) < 1e-9
+
+        assert abs(positions.mark({_INSTRUMENT: 102.0}) - 5.5) < 1e-9
+
+        # others' trades leave positions be
+        trade = client._process_match(
+            {
+                "trade_id": 3,
+                "maker_order_id": "maker",
+                "taker_order_id": "taker",
+                "size": "1.0",
+                "price": "100.0",
+                "side": "sell",
+            },
+            book,
+        ).target
+        assert trade.my_order is None
+        positions.onTrade(Event(type=EventType.TRADE, target=trade))
+        assert positions.position(_INSTRUMENT, _EXCHANGE)["size"] == 3.0
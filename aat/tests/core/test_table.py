@@ -0,0 +1,46 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from aat.config import EventType, InstrumentType
+from aat.core import Data, Event, ExchangeType, Instrument, TableHandler
+from aat.core.data.codec import timestampNs
+from aat.core.table import _Table, load
+
+_EXCHANGE = ExchangeType("x")
+_INSTRUMENT = Instrument("A", InstrumentType.PAIR)
+_START = datetime(2020, 1, 1)
+
+
+def _data(n: int) -> list:
+    return [
+        Event(
+            EventType.DATA,
+            Data(_INSTRUMENT, _EXCHANGE, timestamp=_START + timedelta(microseconds=i)),
+        )
+        for i in range(n)
+    ]
+
+
+class TestTableHandler:
+    @pytest.mark.parametrize("capacity,flush_rows", [(5000, 100), (300, 2000)])
+    def test_flushes(self, tmp_path, capacity, flush_rows):
+        handler = TableHandler(capacity, str(tmp_path), flush_rows, 3600.0)
+        flushes = []
+        flush = handler.flush
+        handler.flush = lambda: flushes.append(1) or flush()  # type: ignore
+
+        for event in _data(12345):
+            handler.onData(event)
+        handler.onExit(Event(EventType.EXIT, None))
+
+        # a flush per commit at most, not per row
+        assert len(flushes) <= 12345 // min(capacity, 1024) + 2
+        timestamps = load(str(tmp_path), "data")["timestamp"]
+        micros = (timestamps - timestampNs(_START)) // 1000
+        assert np.array_equal(micros, np.arange(12345))
+
+    def test_object_columns(self):
+        with pytest.raises(Exception):
+            _Table({"payload": dict}, 16)
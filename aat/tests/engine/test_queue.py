@@ -0,0 +1,59 @@
+import asyncio
+from typing import List
+
+from aat.config import EventType, InstrumentType
+from aat.core import Data, Event, ExchangeType, Instrument
+from aat.engine.queue import _HandlerQueue
+
+_EXCHANGE = ExchangeType("x")
+_INSTRUMENT = Instrument("A", InstrumentType.PAIR)
+
+
+def _data(i: int, delta: bool = False) -> Event:
+    data: dict = {"i": i}
+    if delta:
+        data.update(snapshot=False, changes=[])
+    return Event(EventType.DATA, Data(_INSTRUMENT, _EXCHANGE, data=data))
+
+
+class _Handler:
+    def __init__(self) -> None:
+        self.got: List[int] = []
+
+    def onData(self, event: Event) -> None:
+        self.got.append(event.target.data["i"])
+
+
+async def _deliver(queue: _HandlerQueue, batches: List[List[Event]]) -> None:
+    run = asyncio.ensure_future(queue.run())
+    for batch in batches:
+        await queue.put(batch)
+    queue.close()
+    await run
+
+
+class TestHandlerQueue:
+    def test_conflate_keeps_deltas(self):
+        handler = _Handler()
+        queue = _HandlerQueue("h", handler, "conflate", 10, 1024)
+        events = [_data(i, delta=i % 2 == 0) for i in range(50)]
+        asyncio.run(_deliver(queue, [events]))
+
+        # every delta, and only the latest of the rest
+        assert handler.got == list(range(0, 50, 2)) + [49]
+        assert queue.conflated == 24
+
+    def test_conflate_below_capacity(self):
+        handler = _Handler()
+        queue = _HandlerQueue("h", handler, "conflate", 100, 1024)
+        asyncio.run(_deliver(queue, [[_data(i) for i in range(50)]]))
+        assert handler.got == list(range(50))
+
+    def test_block_within_capacity(self):
+        handler = _Handler()
+        queue = _HandlerQueue("h", handler, "block", 10, 4)
+        batches = [[_data(25 * b + i) for i in range(25)] for b in range(4)]
+        asyncio.run(_deliver(queue, batches))
+
+        assert handler.got == list(range(100))
+        assert queue.max_depth <= 10
@@ -0,0 +1,77 @@
+import asyncio
+from typing import Any, List, Optional, Tuple
+
+from aat.config import InstrumentType, OrderType, Side, TradingType
+from aat.core import ExchangeType, Instrument, Order
+from aat.exchange.crypto.coinbase.client import CoinbaseExchangeClient
+
+_EXCHANGE = ExchangeType("coinbasepro")
+_BTC = Instrument("BTC/USD", InstrumentType.PAIR, broker_id="BTC-USD")
+_ETH = Instrument("ETH/USD", InstrumentType.PAIR, broker_id="ETH-USD")
+
+
+class _Client(CoinbaseExchangeClient):
+    """a client recording its requests rather than sending them"""
+
+    def __init__(self) -> None:
+        super().__init__(TradingType.BACKTEST, _EXCHANGE, "", "", "")
+        self.requests: List[Tuple[str, str, Optional[dict]]] = []
+
+    async def _request(
+        self, endpoint: str, method: str, path: str, jsn: Optional[dict] = None
+    ) -> Tuple[int, Any]:
+        self.requests.append((method, path, jsn))
+        if method == "POST":
+            return 200, {"id": "new"}
+        if path.startswith("/orders?product_id="):
+            product_id = path.split("=")[1]
+            return 200, [
+                id
+                for id, o in self._order_map.items()
+                if o.instrument.brokerId == product_id
+            ]
+        return 200, path.split("/")[2].split("?")[0]
+
+
+def _open(client: _Client, id: str, instrument: Instrument) -> Order:
+    order = Order(
+        1.0,
+        100.0,
+        Side.BUY,
+        instrument,
+        _EXCHANGE,
+        order_type=OrderType.LIMIT,
+        id=id,
+    )
+    client._order_map[id] = order
+    return order
+
+
+class TestCoinbaseOrderEntry:
+    def test_cancel_orders(self):
+        client = _Client()
+        btc = [_open(client, "b{}".format(i), _BTC) for i in range(3)]
+        eth = [_open(client, "e{}".format(i), _ETH) for i in range(2)]
+
+        # every BTC order, and one of the ETH orders
+        results = asyncio.run(client.cancelOrders([btc[0], eth[0], btc[1], btc[2]]))
+        assert results == [True, True, True, True]
+        assert sorted(path for _, path, _ in client.requests) == [
+            "/orders/e0?product_id=ETH-USD",
+            "/orders?product_id=BTC-USD",
+        ]
+
+    def test_cancel_all(self):
+        client = _Client()
+        _open(client, "b0", _BTC)
+        _open(client, "e0", _ETH)
+        assert asyncio.run(client.cancelAll(_BTC)) == ["b0"]
+        assert client.requests[0][1] == "/orders?product_id=BTC-USD"
+
+    def test_new_order_product_id(self):
+        client = _Client()
+        order = Order(
+            1.0, 100.0, Side.BUY, _BTC, _EXCHANGE, order_type=OrderType.LIMIT
+        )
+        assert asyncio.run(client.newOrder(order))
+        assert client.requests[0][2]["product_id"] == "BTC-USD"
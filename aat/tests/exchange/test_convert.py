@@ -0,0 +1,36 @@
+import pytest
+
+from aat.config import InstrumentType
+from aat.core import Instrument
+from aat.exchange.crypto.coinbase.convert import convertRecording
+from aat.exchange.replay import Recorder, TickStore, segments
+
+
+def _record(path: str) -> None:
+    # three trades per segment, the last of the first repeated on reconnecting
+    recorder = Recorder(path, segment_size=1, block_records=3, block_interval=60)
+    for i, trade_id in enumerate((1, 2, 3, 3, 4, 5)):
+        frame = {
+            "type": "ticker",
+            "product_id": "SOL-USD",
+            "trade_id": trade_id,
+            "price": str(100 + trade_id),
+            "last_size": "1",
+            "side": "buy",
+        }
+        recorder.record(frame, ns=1_600_000_000_000_000_000 + i)
+    recorder.close()
+
+
+class TestConvert:
+    @pytest.mark.parametrize("processes", [1, 2])
+    def test_trade_across_segments(self, tmp_path, processes):
+        recording, store = str(tmp_path / "recording"), str(tmp_path / "store")
+        _record(recording)
+        assert len(segments(recording)) == 2
+
+        assert convertRecording(recording, store, processes) == 2
+        trades = TickStore(store).load(
+            Instrument("SOL-USD", InstrumentType.PAIR), "trades"
+        )
+        assert trades["price"].tolist() == [101.0, 102.0, 103.0, 104.0, 105.0]
@@ -0,0 +1,41 @@
+import threading
+
+import pytest
+
+from aat.exchange.replay import Recorder
+
+
+class TestRecorder:
+    def test_drops_beyond_max_pending(self, tmp_path):
+        recorder = Recorder(str(tmp_path), block_records=1, max_pending=4)
+        release = threading.Event()
+        write = recorder._write
+
+        def _write(*args):
+            release.wait()
+            return write(*args)
+
+        recorder._write = _write  # type: ignore
+        for i in range(20):
+            recorder.record({"type": "x", "sequence": i})
+        release.set()
+        recorder.close()
+
+        assert recorder.dropped > 0
+        assert recorder.records + recorder.dropped == 20
+
+    def test_writer_failure(self, tmp_path):
+        recorder = Recorder(str(tmp_path), block_records=1)
+
+        def _write(*args):
+            raise OSError("disk full")
+
+        recorder._write = _write  # type: ignore
+        recorder.record({"type": "x", "sequence": 1})
+        recorder._thread.join()
+
+        # reported rather than queued forever
+        recorder.record({"type": "x", "sequence": 2})
+        assert recorder.dropped == 1
+        with pytest.raises(Exception):
+            recorder.close()
@@ -0,0 +1,45 @@
+import json
+
+from aat.exchange.replay import Recorder, Replay
+
+
+def _record(path: str) -> None:
+    # one block per segment, products interleaved
+    recorder = Recorder(path, segment_size=1, block_records=10, block_interval=0.01)
+    for i in range(100):
+        for j, product_id in enumerate(("A", "B")):
+            frame = {"type": "l2update", "product_id": product_id, "sequence": i + 1}
+            recorder.record(frame, ns=1000 + 2 * i + j)
+    recorder.close()
+
+
+def _sequences(replay: Replay) -> dict:
+    ret: dict = {}
+    for _, frames in replay.batches():
+        for frame in frames:
+            message = json.loads(frame)
+            ret.setdefault(message["product_id"], []).append(message["sequence"])
+    return ret
+
+
+class TestReplay:
+    def test_sequence_per_product(self, tmp_path):
+        _record(str(tmp_path))
+        replay = Replay(
+            str(tmp_path), sequence={"A": 10, "B": 80}, product_ids=["A", "B"]
+        )
+        sequences = _sequences(replay)
+        assert sequences["A"] == list(range(10, 101))
+        assert sequences["B"] == list(range(80, 101))
+
+    def test_sequence_after_start(self, tmp_path):
+        _record(str(tmp_path))
+        replay = Replay(
+            str(tmp_path),
+            start=1100,
+            sequence={"A": 10, "B": 80},
+            product_ids=["A", "B"],
+        )
+        sequences = _sequences(replay)
+        assert sequences["A"] == list(range(51, 101))
+        assert sequences["B"] == list(range(80, 101))
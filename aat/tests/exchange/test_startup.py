@@ -0,0 +1,48 @@
+import asyncio
+from typing import List
+
+from aat.config import InstrumentType, TradingType
+from aat.core import ExchangeType, Instrument
+from aat.exchange import Exchange, bootstrap
+
+_LISTED = [
+    Instrument("BTC-USD", InstrumentType.PAIR, broker_id="BTC-USD"),
+    Instrument("ETH-USD", InstrumentType.PAIR, broker_id="ETH-USD"),
+]
+
+
+class _Listing(Exchange):
+    """an exchange listing `_LISTED`, recording what it is subscribed to"""
+
+    def __init__(self, trading_type: TradingType, verbose: bool) -> None:
+        super().__init__(ExchangeType("listing"))
+        self.subscribed: List[Instrument] = []
+
+    async def connect(self) -> None:
+        pass
+
+    async def instruments(self) -> List[Instrument]:
+        return _LISTED
+
+    async def subscribe(self, instrument: Instrument) -> None:
+        self.subscribed.append(instrument)
+
+
+class TestBootstrap:
+    def test_subscribes_to_listed(self):
+        wanted = [
+            Instrument("BTC-USD", InstrumentType.PAIR),
+            Instrument("ETH-USD", InstrumentType.PAIR),
+            Instrument("SOL-USD", InstrumentType.PAIR),
+        ]
+        exchanges, _ = asyncio.run(
+            bootstrap(
+                ["aat.tests.exchange.test_startup:_Listing"],
+                TradingType.SIMULATION,
+                subscriptions=wanted,
+            )
+        )
+        subscribed = exchanges[0].subscribed
+        assert [i.name for i in subscribed] == ["BTC-USD", "ETH-USD"]
+        # the exchange's own instruments, not ours
+        assert all(any(i is j for j in _LISTED) for i in subscribed)